@@ -19,6 +19,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", "60"))
+STREAM_SCOPE = "events"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -35,16 +37,31 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_stream_token(user: models.User) -> str:
+    """
+    Short-lived token for GET /events only. EventSource cannot set headers,
+    so it travels in the query string, where proxies and access logs keep it;
+    it must not be usable as a bearer token.
+    """
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode({"sub": user.username, "scope": STREAM_SCOPE, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
 
 security = HTTPBearer()
 
-async def get_current_user(token: str = Depends(security), db: Session = Depends(get_db)):
+def user_from_token(token: str, db: Session, scope: str = None) -> models.User:
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Scoped tokens only open what they were issued for; bearer tokens carry no scope
+        if payload.get("scope") != scope:
+            raise HTTPException(status_code=401, detail="Invalid token")
         username = payload.get("sub")
         user = db.query(models.User).filter(models.User.username == username).first()
         if not user:
             raise HTTPException(status_code=401, detail="Invalid token")
         return user
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+async def get_current_user(token: str = Depends(security), db: Session = Depends(get_db)):
+    return user_from_token(token.credentials, db)
\ No newline at end of file
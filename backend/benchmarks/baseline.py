@@ -0,0 +1,50 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def load_baseline(name: str) -> Optional[Dict]:
+    path = baseline_path(name)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(name: str, results: Dict) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+    return path
+
+
+def find_regressions(current: Dict, baseline: Dict, metrics: Iterable[str],
+                     tolerance: float, higher_is_better: Iterable[str] = ()) -> List[str]:
+    """
+    Compare {case: {metric: value}} result sets. A metric regresses when it is
+    worse than the baseline by more than `tolerance` (a fraction, e.g. 0.25).
+    """
+    higher_is_better = set(higher_is_better)
+    regressions = []
+    for case, values in current.items():
+        base_values = baseline.get(case)
+        if not base_values:
+            continue
+        for metric in metrics:
+            now, then = values.get(metric), base_values.get(metric)
+            if now is None or not then:
+                continue
+            if metric in higher_is_better:
+                worse = now < then * (1 - tolerance)
+            else:
+                worse = now > then * (1 + tolerance)
+            if worse:
+                regressions.append(f"{case}.{metric}: {now:.4g} vs baseline {then:.4g}")
+    return regressions
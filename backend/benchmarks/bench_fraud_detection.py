@@ -0,0 +1,175 @@
+"""
+Latency benchmark for the counterfeit detection path.
+
+Drives FraudDetectionService with the products in dataset/ at several batch
+sizes and reports p50/p99 latency, throughput, peak traced memory and where
+the time goes (category/price features, OHE, both TF-IDF transforms, hstack,
+scaling, classification).
+
+Run from backend/:
+    python -m benchmarks.bench_fraud_detection                  # compare to baseline
+    python -m benchmarks.bench_fraud_detection --save-baseline  # record a new one
+    python -m benchmarks.bench_fraud_detection --batch-sizes 1,32 --tolerance 0.5
+    python -m benchmarks.bench_fraud_detection --backend onnx --onnx-threads 4
+
+Each backend keeps its own baseline.
+
+Exits with status 1 when a metric regresses beyond --tolerance.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.baseline import find_regressions, load_baseline, save_baseline
+from services.fraud_detection import FraudDetectionService
+
+DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'dataset'))
+DATASETS = ('skincare_combined_noisy.csv', 'skincare_test_dataset.csv')
+BASELINE_NAME = 'fraud_detection'
+
+# Iterations per batch size: enough samples for a p99 without running for minutes
+DEFAULT_ITERATIONS = {1: 500, 32: 100, 1000: 20, 100000: 3}
+
+
+def load_products():
+    frames = [pd.read_csv(os.path.join(DATASET_DIR, name)) for name in DATASETS]
+    df = pd.concat(frames, ignore_index=True)
+    df = df.dropna(subset=['product_name', 'ingredients', 'price', 'category'])
+    return df[['product_name', 'ingredients', 'price', 'category']].to_dict('records')
+
+
+def make_batch(products, size, offset):
+    """`size` products starting at `offset`, cycling through the dataset."""
+    idx = (np.arange(size) + offset) % len(products)
+    return [products[i] for i in idx]
+
+
+def bench_single_call(service, products, iterations):
+    """End-to-end cost of one get_counterfeit_confidence() call."""
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        product = products[i % len(products)]
+        start = time.perf_counter()
+        service.get_counterfeit_confidence(product)
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def bench_batch(service, products, size, iterations):
+    timings = {}
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        batch = make_batch(products, size, i * size)
+        start = time.perf_counter()
+        service.predict_batch(batch, timings)
+        latencies[i] = time.perf_counter() - start
+
+    # Peak memory of one extra batch, traced separately so tracing overhead
+    # does not skew the latencies above
+    batch = make_batch(products, size, 0)
+    tracemalloc.start()
+    service.predict_batch(batch)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, timings, peak
+
+
+def summarize(latencies, size):
+    return {
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'per_item_us': float(np.median(latencies) / size * 1e6),
+        'items_per_s': float(size / np.median(latencies)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FraudDetectionService")
+    parser.add_argument('--batch-sizes', default='1,32,1000,100000')
+    parser.add_argument('--iterations', type=int, default=None, help="Override iterations per batch size")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown vs baseline (fraction)")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--backend', choices=['sklearn', 'onnx'], default=None,
+                        help="Overrides FRAUD_DETECTION_BACKEND")
+    parser.add_argument('--onnx-threads', type=int, default=None, help="Overrides FRAUD_ONNX_THREADS")
+    args = parser.parse_args()
+
+    if args.backend:
+        os.environ['FRAUD_DETECTION_BACKEND'] = args.backend
+    if args.onnx_threads:
+        os.environ['FRAUD_ONNX_THREADS'] = str(args.onnx_threads)
+
+    warnings.filterwarnings('ignore')
+    service = FraudDetectionService()
+    baseline_name = BASELINE_NAME if service.backend == 'sklearn' else f"{BASELINE_NAME}_{service.backend}"
+    products = load_products()
+    print(f"{len(products)} products loaded, model version {service.metadata.get('version', 'unversioned')}, "
+          f"{service.backend} backend\n")
+
+    results = {}
+
+    # Warm-up so lazy imports and caches are not billed to the first case
+    service.predict_batch(make_batch(products, 32, 0))
+
+    iterations = args.iterations or DEFAULT_ITERATIONS[1]
+    latencies = bench_single_call(service, products, iterations)
+    results['get_counterfeit_confidence'] = summarize(latencies, 1)
+
+    for size in (int(s) for s in args.batch_sizes.split(',')):
+        iterations = args.iterations or DEFAULT_ITERATIONS.get(size, 5)
+        latencies, timings, peak = bench_batch(service, products, size, iterations)
+        case = summarize(latencies, size)
+        case['peak_mb'] = peak / 2 ** 20
+        total = sum(timings.values()) or 1.0
+        case['stages_ms'] = {
+            stage: timings.get(stage, 0.0) / iterations * 1000 for stage in service.STAGES
+        }
+        case['stages_pct'] = {
+            stage: timings.get(stage, 0.0) / total * 100 for stage in service.STAGES
+        }
+        results[f'batch_{size}'] = case
+
+    header = f"{'case':<28}{'p50 ms':>10}{'p99 ms':>10}{'us/item':>10}{'items/s':>12}{'peak MB':>10}"
+    print(header)
+    print('-' * len(header))
+    for case, r in results.items():
+        peak = f"{r['peak_mb']:>10.1f}" if 'peak_mb' in r else f"{'-':>10}"
+        print(f"{case:<28}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['per_item_us']:>10.1f}{r['items_per_s']:>12.0f}{peak}")
+
+    print("\nPer-stage time per batch (ms, share of total):")
+    print(f"{'case':<16}" + ''.join(f"{stage:>16}" for stage in service.STAGES))
+    for case, r in results.items():
+        if 'stages_ms' not in r:
+            continue
+        cells = ''.join(
+            f"{r['stages_ms'][s]:>9.3f} ({r['stages_pct'][s]:>3.0f}%)" for s in service.STAGES
+        )
+        print(f"{case:<16}{cells}")
+
+    if args.save_baseline:
+        print(f"\nBaseline saved to {save_baseline(baseline_name, results)}")
+        return
+
+    baseline = load_baseline(baseline_name)
+    if baseline is None:
+        print("\nNo baseline recorded; run with --save-baseline to create one.")
+        return
+
+    regressions = find_regressions(results, baseline, ('p50_ms', 'p99_ms', 'peak_mb'), args.tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Serialization benchmark for the list endpoints (GET /products, GET /orders).
+
+Fills an in-memory SQLite database with --rows synthetic products and
+orders, then times, per table, the query plus JSON encoding of the whole
+list for:
+
+  response_model  ORM entities through FastAPI's response_model path
+                  (validate, serialize to Python objects, json.dumps) -
+                  what the endpoints did before
+  orjson          plain column rows as dicts, encoded by orjson - what
+                  they do now (services.json_response), when installed
+  pydantic_core   the same dicts through pydantic-core's to_json, the
+                  encoder used when orjson is not installed
+
+Reports the best of --repeat runs, split into query and encode time, and
+checks every path produces the same JSON document.
+
+Run from backend/:
+    python -m benchmarks.bench_list_serialization
+    python -m benchmarks.bench_list_serialization --rows 10000 100000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+# Built before the models are imported; the app's engine is never used
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from pydantic_core import to_json  # noqa: E402
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+from services.json_response import row_dicts, schema_columns  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CATEGORIES = ['Moisturizer', 'Cleanser', 'Serum', 'Toner', 'Sunscreen', 'Oil']
+INGREDIENTS = ['aqua', 'glycerin', 'niacinamide', 'squalane', 'tocopherol', 'panthenol', 'allantoin',
+               'sodium hyaluronate', 'butylene glycol', 'cetearyl alcohol', 'dimethicone', 'parfum']
+
+
+def populate(session_factory, rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db = session_factory()
+    db.execute(insert(models.Product), [
+        {
+            'product_name': f"Product {i}",
+            'ingredients': ', '.join(rng.sample(INGREDIENTS, rng.randint(4, 10))),
+            'price': round(rng.uniform(3, 120), 2),
+            'category': rng.choice(CATEGORIES),
+            'supplier_id': 1 + i % 50,
+            'created_at': now - timedelta(minutes=i),
+            'is_flagged': rng.random() < 0.05,
+            'fraud_confidence': rng.random(),
+            'blockchain_tx': f"{i:064x}",
+            'status': 'success',
+            'message': 'Product registered successfully'
+        }
+        for i in range(rows)
+    ])
+    db.execute(insert(models.Order), [
+        {
+            'product_id': 1 + i % rows,
+            'consumer_id': 1 + i % 500,
+            'customer_name': f"Customer {i}",
+            'contact_number': f"+94 77 {i:07d}",
+            'delivery_address': f"{i} Galle Road, Colombo",
+            'status': rng.choice(['NEW', 'CONFIRMED', 'DELIVERED']),
+            'created_at': now - timedelta(minutes=i),
+            'estimated_delivery_days': rng.choice([None, 2, 3, 5]),
+            'delivery_notes': None,
+            'blockchain_tx': f"{i:064x}"
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def time_best(fn, repeat: int):
+    best = None
+    for _ in range(repeat):
+        timings, body = fn()
+        if best is None or sum(timings) < sum(best[0]):
+            best = (timings, body)
+    return best
+
+
+def bench_table(session_factory, model, schema, repeat: int):
+    field = create_model_field(name='response', type_=List[schema], mode='serialization')
+    columns = schema_columns(model, schema)
+
+    def response_model_path():
+        db = session_factory()
+        t0 = time.perf_counter()
+        entities = db.query(model).all()
+        t1 = time.perf_counter()
+        content = asyncio.run(serialize_response(field=field, response_content=entities, is_coroutine=True))
+        body = JSONResponse(content).body
+        t2 = time.perf_counter()
+        db.close()
+        return (t1 - t0, t2 - t1), body
+
+    def rows_path(encode):
+        def run():
+            db = session_factory()
+            t0 = time.perf_counter()
+            rows = db.execute(select(*columns)).all()
+            t1 = time.perf_counter()
+            body = encode(row_dicts(rows))
+            t2 = time.perf_counter()
+            db.close()
+            return (t1 - t0, t2 - t1), body
+        return run
+
+    paths = {'response_model': response_model_path}
+    if orjson is not None:
+        paths['orjson'] = rows_path(orjson.dumps)
+    paths['pydantic_core'] = rows_path(to_json)
+
+    results = {name: time_best(fn, repeat) for name, fn in paths.items()}
+    reference = json.loads(results['response_model'][1])
+    for name, (_, body) in results.items():
+        if json.loads(body) != reference:
+            raise SystemExit(f"{name} output differs from response_model")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark list endpoint serialization paths")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson not installed; skipping that path")
+    for rows in args.rows:
+        engine = create_engine('sqlite://', poolclass=StaticPool)
+        models.Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        populate(session_factory, rows)
+        for table, model, schema in (('products', models.Product, schemas.ProductOut),
+                                     ('orders', models.Order, schemas.OrderOut)):
+            results = bench_table(session_factory, model, schema, args.repeat)
+            baseline = sum(results['response_model'][0])
+            print(f"\n{table}, {rows} rows")
+            for name, ((query, encode), body) in results.items():
+                total = query + encode
+                print(f"  {name:<15} query {query * 1000:8.1f} ms  encode {encode * 1000:8.1f} ms  "
+                      f"total {total * 1000:8.1f} ms  {baseline / total:5.1f}x  {len(body) / 2 ** 20:6.1f} MiB")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
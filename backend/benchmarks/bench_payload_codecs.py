@@ -0,0 +1,130 @@
+"""
+Size and throughput benchmark for the on-chain payload codecs.
+
+Builds product and order stream items shaped like the ones BlockchainService
+publishes (products from dataset/, synthetic orders) and, for every codec
+available in services.payload_codec, reports the stored size (binary and the
+hex sent over RPC) relative to legacy hex JSON and encode/decode throughput.
+
+Run from backend/:
+    python -m benchmarks.bench_payload_codecs
+    python -m benchmarks.bench_payload_codecs --records 5000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from services.payload_codec import CODECS, decode_payload
+
+DATASET = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', 'dataset', 'skincare_combined_noisy.csv'
+))
+
+
+def product_items(limit):
+    df = pd.read_csv(DATASET).dropna(subset=['product_name', 'ingredients', 'price', 'category'])
+    now = datetime.utcnow()
+    items = []
+    for i, row in enumerate(df.head(limit).itertuples(index=False), start=1):
+        items.append({
+            "product_id": i,
+            "name": row.product_name,
+            "supplier_id": 1 + i % 50,
+            "timestamp": (now + timedelta(seconds=i)).isoformat(),
+            "price": str(row.price),
+            "ingredients": row.ingredients,
+            "category": row.category,
+            "label": str(row.label) if 'label' in df.columns else None,
+        })
+    return items
+
+
+def order_items(count):
+    """create/update items as store_order / update_order build them."""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    items = []
+    for i in range(1, count + 1):
+        created = now + timedelta(minutes=i)
+        items.append({
+            'type': 'order',
+            'action': 'create' if i % 2 else 'update',
+            'data': {
+                'id': i,
+                'consumer_id': rng.randrange(1, 500),
+                'customer_name': f"Customer {rng.randrange(10000)}",
+                'contact_number': f"07{rng.randrange(10 ** 8):08d}",
+                'delivery_address': f"{rng.randrange(1, 300)} Main Street, Colombo {rng.randrange(1, 15)}",
+                'status': rng.choice(['PENDING', 'CONFIRMED', 'DELIVERED']),
+                'estimated_delivery_days': rng.randrange(1, 10),
+                'created_at': created.isoformat(),
+                'updated_at': created.isoformat(),
+            },
+            'timestamp': created.isoformat()
+        })
+    return items
+
+
+def bench_codec(codec, items, repeat):
+    encoded = [codec.encode(item) for item in items]
+    binary = sum(len(e) // 2 for e in encoded)
+    hex_size = sum(len(e) for e in encoded)
+
+    encode_s = decode_s = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            codec.encode(item)
+        encode_s = min(encode_s, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for data_hex in encoded:
+            decode_payload(data_hex)
+        decode_s = min(decode_s, time.perf_counter() - start)
+
+    # Round-trip must reproduce the item exactly
+    assert all(decode_payload(e) == item for e, item in zip(encoded, items)), codec.name
+    return {
+        'binary_bytes': binary / len(items),
+        'hex_bytes': hex_size / len(items),
+        'encode_per_s': len(items) / encode_s,
+        'decode_per_s': len(items) / decode_s,
+    }
+
+
+def report(title, items, repeat):
+    results = {name: bench_codec(codec, items, repeat) for name, codec in CODECS.items()}
+    legacy = results['json']['hex_bytes']
+    print(f"\n{title}: {len(items)} items")
+    header = f"{'codec':<14}{'bytes/item':>12}{'hex/item':>10}{'vs legacy':>11}{'encode/s':>12}{'decode/s':>12}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:<14}{r['binary_bytes']:>12.0f}{r['hex_bytes']:>10.0f}{r['hex_bytes'] / legacy:>10.0%}"
+              f"{r['encode_per_s']:>12,.0f}{r['decode_per_s']:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare on-chain payload codecs")
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3, help="Timing passes; the best is reported")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    missing = {'msgpack', 'cbor', 'json+zstd'} - set(CODECS)
+    if missing:
+        print(f"Unavailable (dependency not installed): {', '.join(sorted(missing))}")
+
+    report('Products', product_items(args.records), args.repeat)
+    report('Orders', order_items(args.records), args.repeat)
+    print("\n'bytes/item' is what the chain stores; 'hex/item' is the RPC request body share.")
+
+
+if __name__ == "__main__":
+    main()
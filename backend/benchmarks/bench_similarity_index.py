@@ -0,0 +1,101 @@
+"""
+Scale benchmark for SimilarityIndex.
+
+Vectorizes the products in dataset/ with the fitted fraud model, then
+synthesizes --items catalogue entries as random blends of two real products
+plus sparse term noise, so the index sees realistic TF-IDF geometry at
+catalogue sizes the dataset does not reach. Queries are lightly perturbed
+copies of catalogue entries (a cloned listing). Reports add throughput,
+query latency percentiles and recall against an exact scan at the threshold.
+
+Run from backend/:
+    python -m benchmarks.bench_similarity_index
+    python -m benchmarks.bench_similarity_index --items 1000000 --queries 500
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# The index module imports the ORM models; no database is touched here
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from services.fraud_detection import FraudDetectionService  # noqa: E402
+from services.similarity_index import SimilarityIndex  # noqa: E402
+
+DATASET = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'dataset', 'skincare_combined_noisy.csv'
+)
+
+
+def synthetic_catalogue(rng, base: np.ndarray, items: int, chunk: int = 100000) -> np.ndarray:
+    out = np.empty((items, base.shape[1]), dtype=np.float32)
+    for start in range(0, items, chunk):
+        n = min(chunk, items - start)
+        a = base[rng.integers(0, len(base), n)]
+        b = base[rng.integers(0, len(base), n)]
+        mix = rng.uniform(0.2, 0.8, (n, 1)).astype(np.float32)
+        noise = (rng.random((n, base.shape[1])) < 0.05) * rng.random((n, base.shape[1])).astype(np.float32) * 0.5
+        block = mix * a + (1 - mix) * b + noise
+        out[start:start + n] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the near-duplicate product index")
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.02, help="Gaussian perturbation of query copies")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    rng = np.random.default_rng(args.seed)
+    index = SimilarityIndex(FraudDetectionService())
+    products = pd.read_csv(DATASET).dropna(subset=['product_name', 'ingredients']).to_dict('records')
+
+    start = time.perf_counter()
+    base = index.vectorize(products)
+    elapsed = time.perf_counter() - start
+    single = float('inf')
+    for product in products[:20]:
+        t = time.perf_counter()
+        index.vectorize([product])
+        single = min(single, time.perf_counter() - t)
+    print(f"Vectorized {len(base)} dataset products in {elapsed:.2f}s "
+          f"(single product: {single * 1000:.2f} ms)")
+
+    catalogue = synthetic_catalogue(rng, base, args.items)
+    start = time.perf_counter()
+    chunk = 100000
+    for offset in range(0, args.items, chunk):
+        ids = np.arange(offset, min(offset + chunk, args.items))
+        index.add(ids, np.zeros(len(ids)), catalogue[ids])
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {args.items} items in {elapsed:.2f}s ({args.items / elapsed:,.0f} items/s), "
+          f"{index.bands}x{index.rows}-bit LSH")
+
+    picks = rng.integers(0, args.items, args.queries)
+    queries = catalogue[picks] + rng.standard_normal((args.queries, base.shape[1])).astype(np.float32) * args.noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    latencies, recalls = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.query(query, limit=args.items)
+        latencies.append(time.perf_counter() - start)
+        truth = set(np.flatnonzero(catalogue @ query >= index.threshold).tolist())
+        if truth:
+            recalls.append(len(truth & {h['product_id'] for h in hits}) / len(truth))
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"Query latency: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+    print(f"Recall at similarity >= {index.threshold}: {np.mean(recalls):.3f} over {len(recalls)} queries")
+
+
+if __name__ == "__main__":
+    main()
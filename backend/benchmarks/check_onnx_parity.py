@@ -0,0 +1,84 @@
+"""
+Parity check between the ONNX backend and the joblib (sklearn) backend.
+
+Scores every product in dataset/ through FraudDetectionService twice, once
+per backend, one batch at a time and also one product at a time. Reports
+the largest probability difference and how many labels agree. onnxruntime
+computes in float32, so the probabilities are close rather than
+bit-identical. Exits 1 when the difference exceeds --tolerance or any label
+differs.
+
+Needs the exported graph (model/export_onnx.py) in ml_models/.
+
+Run from backend/:
+    python -m benchmarks.check_onnx_parity
+    python -m benchmarks.check_onnx_parity --tolerance 1e-3 --single 200
+"""
+
+import argparse
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# The service imports the ORM models; no database is touched here
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from services.fraud_detection import FraudDetectionService  # noqa: E402
+
+DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'dataset'))
+
+
+def load_products():
+    frames = [
+        pd.read_csv(os.path.join(DATASET_DIR, name))
+        for name in sorted(os.listdir(DATASET_DIR)) if name.endswith('.csv')
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    df = df.dropna(subset=['product_name', 'ingredients', 'price', 'category'])
+    return df[['product_name', 'ingredients', 'price', 'category']].to_dict('records')
+
+
+def service_for(backend: str) -> FraudDetectionService:
+    os.environ['FRAUD_DETECTION_BACKEND'] = backend
+    return FraudDetectionService()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX and sklearn fraud model backends")
+    parser.add_argument('--tolerance', type=float, default=1e-4, help="Max allowed probability difference")
+    parser.add_argument('--single', type=int, default=500, help="Products also scored one at a time")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    reference = service_for('sklearn')
+    onnx = service_for('onnx')
+    products = load_products()
+    print(f"{len(products)} products from dataset/")
+
+    expected = reference.predict_batch(products)
+    cases = {
+        'batch': onnx.predict_batch(products),
+        'single': [onnx.predict_batch([p])[0] for p in products[:args.single]],
+    }
+
+    ok = True
+    for case, results in cases.items():
+        p_ref = np.array([r['confidence'] for r in expected[:len(results)]])
+        p_onnx = np.array([r['confidence'] for r in results])
+        diff = np.abs(p_ref - p_onnx)
+        mismatched = sum(
+            a['is_counterfeit'] != b['is_counterfeit'] for a, b in zip(expected, results)
+        )
+        print(f"  {case:<7} rows {len(results):>6}  max diff {diff.max():.2e}  "
+              f"mean diff {diff.mean():.2e}  label mismatches {mismatched}")
+        ok &= bool(diff.max() <= args.tolerance) and mismatched == 0
+
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Parity check between the compiled scorer and the sklearn path.
+
+Scores every product in dataset/ (plus variants with unknown categories,
+out-of-range prices and shuffled casing, to reach branches the dataset
+alone does not) through both paths of FraudDetectionService. Compares the
+per-stage features and the final probabilities. Probabilities must be
+bit-identical; any difference is printed and the script exits 1.
+
+Run from backend/:
+    python -m benchmarks.check_scorer_parity
+"""
+
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# The service imports the ORM models; no database is touched here
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from services.compiled_scorer import CompiledScorer  # noqa: E402
+from services.fraud_detection import FraudDetectionService  # noqa: E402
+
+DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'dataset'))
+
+
+def load_products():
+    frames = [
+        pd.read_csv(os.path.join(DATASET_DIR, name))
+        for name in sorted(os.listdir(DATASET_DIR)) if name.endswith('.csv')
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    df = df.dropna(subset=['product_name', 'ingredients', 'price', 'category'])
+    products = df[['product_name', 'ingredients', 'price', 'category']].to_dict('records')
+
+    rng = np.random.default_rng(0)
+    variants = []
+    for product in products:
+        variants.append({**product, 'category': product['category'] + ' X'})
+        variants.append({**product, 'price': float(product['price']) * rng.choice([0.01, 0.5, 3.0, 100.0])})
+        variants.append({
+            **product,
+            'product_name': product['product_name'].upper(),
+            'ingredients': ', '.join(reversed(str(product['ingredients']).split(',')))
+        })
+    return products + variants
+
+
+def compare(label, expected, actual) -> bool:
+    expected, actual = np.asarray(expected), np.asarray(actual)
+    if expected.shape == actual.shape and np.array_equal(expected, actual):
+        print(f"  {label:<14} identical {expected.shape}")
+        return True
+    if expected.shape != actual.shape:
+        print(f"  {label:<14} SHAPE MISMATCH {expected.shape} vs {actual.shape}")
+    else:
+        diff = np.abs(expected.astype(float) - actual.astype(float))
+        print(f"  {label:<14} MISMATCH in {int((diff > 0).sum())} cells, max abs diff {diff.max():.3e}")
+    return False
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    service = FraudDetectionService()
+    products = load_products()
+    rows = [service._clean_row(p) for p in products]
+    print(f"{len(rows)} products ({len(rows) // 4} from dataset/ plus variants)")
+
+    # max_rows covering every row keeps all stages on the compiled path
+    scorer = CompiledScorer(
+        service.ohe, service.tf_name, service.tf_ing, service.scaler, service.clf, max_rows=len(rows)
+    )
+    print(f"Compiled stages: {', '.join(scorer.compiled_stages) or 'none'}")
+
+    names = [r['name'] for r in rows]
+    ings = [r['ings'] for r in rows]
+    cats = [r['cat'] for r in rows]
+    ok = compare('ohe', service.ohe.transform(pd.DataFrame({service.ohe.feature_names_in_[0]: cats})),
+                 scorer.encode_categories(cats))
+    ok &= compare('tf_name', service.tf_name.transform(names).toarray(), scorer.name_features(names))
+    ok &= compare('tf_ing', service.tf_ing.transform(ings).toarray(), scorer.ingredient_features(ings))
+
+    service.scorer = None
+    reference = service._predict_rows(rows)
+    service.scorer = scorer
+    batched = service._predict_rows(rows)
+    small = [r for i in range(0, len(rows), 32) for r in service._predict_rows(rows[i:i + 32])]
+    single = [service._predict_rows([row])[0] for row in rows]
+
+    expected = np.array([r['confidence'] for r in reference])
+    ok &= compare('proba (batch)', expected, np.array([r['confidence'] for r in batched]))
+    ok &= compare('proba (32s)', expected, np.array([r['confidence'] for r in small]))
+    ok &= compare('proba (single)', expected, np.array([r['confidence'] for r in single]))
+    ok &= compare('labels', [r['is_counterfeit'] for r in reference], [r['is_counterfeit'] for r in batched])
+
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+In-process stand-in for a MultiChain node's JSON-RPC API.
+
+Implements the calls BlockchainService makes (getinfo, liststreams, create,
+subscribe, publish, liststreamkeyitems, liststreamitems, gettxoutdata) over
+an in-memory store, with configurable latency and error rate so load tests
+can model a slow or flaky node.
+
+    stub = MultiChainStub(latency_ms=20, error_rate=0.01).start()
+    os.environ['MULTICHAIN_HOST'], os.environ['MULTICHAIN_PORT'] = stub.host, str(stub.port)
+    ...
+    stub.stop()
+"""
+
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+class MultiChainStub:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.host = host
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls: Dict[str, int] = {}
+
+        self._streams: Dict[str, List[Dict[str, Any]]] = {}
+        self._txs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MultiChainStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # RPC methods
+
+    def _getinfo(self, params):
+        return {'chainname': 'stub', 'streams': len(self._streams)}
+
+    def _liststreams(self, params):
+        return [{'name': name, 'items': len(items)} for name, items in self._streams.items()]
+
+    def _create(self, params):
+        _, name, _open = params[:3]
+        self._streams.setdefault(name, [])
+        return secrets.token_hex(32)
+
+    def _subscribe(self, params):
+        return None
+
+    def _publish(self, params):
+        stream, key, data = params[:3]
+        txid = secrets.token_hex(32)
+        item = {
+            'publishers': ['stub'],
+            'keys': [key] if isinstance(key, str) else list(key),
+            'key': key,
+            'data': data,
+            'txid': txid,
+            'time': time.time(),
+            'confirmations': 1,
+        }
+        self._streams.setdefault(stream, []).append(item)
+        self._txs[txid] = data
+        return txid
+
+    def _liststreamkeyitems(self, params):
+        stream, key = params[:2]
+        count = params[3] if len(params) > 3 else None
+        items = [i for i in self._streams.get(stream, []) if key in i['keys']]
+        return items[-count:] if count else items
+
+    def _liststreamitems(self, params):
+        stream = params[0]
+        count = params[2] if len(params) > 2 else None
+        items = self._streams.get(stream, [])
+        return items[-count:] if count else items
+
+    def _gettxoutdata(self, params):
+        return self._txs.get(params[0])
+
+    def dispatch(self, method: str, params: list):
+        """Returns (result, error) like a MultiChain node."""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            handler = getattr(self, f"_{method}", None)
+            if handler is None:
+                return None, {'code': -32601, 'message': f"Method not found: {method}"}
+            try:
+                return handler(params), None
+            except (ValueError, IndexError, KeyError) as e:
+                return None, {'code': -8, 'message': str(e)}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                delay = stub.latency_ms + random.uniform(-stub.jitter_ms, stub.jitter_ms)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                if random.random() < stub.error_rate:
+                    self.send_response(500)
+                    self.end_headers()
+                    self.wfile.write(b'stub: injected failure')
+                    return
+
+                request = json.loads(body or b'{}')
+                result, error = stub.dispatch(request.get('method', ''), request.get('params') or [])
+                payload = json.dumps({'result': result, 'error': error, 'id': request.get('id')}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,87 @@
+# logging_config.py
+
+import itertools
+import logging
+import os
+import sys
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+
+class InterceptHandler(logging.Handler):
+    """Route stdlib logging (uvicorn, httpx, sqlalchemy) into loguru's sinks."""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        logger.opt(depth=6, exception=record.exc_info).log(level, record.getMessage())
+
+
+class LogSampler:
+    """Deterministic 1-in-N sampling for high-volume log lines."""
+
+    def __init__(self, rate: float):
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def __call__(self) -> bool:
+        return self.every > 0 and next(self._counter) % self.every == 0
+
+
+def preview(value: Any, limit: int = 200) -> str:
+    """Bounded repr for payloads (hex blobs, RPC bodies) that may be megabytes long."""
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def _module_levels(default: str) -> Dict[str, str]:
+    """
+    Parse LOG_LEVELS, e.g. "services.blockchain_service=WARNING,httpx=WARNING".
+    Names match loguru record names, i.e. module paths.
+    """
+    levels = {"": default}
+    for entry in os.getenv("LOG_LEVELS", "").split(","):
+        if "=" in entry:
+            module, level = entry.split("=", 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Configure loguru once at startup. Sinks are enqueued, so request threads
+    only push records onto a queue and a background thread does the I/O.
+    """
+    default_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    levels = _module_levels(default_level)
+    # Sinks must accept the lowest configured level; the filter does the rest
+    min_level = min(logger.level(level).no for level in levels.values())
+
+    logger.remove()
+    logger.add(sys.stderr, level=min_level, filter=levels, format=LOG_FORMAT, enqueue=True)
+
+    log_file = os.getenv("LOG_FILE")
+    if log_file:
+        logger.add(
+            log_file, level=min_level, filter=levels, format=LOG_FORMAT, enqueue=True,
+            rotation=os.getenv("LOG_ROTATION", "100 MB"), retention=os.getenv("LOG_RETENTION", "7 days")
+        )
+
+    # Stdlib records are intercepted at the same threshold
+    logging.basicConfig(handlers=[InterceptHandler()], level=min_level, force=True)
+    for name, level in levels.items():
+        if name:
+            logging.getLogger(name).setLevel(level)
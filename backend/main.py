@@ -1,24 +1,84 @@
+from logging_config import setup_logging
+setup_logging()
+
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, status
+from fastapi.responses import StreamingResponse
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models, schemas, auth
 from database import SessionLocal, engine
+from migrations import add_missing_columns
 from services.fraud_detection import FraudDetectionService
 from services.blockchain_service import BlockchainService
 from services.order_service import OrderService
 from services.payment_service import PaymentService
+from services.merkle_anchor import MerkleAnchorService
+from services.chain_outbox import ChainOutbox
+from services.provenance import ProvenanceService
+from services.shipment_service import ShipmentService
+from services.route_anomaly import RouteAnomalyDetector
+from services.similarity_index import SimilarityIndex
+from services.ingredient_index import IngredientIndex, normalize_ingredient
+from services.rescoring import RescoringService
+from services.flag_summary import FlagSummaryService, SORTS as FLAG_SORTS
+from services.event_bus import EventBus
+from services.export import ExportService, EXPORTS, FORMATS as EXPORT_FORMATS, MEDIA_TYPES as EXPORT_MEDIA_TYPES
+from services.catalog_import import CatalogImportService, FORMATS as IMPORT_FORMATS
+from services.json_response import CompressionMiddleware, json_response, row_dicts, schema_columns
+from services.metrics import MetricsMiddleware, instrument_engine, render_metrics
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from loguru import logger
 from models import UserRole
+import asyncio
+import os
+
+# Penalized flags before a supplier is blocked, for single registrations and imports
+SUPPLIER_BLOCK_AFTER = int(os.getenv("SUPPLIER_BLOCK_AFTER", "3"))
 
 fraud_detector = FraudDetectionService()
 blockchain_service = BlockchainService()
 order_service = OrderService()
 payment_service = PaymentService()
+provenance_service = ProvenanceService()
+shipment_service = ShipmentService(provenance=provenance_service)
+route_detector = RouteAnomalyDetector()
+similarity_index = SimilarityIndex(fraud_detector)
+ingredient_index = IngredientIndex()
+event_bus = EventBus()
+flag_summary = FlagSummaryService()
+rescoring_service = RescoringService(fraud_detector, SessionLocal, provenance=provenance_service,
+                                     flag_summary=flag_summary)
+catalog_import = CatalogImportService(fraud_detector, blockchain_service, ingredient_index, similarity_index,
+                                      flag_summary=flag_summary, block_after=SUPPLIER_BLOCK_AFTER)
+export_service = ExportService(SessionLocal)
+
+online_learner = None
+if os.getenv("ONLINE_LEARNING_ENABLED", "false").lower() == "true":
+    # Imported here: online learning needs sklearn, which the ONNX backend does not
+    from services.online_learning import OnlineLearningService
+    online_learner = OnlineLearningService(
+        categories=fraud_detector.categories,
+        median_price_map=fraud_detector.median_price_map
+    )
+
+# CHAIN_ANCHOR_MODE=merkle: one chain transaction per window instead of per event
+anchor_service = None
+if os.getenv("CHAIN_ANCHOR_MODE", "direct").lower() == "merkle":
+    anchor_service = MerkleAnchorService(blockchain_service, SessionLocal)
+    blockchain_service.anchor = anchor_service
+    anchor_service.on_anchored = provenance_service.refresh_many
+
+# Chain writes made while MultiChain is unreachable; drained by the health checker
+chain_outbox = ChainOutbox(blockchain_service, SessionLocal)
+chain_outbox.on_published = provenance_service.refresh_many
+blockchain_service.outbox = chain_outbox
 
 
 models.Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, models.Base.metadata)
+instrument_engine(engine)
 
 def get_db():
     db = SessionLocal()
@@ -27,15 +87,123 @@ def get_db():
     finally:
         db.close()
 
+def refresh_provenance(db: Session, product_id: int):
+    # Snapshots are derived data: a failed refresh must not fail the write
+    try:
+        provenance_service.refresh(db, product_id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Provenance refresh failed for product {product_id}: {str(e)}")
+
+def build_similarity_index():
+    db = SessionLocal()
+    try:
+        similarity_index.build(db)
+    except Exception as e:
+        logger.error(f"Similarity index build failed: {str(e)}")
+    finally:
+        db.close()
+
+def backfill_ingredient_index():
+    db = SessionLocal()
+    try:
+        ingredient_index.backfill(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ingredient index backfill failed: {str(e)}")
+    finally:
+        db.close()
+
+def backfill_flag_summary():
+    db = SessionLocal()
+    try:
+        flag_summary.backfill(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Flag summary backfill failed: {str(e)}")
+    finally:
+        db.close()
+
+def publish_model(path: str = None) -> bool:
+    # A reloaded model leaves stored verdicts stale until they are re-scored
+    reloaded = fraud_detector.reload_if_updated(path)
+    if reloaded:
+        db = SessionLocal()
+        try:
+            rescoring_service.enqueue(db)
+        finally:
+            db.close()
+    return reloaded
+
+def publish_flag_event(flag: models.FlaggedProduct, product: models.Product):
+    event_bus.publish("product.flagged", {
+        "flag_id": flag.id,
+        "product_id": product.id,
+        "product_name": product.product_name,
+        "supplier_id": product.supplier_id,
+        "reason": flag.reason,
+        "fraud_confidence": product.fraud_confidence,
+        "created_at": flag.created_at
+    }, roles=[UserRole.ADMIN], user_ids=[product.supplier_id])
+
+def publish_order_event(order: models.Order):
+    event_bus.publish("order.status", {
+        "order_id": order.id,
+        "product_id": order.product_id,
+        "status": order.status,
+        "estimated_delivery_days": order.estimated_delivery_days,
+        "delivery_notes": order.delivery_notes,
+        "blockchain_tx": order.blockchain_tx
+    }, roles=[UserRole.ADMIN, UserRole.LOGISTICS],
+       user_ids=[order.consumer_id, order.product.supplier_id if order.product else None])
+
+def publish_payment_event(db: Session, payment: models.Payment):
+    consumer_id, supplier_id = (
+        db.query(models.Order.consumer_id, models.Product.supplier_id)
+        .outerjoin(models.Product, models.Order.product_id == models.Product.id)
+        .filter(models.Order.id == payment.order_id)
+        .first()
+    ) or (None, None)
+    event_bus.publish("payment.updated", {
+        "payment_id": payment.id,
+        "order_id": payment.order_id,
+        "status": payment.status,
+        "user_signed": payment.user_signed,
+        "producer_signed": payment.producer_signed,
+        "admin_signed": payment.admin_signed
+    }, roles=[UserRole.ADMIN], user_ids=[consumer_id, supplier_id])
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application...")
     if not await blockchain_service.init_stream():
-        logger.warning("Application starting in offline mode (no blockchain)")
+        logger.warning("Application starting in offline mode (no blockchain); retrying in the background")
+    db = SessionLocal()
+    try:
+        fraud_detector.price_stats.refresh_from_db(db)
+        if os.getenv("RESCORE_ON_MODEL_CHANGE", "true").lower() == "true":
+            rescoring_service.enqueue_if_model_changed(db)
+    finally:
+        db.close()
+    background_tasks = [
+        asyncio.create_task(asyncio.to_thread(build_similarity_index)),
+        asyncio.create_task(asyncio.to_thread(backfill_ingredient_index)),
+        asyncio.create_task(asyncio.to_thread(backfill_flag_summary)),
+        asyncio.create_task(rescoring_service.run_forever()),
+        asyncio.create_task(blockchain_service.run_health_checks())
+    ]
+    if online_learner:
+        background_tasks.append(asyncio.create_task(
+            online_learner.run_forever(SessionLocal, on_publish=publish_model)
+        ))
+    if anchor_service:
+        background_tasks.append(asyncio.create_task(anchor_service.run_forever()))
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    for task in background_tasks:
+        task.cancel()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -46,6 +214,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Event streams would stall in the gzip buffer; exports compress themselves
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1000")),
+    excluded_paths=("/events", "/exports")
+)
+
+# Prometheus scrape endpoint: request, DB, ML stage and MultiChain RPC latencies
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+# Server-sent events for dashboards: flags, order status and payment signatures as
+# deltas. EventSource cannot set headers, so it authenticates with ?token= holding
+# a short-lived stream token from POST /auth/stream-token, never the bearer token.
+# A client reopening the stream with a fresh token resumes with ?last_event_id=
+@app.get("/events", include_in_schema=False)
+async def stream_events(
+    request: Request,
+    types: Optional[str] = None,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    resume: Optional[str] = Query(None, alias="last_event_id")
+):
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # Short-lived session: the stream itself holds no connection
+    db = SessionLocal()
+    try:
+        current_user = auth.user_from_token(token, db, scope=auth.STREAM_SCOPE)
+        user_id, role = current_user.id, current_user.role
+    finally:
+        db.close()
+
+    last_event_id = last_event_id or resume
+    wanted = {t.strip() for t in types.split(",") if t.strip()} if types else None
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = event_bus.subscribe(user_id, role, wanted, resume_from)
+    heartbeat = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=heartbeat)
+                if subscription.take_overflow():
+                    # Events were dropped for this client; it must refetch its lists
+                    yield "event: resync\ndata: {}\n\n"
+                elif event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield event.sse()
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Authentication Endpoints
 @app.post("/auth/signup", response_model=schemas.UserOut, status_code=201)
@@ -55,7 +282,6 @@ def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username already taken")
     
     hashed_pw = auth.get_password_hash(user.password)
-    logger.debug(f"Hashed password: {hashed_pw}") 
     
     new_user = models.User(
         email=user.email,
@@ -91,6 +317,10 @@ def login(request: schemas.LoginData, db: Session = Depends(get_db)):
     access_token = auth.create_access_token(data={"sub": user.username, "role": user.role.value})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/auth/stream-token", response_model=schemas.StreamToken)
+def stream_token(current_user: models.User = Depends(auth.get_current_user)):
+    return {"token": auth.create_stream_token(current_user), "expires_in": auth.STREAM_TOKEN_EXPIRE_SECONDS}
+
 # Product Endpoints
 @app.post("/products", response_model=schemas.ProductOut)
 async def create_product(
@@ -118,9 +348,9 @@ async def create_product(
     try:
         # Check for counterfeit
         logger.info(f"Running fraud detection for product: {product.product_name}")
-        is_counterfeit, confidence, reason = fraud_detector.get_counterfeit_confidence(
-            product.model_dump()
-        )
+        prediction = fraud_detector.predict(product.model_dump())
+        is_counterfeit, confidence = prediction['is_counterfeit'], prediction['confidence']
+        reason = fraud_detector.describe(prediction)
         logger.info(f"Prediction result: {is_counterfeit}, Confidence: {confidence:.2%}, Reason: {reason}")
         
         # Remove description before passing to ORM
@@ -136,8 +366,18 @@ async def create_product(
         )
         
         db.add(new_product)
+        db.flush()
+        ingredient_index.index_product(db, new_product.id, new_product.ingredients)
         db.commit()
         db.refresh(new_product)
+
+        # Cloned listings: close matches among other suppliers' products. Until
+        # the startup build finishes, new products are picked up by the build.
+        clones = []
+        if similarity_index.ready:
+            vector = similarity_index.vectorize([product_data])
+            clones = similarity_index.query(vector[0], limit=5, exclude_supplier=current_user.id)
+            similarity_index.add([new_product.id], [current_user.id], vector)
         
         if is_counterfeit:
             flagged_product = models.FlaggedProduct(
@@ -147,17 +387,22 @@ async def create_product(
             )
             
             db.add(flagged_product)
+            flag_summary.refresh(db, [new_product.id])
             
-            if not penalty:
-                penalty = models.SupplierPenalty(supplier_id=current_user.id)
-                db.add(penalty)
-                
-            penalty.penalty_count += 1
-            
-            if penalty.penalty_count >= 3:
-                penalty.is_blocked = True
+            # Some rules (e.g. an empty ingredient list) flag for review only
+            if prediction['penalize']:
+                if not penalty:
+                    penalty = models.SupplierPenalty(supplier_id=current_user.id, penalty_count=0)
+                    db.add(penalty)
+
+                penalty.penalty_count += 1
+
+                if penalty.penalty_count >= SUPPLIER_BLOCK_AFTER:
+                    penalty.is_blocked = True
                 
             db.commit()
+            refresh_provenance(db, new_product.id)
+            publish_flag_event(flagged_product, new_product)
             
             new_product.status = "warning"
             new_product.message = f"Product flagged as potentially counterfeit. Confidence: {confidence:.2%}"
@@ -175,34 +420,182 @@ async def create_product(
             else:
                 db.commit()  # Commit with tx hash
                 db.refresh(new_product)
+
+            fraud_detector.price_stats.observe(new_product.id, new_product.category, new_product.price)
+            if clones:
+                match = clones[0]
+                logger.warning(f"Product {new_product.id} resembles product {match['product_id']} "
+                               f"of supplier {match['supplier_id']} ({match['similarity']:.2%})")
+                # Surfaced for review only; a clone match alone carries no penalty
+                clone_flag = models.FlaggedProduct(
+                    product_id=new_product.id,
+                    supplier_id=current_user.id,
+                    reason=f"Possible clone of product #{match['product_id']} ({match['similarity']:.0%} similar)"
+                )
+                db.add(clone_flag)
+                flag_summary.refresh(db, [new_product.id])
+                db.commit()
+                publish_flag_event(clone_flag, new_product)
+            refresh_provenance(db, new_product.id)
+            if clones:
+                new_product.status = "warning"
+                new_product.message = (
+                    "Product registered; closely matches existing products of other suppliers: "
+                    + ", ".join(f"#{c['product_id']}" for c in clones)
+                )
                 
         return new_product
         
     except Exception as e:
         db.rollback()
-        logger.error("Product registration failed: {}", str(e), exc_info=True)
+        logger.opt(exception=True).error("Product registration failed: {}", str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to register product: {str(e)}"
         )
 
+# Bulk catalog upload: the raw body is CSV (dataset/ columns) or NDJSON, streamed
+# to disk and imported in chunks by a background job
+@app.post("/products/import", response_model=schemas.ImportJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def import_products(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.SUPPLIER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only suppliers can import products"
+        )
+    penalty = db.query(models.SupplierPenalty).filter(
+        models.SupplierPenalty.supplier_id == current_user.id
+    ).first()
+    if penalty and penalty.is_blocked:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Account is blocked due to {penalty.penalty_count} violations"
+        )
+
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {', '.join(IMPORT_FORMATS)}"
+        )
+    try:
+        path = await catalog_import.spool(request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    job = catalog_import.create_job(db, current_user.id, format)
+    background_tasks.add_task(catalog_import.run, job.id, path, SessionLocal)
+    logger.info(f"Import job {job.id} queued for supplier {current_user.id} ({format})")
+    return job
+
+@app.get("/products/import/{job_id}", response_model=schemas.ImportProgressOut)
+async def get_import_progress(
+    job_id: int,
+    after_row: int = 0,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    job = db.get(models.ImportJob, job_id)
+    if job is None or (current_user.role != UserRole.ADMIN and job.supplier_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return catalog_import.progress(db, job, after_row=after_row, limit=max(1, min(limit, 5000)))
+
+# List endpoints select the response columns as plain rows and encode them
+# directly (services/json_response.py); response_model documents the shape
 @app.get("/products", response_model=List[schemas.ProductOut])
-def get_all_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-
-    valid_products = []
-    for product in products:
-        if (
-            product.created_at is not None and
-            product.status is not None and
-            product.message is not None and
-            product.is_flagged is not None
-        ):
-            valid_products.append(product)
-        else:
-            logger.warning(f"Invalid product data: {product}")
+def get_all_products(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    P = models.Product
+    rows = (
+        db.query(*schema_columns(P, schemas.ProductOut))
+        .filter(P.created_at.isnot(None), P.status.isnot(None), P.message.isnot(None), P.is_flagged.isnot(None))
+        .order_by(P.id)
+        .all()
+    )
+    return json_response(row_dicts(rows), if_none_match)
+
+# Consumer verification (QR scans): served from the provenance snapshot, no chain calls
+@app.get("/products/{product_id}/provenance")
+def get_product_provenance(
+    product_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    snapshot = provenance_service.get(db, product_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    return valid_products
+    etag, body = snapshot
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Composition queries for investigations: ?ingredient=glycerin&ingredient=niacinamide&match=all
+@app.get("/products/by-ingredients", response_model=schemas.IngredientSearchOut)
+async def search_products_by_ingredients(
+    ingredient: List[str] = Query(...),
+    match: str = "all",
+    after_id: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can search products by ingredient"
+        )
+    if match not in ("all", "any"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="match must be 'all' or 'any'"
+        )
+    limit = max(1, min(limit, 1000))
+    product_ids = ingredient_index.search(db, ingredient, match_all=match == "all", after_id=after_id, limit=limit)
+    products = (
+        db.query(models.Product).filter(models.Product.id.in_(product_ids)).order_by(models.Product.id).all()
+        if product_ids else []
+    )
+    return {
+        "ingredients": sorted({normalize_ingredient(name) for name in ingredient} - {""}),
+        "match": match,
+        "products": products,
+        "next_after_id": product_ids[-1] if len(product_ids) == limit else None
+    }
+
+@app.get("/products/{product_id}/similar", response_model=List[schemas.SimilarProductOut])
+async def get_similar_products(
+    product_id: int,
+    limit: int = 10,
+    threshold: Optional[float] = None,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if not similarity_index.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Similarity search is not available with this fraud model backend"
+        )
+    if not similarity_index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Similarity index is still building"
+        )
+    matches = similarity_index.similar_to(product_id, limit=min(limit, 100), threshold=threshold)
+    if matches is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found in similarity index"
+        )
+    return matches
 
 @app.delete("/products/{product_id}", status_code=204)
 async def delete_product(
@@ -234,8 +627,12 @@ async def delete_product(
     
     try:
         # Delete the product
+        provenance_service.delete(db, product_id)
+        flag_summary.remove(db, product_id)
+        ingredient_index.remove(db, product_id)
         db.delete(product)
         db.commit()
+        similarity_index.remove(product_id)
         logger.info(f"Product with ID {product_id} deleted successfully")
     except Exception as e:
         db.rollback()
@@ -303,6 +700,7 @@ async def update_order_status(
             logger.info(f"Order updated with blockchain tx: {tx_id}")
         
         db.commit()
+        publish_order_event(order)
         return order
 
     except Exception as e:
@@ -327,17 +725,19 @@ async def get_filtered_orders(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     consumer_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
+    columns = schema_columns(models.Order, schemas.OrderOut)
     # Admins and logistics can see all or filter by consumer_id
     if current_user.role in [models.UserRole.ADMIN, models.UserRole.LOGISTICS]:
         if consumer_id:
-            query = db.query(models.Order).filter(models.Order.consumer_id == consumer_id)
+            query = db.query(*columns).filter(models.Order.consumer_id == consumer_id)
         else:
-            query = db.query(models.Order)
+            query = db.query(*columns)
     elif current_user.role == models.UserRole.CONSUMER:
-        query = db.query(models.Order).filter(models.Order.consumer_id == current_user.id)
+        query = db.query(*columns).filter(models.Order.consumer_id == current_user.id)
     else:
         raise HTTPException(status_code=403, detail="Access denied")
 
@@ -348,7 +748,42 @@ async def get_filtered_orders(
     if end_date:
         query = query.filter(models.Order.created_at <= end_date)
 
-    return query.all()
+    return json_response(row_dicts(query.order_by(models.Order.id).all()), if_none_match)
+
+# Compliance exports: GET /exports/{products|orders|payments}?format=ndjson|csv&gzip=true&since=<cursor>
+# Streams rows with ids in (since, X-Export-Cursor]; pass that header back as `since` next time
+@app.get("/exports/{entity}")
+def export_table(
+    entity: str,
+    format: str = "ndjson",
+    since: int = 0,
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can export data"
+        )
+    if entity not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {entity}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    until = max(since, export_service.upper_bound(db, entity))
+    filename = f"{entity}-{since + 1}-{until}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_service.stream(entity, format, since, until, gzip=gzip),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Cursor": str(until)
+        }
+    )
 
 @app.get("/orders/{order_id}", response_model=schemas.OrderOut)
 async def get_order(
@@ -389,56 +824,251 @@ async def get_order_ledger(
             detail="Failed to fetch order ledger"
         )
     
-# display all flagged-products along with their supplier
-@app.get("/flagged-products", response_model=List[schemas.FlaggedProductWithDetails])
-async def get_flagged_products(
+async def report_route_anomalies(db: Session, anomalies: List[dict]) -> dict:
+    # DB first (anomaly rows, flags, provenance), then the anomalies stream
+    by_product = route_detector.record(db, anomalies, provenance=provenance_service,
+                                       flag_summary=flag_summary)
+    for product_id, items in by_product.items():
+        await blockchain_service.store_anomaly(product_id, [
+            {"event_id": a["event_id"], "kind": a["kind"], "detail": a["detail"], "recorded_at": a["recorded_at"]}
+            for a in items
+        ])
+    provenance_service.refresh_many(db, by_product)
+    return by_product
+
+async def check_shipment_routes(product_ids: List[int]):
+    # Runs after the ingest response is sent, on its own session
+    db = SessionLocal()
+    try:
+        anomalies = route_detector.scan(db, product_ids)
+        if anomalies:
+            await report_route_anomalies(db, anomalies)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Route anomaly check failed: {str(e)}")
+    finally:
+        db.close()
+
+# Shipment tracking: bulk ingest from scanners, latest position and route history
+@app.post("/shipments/batch", response_model=schemas.ShipmentBatchOut)
+async def ingest_shipment_events(
+    batch: schemas.ShipmentBatchIn,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    if current_user.role != "admin":
+    if current_user.role not in [UserRole.LOGISTICS, UserRole.MANUFACTURER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Only logistics, manufacturers and admins can log shipments")
+    if not batch.events:
+        return {"accepted": 0, "unknown_products": []}
+    if len(batch.events) > shipment_service.max_batch:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {shipment_service.max_batch} events per batch"
+        )
+
+    try:
+        result = shipment_service.ingest(db, batch.events, current_user.id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Shipment ingest failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to store shipment events")
+    if result["unknown_products"]:
+        logger.warning(f"Skipped shipment events for unknown products: {result['unknown_products'][:20]}")
+    if result["rows"]:
+        background_tasks.add_task(check_shipment_routes, sorted({row["product_id"] for row in result["rows"]}))
+    return result
+
+# Admin rescan of every shipment history, e.g. after changing ROUTE_* thresholds
+@app.post("/shipments/route-scan", response_model=schemas.RouteScanOut)
+async def rescan_shipment_routes(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can rescan shipment routes")
+
+    anomalies = route_detector.scan_all(db)
+    by_product = await report_route_anomalies(db, anomalies) if anomalies else {}
+    return {"anomalies": len(anomalies), "products_flagged": len(by_product)}
+
+@app.get("/products/{product_id}/shipments/latest", response_model=schemas.ShipmentPositionOut)
+async def get_latest_shipment_position(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    position = shipment_service.latest_position(db, product_id)
+    if not position:
+        raise HTTPException(status_code=404, detail="No shipment events for this product")
+    return position
+
+@app.get("/products/{product_id}/shipments", response_model=List[schemas.ShipmentEventOut])
+async def get_shipment_history(
+    product_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return shipment_service.history(db, product_id, since, until, min(max(limit, 1), 5000))
+
+# Merkle inclusion proofs for every event recorded for a product or order
+@app.get("/anchors/{entity_type}/{entity_id}/verify", response_model=List[schemas.AnchorProofOut])
+async def verify_anchored_events(
+    entity_type: str,
+    entity_id: int,
+    check_chain: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if anchor_service is None:
+        raise HTTPException(status_code=404, detail="Merkle anchoring is not enabled")
+    if entity_type not in ("product", "order"):
+        raise HTTPException(status_code=400, detail="entity_type must be 'product' or 'order'")
+
+    proofs = anchor_service.proofs_for(db, entity_type, entity_id)
+    if not proofs:
+        raise HTTPException(status_code=404, detail=f"No anchored events for this {entity_type}")
+
+    if check_chain:
+        # One read per batch: compare the stored root with the one on chain
+        chain_roots = {}
+        for proof in proofs:
+            batch_id = proof["batch_id"]
+            if proof["blockchain_tx"] and batch_id not in chain_roots:
+                manifest = await blockchain_service.get_anchor_manifest(f"anchor_{batch_id}")
+                chain_roots[batch_id] = manifest.get("root") if manifest else None
+            if batch_id in chain_roots:
+                proof["chain_root_matches"] = chain_roots[batch_id] == proof["root"]
+
+    return proofs
+
+# Hit rates of the fraud pre-filter rules and how many products skipped the model
+@app.get("/fraud/rules/stats", response_model=schemas.RuleFilterStatsOut)
+async def get_fraud_rule_stats(current_user: models.User = Depends(auth.get_current_user)):
+    if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can view flagged products"
+            detail="Only admins can view fraud rule statistics"
         )
+    return fraud_detector.rules.stats()
 
-    # Query FlaggedProduct along with associated User (supplier) and Product
-    flagged_products = (
-        db.query(models.FlaggedProduct)
-        .join(models.User, models.FlaggedProduct.supplier_id == models.User.id)
-        .join(models.Product, models.FlaggedProduct.product_id == models.Product.id)
-        .add_entity(models.User)
-        .add_entity(models.Product)
+# Re-scoring of stored verdicts with the served model; queued automatically on model changes
+@app.post("/rescore-jobs", response_model=schemas.RescoreJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def create_rescore_job(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can re-score the catalog")
+    return rescoring_service.enqueue(db, requested_by=current_user.id)
+
+@app.get("/rescore-jobs", response_model=List[schemas.RescoreJobOut])
+async def list_rescore_jobs(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view re-scoring jobs")
+    return (
+        db.query(models.RescoreJob)
+        .order_by(models.RescoreJob.id.desc())
+        .limit(max(1, min(limit, 100)))
         .all()
     )
 
-    result = []
-    for fp, user, product in flagged_products:
-        result.append({
-            "id": fp.id,
-            "product_id": fp.product_id,
-            "supplier_id": fp.supplier_id,
-            "reason": fp.reason,
-            "created_at": fp.created_at,
-            "supplier": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email
-            },
-            "product": {
-                "id": product.id,
-                "name": product.product_name,
-                "category": product.category,
-                "ingredients": product.ingredients,
-                "price": product.price,
-                "description": getattr(product, "description", None),  # Handle missing description
-                "created_at": product.created_at or "1970-01-01T00:00:00Z",  # Default datetime
-                "is_flagged": product.is_flagged if product.is_flagged is not None else False,  # Default boolean
-                "fraud_confidence": product.fraud_confidence,
-                "blockchain_tx": product.blockchain_tx
-            }
-        })
+@app.get("/rescore-jobs/{job_id}", response_model=schemas.RescoreJobOut)
+async def get_rescore_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view re-scoring jobs")
+    job = db.get(models.RescoreJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Re-scoring job not found")
+    return job
+
+@app.post("/rescore-jobs/{job_id}/cancel", response_model=schemas.RescoreJobOut)
+async def cancel_rescore_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can cancel re-scoring jobs")
+    job = db.get(models.RescoreJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Re-scoring job not found")
+    return rescoring_service.cancel(db, job)
 
-    return result
+# Flag review list, served from the flag summary table with keyset pagination:
+# ?sort=created_at|confidence&supplier_id=&cursor=<next_cursor>&limit=
+@app.get("/flagged-products", response_model=schemas.FlaggedProductPage)
+async def get_flagged_products(
+    sort: str = "created_at",
+    supplier_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view flagged products"
+        )
+    if sort not in FLAG_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of: {', '.join(FLAG_SORTS)}"
+        )
+
+    limit = max(1, min(limit, 500))
+    try:
+        page = flag_summary.page(db, sort=sort, supplier_id=supplier_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return json_response({"items": row_dicts(page["items"]), "next_cursor": page["next_cursor"]}, if_none_match)
+
+# admin decision on a flagged product; labels the product for online retraining
+@app.post("/flagged-products/{flag_id}/review", response_model=schemas.FlaggedProductOut)
+async def review_flagged_product(
+    flag_id: int,
+    review: schemas.FlaggedProductReview,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can review flagged products"
+        )
+
+    flagged = db.query(models.FlaggedProduct).filter(models.FlaggedProduct.id == flag_id).first()
+    if not flagged:
+        raise HTTPException(status_code=404, detail="Flagged product not found")
+
+    product = db.query(models.Product).filter(models.Product.id == flagged.product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    now = datetime.now(timezone.utc)
+    product.label = "1" if review.is_counterfeit else "0"
+    product.labelled_at = now
+    product.is_flagged = review.is_counterfeit
+    flagged.reviewed_at = now
+    flag_summary.refresh(db, [product.id])
+    db.commit()
+    refresh_provenance(db, product.id)
+    db.refresh(flagged)
+    logger.info(f"Flag {flag_id} reviewed: product {product.id} labelled {product.label}")
+    return flagged
 
 @app.post("/orders/{order_id}/payment", response_model=schemas.PaymentOut)
 async def create_payment(
@@ -500,12 +1130,14 @@ async def sign_payment(
     if current_user.role not in [UserRole.CONSUMER, UserRole.SUPPLIER, UserRole.ADMIN]:
         raise HTTPException(status_code=403, detail="Not authorized to sign payments")
     
-    return await payment_service.process_signatures(
+    payment = await payment_service.process_signatures(
         db, 
         payment_id, 
         current_user.role, 
         signature.signed
     )
+    publish_payment_event(db, payment)
+    return payment
 
 @app.get("/user/{user_id}/balance", response_model=schemas.BalanceOut)
 async def get_user_balance(user_id: int, db: Session = Depends(get_db)):
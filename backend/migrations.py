@@ -0,0 +1,37 @@
+from loguru import logger
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+
+def add_missing_columns(engine, metadata):
+    """
+    Bring tables created by an older release up to the models.
+
+    create_all only creates missing tables, so a column added to an existing
+    model never reaches databases created before it. Missing nullable
+    columns are added with ALTER TABLE ... ADD COLUMN, together with their
+    indexes; running it again is a no-op. Columns that cannot be added to a
+    populated table (NOT NULL without a server default) are logged instead.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {col['name'] for col in inspector.get_columns(table.name)}
+            added = set()
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.error(f"Column {table.name}.{column.name} is missing and NOT NULL; migrate it manually")
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                name = engine.dialect.identifier_preparer.format_table(table)
+                conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {ddl}")
+                added.add(column.name)
+                logger.info(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                if added.intersection(col.name for col in index.columns):
+                    index.create(bind=conn, checkfirst=True)
@@ -1,6 +1,6 @@
 # models.py
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, Float, DateTime,Enum as SQLAlchemyEnum
+from sqlalchemy import Column, ForeignKey, Index, Integer, LargeBinary, String, Text, Boolean, Float, DateTime,Enum as SQLAlchemyEnum
 from enum import Enum
 from database import Base
 from datetime import datetime, timezone
@@ -42,6 +42,7 @@ class Product(Base):
     blockchain_tx = Column(String, nullable=True)  # Add this line
     status = Column(String, default="success")  # Add this line
     message = Column(String, default="Product registered successfully")  # Add this line
+    labelled_at = Column(DateTime, nullable=True, index=True)  # When `label` was last set by a reviewer
 
     supplier = relationship("User", back_populates="products")
     orders = relationship("Order", back_populates="product")
@@ -64,6 +65,34 @@ class FlaggedProduct(Base):
     supplier_id = Column(Integer, ForeignKey("users.id"))
     reason = Column(String)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    reviewed_at = Column(DateTime, nullable=True)
+
+class FlaggedProductSummary(Base):
+    """Read model for the flag review list: one row per flag with its product and supplier columns."""
+    __tablename__ = "flagged_product_summaries"
+
+    flag_id = Column(Integer, primary_key=True)  # FlaggedProduct.id
+    product_id = Column(Integer, nullable=False, index=True)
+    supplier_id = Column(Integer, nullable=True)
+    supplier_username = Column(String, nullable=True)
+    supplier_email = Column(String, nullable=True)
+    product_name = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    price = Column(Float, nullable=True)
+    ingredients = Column(String, nullable=True)
+    fraud_confidence = Column(Float, nullable=False, default=0.0)  # 0 when the product has none
+    is_flagged = Column(Boolean, nullable=False, default=False)
+    reason = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    reviewed_at = Column(DateTime, nullable=True)
+
+    # Keyset pagination, newest or most confident first, optionally per supplier
+    __table_args__ = (
+        Index("ix_flag_summaries_created", "created_at", "flag_id"),
+        Index("ix_flag_summaries_confidence", "fraud_confidence", "flag_id"),
+        Index("ix_flag_summaries_supplier_created", "supplier_id", "created_at", "flag_id"),
+        Index("ix_flag_summaries_supplier_confidence", "supplier_id", "fraud_confidence", "flag_id"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
@@ -106,6 +135,172 @@ class Payment(Base):
     blockchain_tx = Column(String, nullable=True)
 
     order = relationship("Order", back_populates="payment")
-    consumer = relationship("User") 
+    consumer = relationship("User")
+
+
+class AnchorBatch(Base):
+    """One Merkle root published to the anchors stream for a window of events."""
+    __tablename__ = "anchor_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    root = Column(String(64), nullable=False)
+    leaf_count = Column(Integer, nullable=False)
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    blockchain_tx = Column(String, nullable=True)  # Set once the root is on chain
+    anchored_at = Column(DateTime, nullable=True)
+
+    leaves = relationship("AnchorLeaf", back_populates="batch")
+
+class AnchorLeaf(Base):
+    """A supply-chain event kept off chain; its hash is a leaf of its batch's tree."""
+    __tablename__ = "anchor_leaves"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(Integer, ForeignKey("anchor_batches.id"), nullable=True, index=True)
+    leaf_index = Column(Integer, nullable=True)
+    stream = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    entity_type = Column(String, nullable=False)  # "product" or "order"
+    entity_id = Column(Integer, nullable=True)
+    payload = Column(LargeBinary, nullable=False)  # Codec-encoded {stream, key, data}
+    leaf_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    batch = relationship("AnchorBatch", back_populates="leaves")
+
+    __table_args__ = (Index("ix_anchor_leaves_entity", "entity_type", "entity_id"),)
+
+class ChainOutbox(Base):
+    """A stream write deferred while MultiChain was unreachable; published in id order on recovery."""
+    __tablename__ = "chain_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    stream = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=True)  # Product or order the tx is recorded on
+    data = Column(Text, nullable=False)  # Codec-encoded hex, as sent to `publish`
+    attempts = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, dead
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ProductProvenance(Base):
+    """Precomputed consumer verification document; `version` is bumped on every change."""
+    __tablename__ = "product_provenance"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    snapshot = Column(Text, nullable=False)  # Serialized JSON served as-is
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 
-    
\ No newline at end of file
+class ShipmentEvent(Base):
+    """
+    One scanner reading. Append-only and read per product in time order, so
+    (product_id, recorded_at) is the clustering key for history queries.
+    """
+    __tablename__ = "shipment_events"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    stage = Column(String, nullable=False)  # e.g. manufacture, transit, QC, delivery
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)  # Scanner clock, UTC
+    received_at = Column(DateTime, default=datetime.utcnow)
+    scanner_id = Column(String, nullable=True)
+    reported_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    __table_args__ = (Index("ix_shipment_events_product_time", "product_id", "recorded_at"),)
+
+class ShipmentPosition(Base):
+    """Latest known shipment event per product, maintained on ingest."""
+    __tablename__ = "shipment_positions"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    event_id = Column(Integer, ForeignKey("shipment_events.id"), nullable=False)
+    stage = Column(String, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+    event_count = Column(Integer, nullable=False, default=0)
+
+class ShipmentAnomaly(Base):
+    """A route check failed at one shipment event; (event_id, kind) is reported once."""
+    __tablename__ = "shipment_anomalies"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    event_id = Column(Integer, ForeignKey("shipment_events.id"), nullable=False)
+    kind = Column(String, nullable=False)  # impossible_speed, stage_regression, outside_region
+    detail = Column(String)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (Index("ix_shipment_anomalies_event_kind", "event_id", "kind", unique=True),)
+
+
+class ProductIngredient(Base):
+    """Inverted index entry: one normalized ingredient of one product."""
+    __tablename__ = "product_ingredients"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    ingredient = Column(String, primary_key=True)
+
+    # Lookups go ingredient -> products; the primary key covers product -> ingredients
+    __table_args__ = (Index("ix_product_ingredients_ingredient_product", "ingredient", "product_id"),)
+
+
+class ImportJob(Base):
+    """A supplier's bulk catalog upload, processed in chunks after the upload completes."""
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    supplier_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    format = Column(String, nullable=False)  # csv or ndjson
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed, blocked (rows left unimported)
+    rows_total = Column(Integer, nullable=False, default=0)
+    rows_accepted = Column(Integer, nullable=False, default=0)
+    rows_flagged = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0, server_default="0")  # Not imported after a block
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
+
+class ImportJobRow(Base):
+    """Outcome of one line of an import; row_number counts data rows from 1."""
+    __tablename__ = "import_job_rows"
+
+    job_id = Column(Integer, ForeignKey("import_jobs.id"), primary_key=True)
+    row_number = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)  # accepted, flagged, rejected
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    message = Column(String, nullable=True)
+
+class RescoreJob(Base):
+    """
+    Re-scoring of stored fraud verdicts after a model change. Products
+    registered or scanned recently go first (phase "recent"), then the rest
+    of the catalog ("catalog"); checkpoint_id is the last product id
+    finished in the phase.
+    """
+    __tablename__ = "rescore_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_version = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, completed, failed, cancelled, superseded
+    phase = Column(String, nullable=False, default="recent")
+    checkpoint_id = Column(Integer, nullable=False, default=0)
+    recent_since = Column(DateTime, nullable=False)  # Products registered or shipment-scanned after this go in the first phase
+    products_scored = Column(Integer, nullable=False, default=0)
+    products_changed = Column(Integer, nullable=False, default=0)
+    flags_added = Column(Integer, nullable=False, default=0)
+    flags_cleared = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # A running job without a recent heartbeat is reclaimed
+    finished_at = Column(DateTime, nullable=True)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from enum import Enum
 from datetime import datetime
 
@@ -28,6 +28,10 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class StreamToken(BaseModel):
+    token: str
+    expires_in: int
+
 class TokenData(BaseModel):
     username: Optional[str] = None
 
@@ -88,6 +92,9 @@ class FlaggedProductOut(BaseModel):
     class Config:
         from_attributes = True
 
+class FlaggedProductReview(BaseModel):
+    is_counterfeit: bool
+
 class Supplier(BaseModel):
     id: int
     username: str
@@ -112,6 +119,29 @@ class FlaggedProductWithDetails(BaseModel):
     supplier: Supplier
     product: Product
 
+class FlaggedProductSummaryOut(BaseModel):
+    flag_id: int
+    product_id: int
+    supplier_id: Optional[int]
+    supplier_username: Optional[str]
+    supplier_email: Optional[str]
+    product_name: Optional[str]
+    category: Optional[str]
+    price: Optional[float]
+    ingredients: Optional[str]
+    fraud_confidence: float
+    is_flagged: bool
+    reason: Optional[str]
+    created_at: datetime
+    reviewed_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class FlaggedProductPage(BaseModel):
+    items: List[FlaggedProductSummaryOut]
+    next_cursor: Optional[str]
+
 class OrderStatus(str, Enum):
     NEW = "NEW"
     CONFIRMED = "CONFIRMED"
@@ -171,4 +201,143 @@ class PaymentOut(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Merkle anchoring
+class MerkleProofStep(BaseModel):
+    position: str  # side of the sibling: "left" or "right"
+    hash: str
+
+class AnchorProofOut(BaseModel):
+    leaf_id: int
+    stream: str
+    key: str
+    action: Optional[str] = None
+    payload: str  # hex of the codec-encoded event; sha256(0x00 || payload) is the leaf hash
+    leaf_hash: str
+    batch_id: Optional[int] = None  # None while the event waits for the next window
+    leaf_index: Optional[int] = None
+    root: Optional[str] = None
+    blockchain_tx: Optional[str] = None
+    anchored_at: Optional[datetime] = None
+    proof: List[MerkleProofStep] = []
+    verified: bool = False
+    chain_root_matches: Optional[bool] = None
+
+# Shipment tracking
+class ShipmentEventIn(BaseModel):
+    product_id: int
+    stage: str
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    recorded_at: Optional[datetime] = None  # Defaults to the time of receipt
+    scanner_id: Optional[str] = None
+
+class ShipmentBatchIn(BaseModel):
+    events: List[ShipmentEventIn]
+
+class ShipmentBatchOut(BaseModel):
+    accepted: int
+    unknown_products: List[int] = []
+
+class ShipmentEventOut(BaseModel):
+    id: int
+    product_id: int
+    stage: str
+    latitude: float
+    longitude: float
+    recorded_at: datetime
+    scanner_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ShipmentPositionOut(BaseModel):
+    product_id: int
+    event_id: int
+    stage: str
+    latitude: float
+    longitude: float
+    recorded_at: datetime
+    event_count: int
+
+    class Config:
+        from_attributes = True
+
+class RouteScanOut(BaseModel):
+    anomalies: int
+    products_flagged: int
+
+class SimilarProductOut(BaseModel):
+    product_id: int
+    supplier_id: int
+    similarity: float
+
+class IngredientSearchOut(BaseModel):
+    ingredients: List[str]
+    match: str
+    products: List[ProductOut]
+    next_after_id: Optional[int] = None
+
+class RuleStatsOut(BaseModel):
+    name: str
+    decision: str
+    penalize: bool
+    hits: int
+    hit_rate: float
+
+class RuleFilterStatsOut(BaseModel):
+    enabled: bool
+    evaluated: int
+    model_rows: int
+    model_calls_avoided: int
+    avoided_share: float
+    rules: List[RuleStatsOut]
+
+class ImportJobOut(BaseModel):
+    id: int
+    format: str
+    status: str
+    rows_total: int = 0
+    rows_accepted: int = 0
+    rows_flagged: int = 0
+    rows_rejected: int = 0
+    rows_skipped: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ImportRowOut(BaseModel):
+    row_number: int
+    status: str
+    product_id: Optional[int] = None
+    message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ImportProgressOut(BaseModel):
+    job: ImportJobOut
+    rows: List[ImportRowOut]
+    next_after_row: Optional[int] = None
+
+class RescoreJobOut(BaseModel):
+    id: int
+    model_version: str
+    status: str
+    phase: str
+    checkpoint_id: int
+    products_scored: int = 0
+    products_changed: int = 0
+    flags_added: int = 0
+    flags_cleared: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,4 +1,5 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
 import httpx
 import os
@@ -6,15 +7,23 @@ from dotenv import load_dotenv
 from loguru import logger
 from fastapi import HTTPException
 from datetime import datetime
+import time
+from services.metrics import RPC_LATENCY
+from services.circuit_breaker import CircuitBreaker, CLOSED
+from logging_config import LogSampler, preview
+from services.payload_codec import decode_payload, get_codec
 
 
 load_dotenv()
 
-import logging
+# Per-call RPC debug lines are sampled; payloads are only rendered if emitted
+rpc_log_sampler = LogSampler(float(os.getenv('RPC_LOG_SAMPLE_RATE', '0.01')))
 
-# Configure the logger
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+# Outcomes meaning the node could not be reached (a publish may be queued);
+# any HTTP response, even an error, shows it is up
+OUTAGE_OUTCOMES = ('unreachable', 'circuit_open')
+# The node answered, even if it refused the call
+REACHABLE_OUTCOMES = ('ok', 'rpc_error', 'http_error')
 
 class BlockchainService:
     def __init__(self):
@@ -27,13 +36,47 @@ class BlockchainService:
         self.auth = (rpc_user, rpc_pass)
 
         self.initialized = False
-        logger.error(f"I am called with {self.rpc_url}")
+        self.timeout = float(os.getenv('MULTICHAIN_TIMEOUT_SECONDS', '10'))
+        # Calls fail fast while the node is down; one probe per reset window
+        self.breaker = CircuitBreaker(
+            'multichain',
+            failure_threshold=int(os.getenv('CHAIN_BREAKER_FAILURES', '3')),
+            reset_timeout=float(os.getenv('CHAIN_BREAKER_RESET_SECONDS', '30'))
+        )
+        self.health_interval = float(os.getenv('CHAIN_HEALTH_INTERVAL_SECONDS', '15'))
+        # Serializer for new stream items; reads accept every codec
+        self.codec = get_codec()
+        # Set to a MerkleAnchorService in merkle mode; events are then batched
+        self.anchor = None
+        # Set to a ChainOutbox; writes made during an outage are queued there
+        self.outbox = None
+        logger.info(f"MultiChain RPC endpoint: {self.rpc_url} (payload codec: {self.codec.name})")
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit is open or probing: calls would fail fast."""
+        return self.breaker.state == CLOSED
 
     async def _rpc_call(self, method: str, params: list = None) -> Dict:
-        """Make RPC call to MultiChain node with better error handling"""
+        """Make RPC call to MultiChain node, timing it per method and outcome"""
+        _, result = await self._rpc_attempt(method, params)
+        return result
+
+    async def _rpc_attempt(self, method: str, params: list = None) -> Tuple[str, Optional[Dict]]:
+        """(outcome, result) of one RPC call; refused without a request while the circuit is open"""
+        if not self.breaker.allow():
+            RPC_LATENCY.labels(method=method, outcome='circuit_open').observe(0)
+            return 'circuit_open', None
+
+        start = time.perf_counter()
+        outcome = 'error'
+        sampled = rpc_log_sampler()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                logger.debug(f"Making RPC call: {method} with params {params}")
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                if sampled:
+                    logger.opt(lazy=True).debug(
+                        "RPC call: {} params={}", lambda: method, lambda: preview(params)
+                    )
                 response = await client.post(
                     self.rpc_url,
                     json={
@@ -45,24 +88,79 @@ class BlockchainService:
                     auth=self.auth
                 )
                 
-                logger.debug(f"RPC response: {response.text}")  # Log full response text
+                if sampled:
+                    logger.opt(lazy=True).debug(
+                        "RPC response: {} {}", lambda: response.status_code, lambda: preview(response.text)
+                    )
                 if response.status_code == 200:
                     result = response.json()
                     if 'error' in result and result['error']:
+                        outcome = 'rpc_error'
                         logger.error(f"RPC Error: {result['error']}")
-                        return None
-                    return result['result']
+                        return outcome, None
+                    outcome = 'ok'
+                    return outcome, result['result']
                 else:
-                    logger.error(f"HTTP Error: {response.status_code} - {response.text}")
-                    return None
+                    outcome = 'http_error'
+                    logger.error(f"HTTP Error: {response.status_code} - {preview(response.text)}")
+                    return outcome, None
         except httpx.RequestError as e:
+            outcome = 'unreachable'
             logger.error(f"Request error occurred: {e}")
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
         except Exception as e:
             logger.error(f"Unexpected error occurred: {e}")
-        return None
+        finally:
+            # Every call settles the breaker, so a half-open probe can never stay outstanding
+            if outcome in REACHABLE_OUTCOMES:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            RPC_LATENCY.labels(method=method, outcome=outcome).observe(time.perf_counter() - start)
+        return outcome, None
+
+    async def _publish(self, stream: str, key: str, data: Dict, entity_id: Optional[int]) -> Optional[str]:
+        """
+        Publish one stream item. While the node is unreachable, or before the
+        streams could be set up, the item goes to the outbox instead and None
+        is returned, as for a failed publish.
+        """
+        data_hex = self.codec.encode(data)
+        if self.outbox is not None and not self.initialized:
+            self.outbox.record(stream, key, entity_id, data_hex)
+            return None
+        outcome, result = await self._rpc_attempt('publish', [stream, key, data_hex])
+        if result is None and outcome in OUTAGE_OUTCOMES and self.outbox is not None:
+            self.outbox.record(stream, key, entity_id, data_hex)
+        return result
+
+    async def publish_encoded(self, stream: str, key: str, data_hex: str) -> Tuple[str, Optional[str]]:
+        """(outcome, tx) of publishing an already encoded item (outbox drain); never queued"""
+        return await self._rpc_attempt('publish', [stream, key, data_hex])
+
+    async def run_health_checks(self):
+        """
+        Recover from outages without a restart: retry stream setup until it
+        succeeds, probe the node while the circuit is open, and drain the
+        outbox once calls go through again.
+        """
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                if not self.initialized:
+                    if await self.init_stream():
+                        logger.info("MultiChain reachable; streams initialized")
+                elif not self.available:
+                    await self._rpc_call('getinfo')
+                if self.initialized and self.available and self.outbox is not None:
+                    await self.outbox.drain()
+            except Exception as e:
+                logger.error(f"MultiChain health check failed: {str(e)}")
 
     async def init_stream(self) -> bool:
-        """Initialize both products and orders streams"""
+        """Initialize the products, orders and anomalies streams"""
         try:
             if self.initialized:
                 return True
@@ -79,24 +177,21 @@ class BlockchainService:
                 logger.warning("Could not list streams. Running in offline mode.")
                 return False
 
-            # Initialize products stream
-            if not any(s['name'] == 'products' for s in streams):
-                result = await self._rpc_call('create', ['stream', 'products', True])
-                if result:
-                    await self._rpc_call('subscribe', ['products'])
-                    logger.info("Products stream created and subscribed")
-                else:
-                    logger.warning("Failed to create products stream")
-                    return False
-
-            # Initialize orders stream
-            if not any(s['name'] == 'orders' for s in streams):
-                result = await self._rpc_call('create', ['stream', 'orders', True])
+            # Create and subscribe to any missing stream; anchor roots get
+            # their own stream in merkle mode
+            required = ['products', 'orders', 'anomalies']
+            if self.anchor is not None:
+                required.append('anchors')
+            existing = {s['name'] for s in streams}
+            for name in required:
+                if name in existing:
+                    continue
+                result = await self._rpc_call('create', ['stream', name, True])
                 if result:
-                    await self._rpc_call('subscribe', ['orders'])
-                    logger.info("Orders stream created and subscribed")
+                    await self._rpc_call('subscribe', [name])
+                    logger.info(f"{name.capitalize()} stream created and subscribed")
                 else:
-                    logger.warning("Failed to create orders stream")
+                    logger.warning(f"Failed to create {name} stream")
                     return False
 
             self.initialized = True
@@ -124,19 +219,15 @@ class BlockchainService:
                 "label": product_data.get("label")
             }
 
-            # Convert data to hex for blockchain storage
-            data_hex = json.dumps(blockchain_data).encode('utf-8').hex()
-
             # Store in blockchain using streams
             key = f"product_{product_data.get('id')}"
-            result = await self._rpc_call(
-                'publish', 
-                [
-                    'products',  # stream name
-                    key,         # key
-                    data_hex     # data in hex
-                ]
-            )
+            if self.anchor is not None:
+                # Published with the next Merkle root; tx is filled in then
+                self.anchor.record('products', key, 'product', product_data.get("id"), blockchain_data)
+                return None
+
+            # Encoded with the configured codec (hex for the RPC)
+            result = await self._publish('products', key, blockchain_data, product_data.get("id"))
 
             if result:
                 logger.info(f"Product stored in blockchain. TxID: {result}")
@@ -170,16 +261,14 @@ class BlockchainService:
                 'timestamp': datetime.utcnow().isoformat()
             }
 
-            # Convert to JSON string first, then to hex
-            json_str = json.dumps(blockchain_data)
-            data_hex = json_str.encode('utf-8').hex()
-            
             # Store in blockchain using orders stream
             key = f"order_{clean_data.get('id')}"
-            result = await self._rpc_call(
-                'publish',
-                ['orders', key, data_hex]
-            )
+            if self.anchor is not None:
+                self.anchor.record('orders', key, 'order', clean_data.get('id'), blockchain_data)
+                return None
+
+            # Encoded with the configured codec (hex for the RPC)
+            result = await self._publish('orders', key, blockchain_data, clean_data.get('id'))
 
             if result:
                 logger.info(f"Order stored in blockchain. TxID: {result}")
@@ -213,16 +302,14 @@ class BlockchainService:
                 'timestamp': datetime.utcnow().isoformat()
             }
 
-            # Convert to JSON string first, then to hex
-            json_str = json.dumps(blockchain_data)
-            data_hex = json_str.encode('utf-8').hex()
-            
             # Store in orders stream with unique key
             key = f"order_{clean_data.get('id')}_update_{datetime.utcnow().timestamp()}"
-            result = await self._rpc_call(
-                'publish',
-                ['orders', key, data_hex]
-            )
+            if self.anchor is not None:
+                self.anchor.record('orders', key, 'order', clean_data.get('id'), blockchain_data)
+                return None
+
+            # Encoded with the configured codec (hex for the RPC)
+            result = await self._publish('orders', key, blockchain_data, clean_data.get('id'))
 
             if result:
                 logger.info(f"Order update stored in blockchain. TxID: {result}")
@@ -235,6 +322,59 @@ class BlockchainService:
             logger.error(f"Failed to update order in blockchain: {str(e)}")
             return None
         
+    async def store_anomaly(self, product_id: int, anomalies: List[dict]) -> Optional[str]:
+        """Publish route anomalies for a product to the anomalies stream"""
+        try:
+            blockchain_data = {
+                'type': 'anomaly',
+                'product_id': product_id,
+                'anomalies': anomalies,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+
+            key = f"product_{product_id}"
+            if self.anchor is not None:
+                self.anchor.record('anomalies', key, 'product', product_id, blockchain_data)
+                return None
+
+            result = await self._publish('anomalies', key, blockchain_data, product_id)
+            if result:
+                logger.info(f"Anomaly for product {product_id} stored in blockchain. TxID: {result}")
+                return result
+
+            logger.error("Failed to store anomaly in blockchain")
+            return None
+
+        except Exception as e:
+            logger.error(f"Failed to store anomaly in blockchain: {str(e)}")
+            return None
+
+    async def publish_anchor(self, key: str, manifest: dict) -> Optional[str]:
+        """Publish a Merkle batch manifest to the anchors stream"""
+        try:
+            data_hex = self.codec.encode(manifest)
+            result = await self._rpc_call('publish', ['anchors', key, data_hex])
+            if result:
+                return result
+
+            logger.error("Failed to publish anchor to blockchain")
+            return None
+
+        except Exception as e:
+            logger.error(f"Failed to publish anchor to blockchain: {str(e)}")
+            return None
+
+    async def get_anchor_manifest(self, key: str) -> Optional[dict]:
+        """Read a published anchor manifest back from the anchors stream"""
+        try:
+            items = await self._rpc_call('liststreamkeyitems', ['anchors', key])
+            if not items:
+                return None
+            return decode_payload(items[-1]['data'])
+        except Exception as e:
+            logger.error(f"Failed to read anchor {key}: {str(e)}")
+            return None
+
     async def get_order_history(self, order_identifier: str) -> List[dict]:
         """
         Get order history from blockchain
@@ -270,6 +410,14 @@ class BlockchainService:
                 
                 all_items = items + update_items
 
+                # Events batched under a Merkle root live in the DB, not the stream
+                if self.anchor is not None and order_id.isdigit():
+                    db = self.anchor.session_factory()
+                    try:
+                        all_items += self.anchor.history_items(db, 'order', int(order_id))
+                    finally:
+                        db.close()
+
             if not all_items:
                 logger.warning(f"No blockchain records found for identifier: {order_identifier}")
                 return []
@@ -279,14 +427,14 @@ class BlockchainService:
                 try:
                     # Validate and decode data
                     if not item.get('data') or not isinstance(item.get('data'), str):
-                        logger.warning(f"Invalid data format in item: {item}")
+                        logger.warning(f"Invalid data format in item: {preview(item)}")
                         continue
 
-                    data = bytes.fromhex(item['data']).decode('utf-8')
-                    parsed_data = json.loads(data)
+                    # Accepts legacy hex JSON as well as versioned codecs
+                    parsed_data = decode_payload(item['data'])
 
                     if not isinstance(parsed_data, dict):
-                        logger.warning(f"Invalid parsed data structure: {parsed_data}")
+                        logger.warning(f"Invalid parsed data structure: {preview(parsed_data)}")
                         continue
 
                     # Handle both direct transaction data and stream items
@@ -0,0 +1,373 @@
+import asyncio
+import csv
+import json
+import math
+import os
+import tempfile
+from datetime import datetime, timezone
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models
+
+FORMATS = ('csv', 'ndjson')
+# Columns of dataset/skincare_test_dataset.csv the import uses; `label` and
+# any other columns are ignored (Product.label is reserved for reviewers)
+IMPORT_FIELDS = ('product_name', 'ingredients', 'price', 'category')
+
+# (row number, parsed record or None, parse error or None)
+ParsedRow = Tuple[int, Optional[Dict], Optional[str]]
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[ParsedRow]:
+    """Lazily parse a spooled upload; only the current line is held in memory."""
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            missing = set(IMPORT_FIELDS) - set(reader.fieldnames or [])
+            if missing:
+                raise ValueError(f"CSV header is missing columns: {', '.join(sorted(missing))}")
+            for row_number, record in enumerate(reader, 1):
+                yield row_number, record, None
+            return
+
+        row_number = 0
+        for line in f:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Expected a JSON object"
+                continue
+            yield row_number, record, None
+
+
+def validate_record(record: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """The product fields of one record, or the reason it is rejected."""
+    product = {}
+    for field in ('product_name', 'category', 'ingredients'):
+        value = record.get(field)
+        product[field] = str(value).strip() if value is not None else ''
+        # Empty ingredients are left to the fraud pre-filter, as for single registrations;
+        # rows it cannot decide are rejected at scoring
+        if field != 'ingredients' and not product[field]:
+            return None, f"Missing {field}"
+    try:
+        product['price'] = float(record.get('price'))
+    except (TypeError, ValueError):
+        return None, "Invalid price"
+    if not math.isfinite(product['price']) or product['price'] < 0:
+        return None, "Invalid price"
+    return product, None
+
+
+class CatalogImportService:
+    """
+    Bulk catalog import for suppliers.
+
+    The upload is spooled to disk as it streams in and the request returns a
+    job; the job then parses the file lazily, `chunk_rows` records at a time.
+    Each chunk costs one fraud model batch, one multi-row INSERT ... RETURNING
+    for the products and multi-row inserts for ingredient entries, flags and
+    per-row outcomes, committed together so progress is visible while the
+    job runs. Accepted products are published to the chain after each chunk.
+    """
+
+    def __init__(self, fraud_detector, blockchain_service, ingredient_index=None, similarity_index=None,
+                 flag_summary=None, block_after: int = 3):
+        self.fraud_detector = fraud_detector
+        self.blockchain = blockchain_service
+        self.ingredient_index = ingredient_index
+        self.similarity_index = similarity_index
+        self.flag_summary = flag_summary
+        self.chunk_rows = int(os.getenv('IMPORT_CHUNK_ROWS', '1000'))
+        self.max_bytes = int(os.getenv('IMPORT_MAX_BYTES', str(256 * 2 ** 20)))
+        self.publish_concurrency = int(os.getenv('IMPORT_PUBLISH_CONCURRENCY', '8'))
+        self.spool_dir = os.getenv('IMPORT_SPOOL_DIR') or None
+        # Flags per supplier before blocking, as for single registrations
+        self.block_after = block_after
+
+    # Upload
+
+    async def spool(self, chunks: AsyncIterator[bytes]) -> str:
+        """Write the request body to a temporary file; raises ValueError past max_bytes."""
+        fd, path = tempfile.mkstemp(prefix='catalog-import-', dir=self.spool_dir)
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"Upload exceeds {self.max_bytes} bytes")
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    @staticmethod
+    def create_job(db: Session, supplier_id: int, fmt: str) -> models.ImportJob:
+        job = models.ImportJob(supplier_id=supplier_id, format=fmt, status='pending')
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    # Processing
+
+    async def run(self, job_id: int, path: str, session_factory):
+        """Process a spooled upload to completion; runs after the upload request returns."""
+        db = session_factory()
+        try:
+            job = db.get(models.ImportJob, job_id)
+            job.status = 'running'
+            db.commit()
+            rows = iter_rows(path, job.format)
+            while True:
+                chunk = await asyncio.to_thread(lambda: list(islice(rows, self.chunk_rows)))
+                if not chunk:
+                    break
+                accepted = await asyncio.to_thread(self.import_chunk, db, job, chunk)
+                await self._publish(db, accepted)
+                if job.status == 'blocked':
+                    # Count what the block left out; parsing the rest is cheap next to importing it
+                    job.rows_skipped += await asyncio.to_thread(lambda: sum(1 for _ in rows))
+                    if job.rows_skipped:
+                        job.error = (f"Supplier blocked after {self.block_after} violations; "
+                                     f"{job.rows_skipped} remaining rows were not imported")
+                    else:
+                        # The blocking row was the last one: the upload itself is complete
+                        job.status = 'completed'
+                        job.error = f"Supplier blocked after {self.block_after} violations; all rows were processed"
+                    break
+            if job.status == 'running':
+                job.status = 'completed'
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+            logger.info(f"Import job {job_id} {job.status}: {job.rows_accepted} accepted, "
+                        f"{job.rows_flagged} flagged, {job.rows_rejected} rejected")
+        except Exception as e:
+            db.rollback()
+            # ValueError: a malformed upload (e.g. CSV header), not a server fault
+            logger.opt(exception=not isinstance(e, ValueError)).error(f"Import job {job_id} failed: {e}")
+            job = db.get(models.ImportJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)[:500]
+                job.finished_at = datetime.now(timezone.utc)
+                db.commit()
+        finally:
+            db.close()
+            os.remove(path)
+
+    def import_chunk(self, db: Session, job: models.ImportJob, chunk: List[ParsedRow]) -> List[Dict]:
+        """Score and store one chunk; returns the accepted products for chain publishing."""
+        outcomes: List[Dict] = []
+        valid: List[Tuple[int, Dict]] = []
+        for row_number, record, error in chunk:
+            product = None
+            if error is None:
+                product, error = validate_record(record)
+            if error is not None:
+                outcomes.append({'job_id': job.id, 'row_number': row_number, 'status': 'rejected',
+                                 'product_id': None, 'message': error})
+            else:
+                valid.append((row_number, product))
+
+        products = [product for _, product in valid]
+        scored = self._score(products)
+        if any(error is not None for _, error in scored):
+            # Rows the model cannot score (e.g. empty ingredients with the rule
+            # pre-filter off) are rejected; the rest of the chunk goes on
+            for (row_number, _), (_, error) in zip(valid, scored):
+                if error is not None:
+                    outcomes.append({'job_id': job.id, 'row_number': row_number, 'status': 'rejected',
+                                     'product_id': None, 'message': error})
+            keep = [i for i, (_, error) in enumerate(scored) if error is None]
+            valid, products = [valid[i] for i in keep], [products[i] for i in keep]
+        results = [result for result, error in scored if error is None]
+
+        # Stop at the violation that blocks the supplier, as a single registration
+        # would: later rows of the chunk are neither imported nor penalized
+        penalty, penalized = None, 0
+        if any(r['is_counterfeit'] and r['penalize'] for r in results):
+            penalty = self._penalty(db, job)
+            allowance = self.block_after - penalty.penalty_count
+            for i, result in enumerate(results):
+                if result['is_counterfeit'] and result['penalize']:
+                    penalized += 1
+                    if penalized >= allowance:
+                        last_row = valid[i][0]
+                        valid, products, results = valid[:i + 1], products[:i + 1], results[:i + 1]
+                        outcomes = [o for o in outcomes if o['row_number'] <= last_row]
+                        skipped = sum(1 for row_number, _, _ in chunk if row_number > last_row)
+                        chunk = chunk[:len(chunk) - skipped]
+                        job.rows_skipped += skipped
+                        break
+        # Cloned listings among other suppliers' products, checked before insert
+        clones: Dict[int, Dict] = {}
+        vectors = None
+        index = self.similarity_index
+        if products and index is not None and index.ready:
+            vectors = index.vectorize(products)
+            for i, result in enumerate(results):
+                if not result['is_counterfeit']:
+                    matches = index.query(vectors[i], limit=1, exclude_supplier=job.supplier_id)
+                    if matches:
+                        clones[i] = matches[0]
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        for i, (product, result) in enumerate(zip(products, results)):
+            flagged = bool(result['is_counterfeit'])
+            if flagged:
+                message = f"Product flagged as potentially counterfeit. Confidence: {result['confidence']:.2%}"
+            elif i in clones:
+                message = f"Product registered; closely matches existing product #{clones[i]['product_id']}"
+            else:
+                message = "Product registered successfully"
+            rows.append({
+                **product,
+                'supplier_id': job.supplier_id,
+                'created_at': now,
+                'is_flagged': flagged,
+                'fraud_confidence': float(result['confidence']),
+                'status': 'warning' if flagged or i in clones else 'success',
+                'message': message
+            })
+        product_ids = db.execute(
+            insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True), rows
+        ).scalars().all() if rows else []
+
+        flags = []
+        for i, ((row_number, product), result, product_id) in enumerate(zip(valid, results, product_ids)):
+            if result['is_counterfeit']:
+                reason = self.fraud_detector.describe(result)
+                flags.append({'product_id': product_id, 'supplier_id': job.supplier_id, 'reason': reason})
+                outcomes.append({'job_id': job.id, 'row_number': row_number, 'status': 'flagged',
+                                 'product_id': product_id, 'message': reason})
+            else:
+                message = None
+                if i in clones:
+                    match = clones[i]
+                    # Surfaced for review only; a clone match alone carries no penalty
+                    message = f"Possible clone of product #{match['product_id']} ({match['similarity']:.0%} similar)"
+                    flags.append({'product_id': product_id, 'supplier_id': job.supplier_id, 'reason': message})
+                outcomes.append({'job_id': job.id, 'row_number': row_number, 'status': 'accepted',
+                                 'product_id': product_id, 'message': message})
+
+        if self.ingredient_index is not None and product_ids:
+            self.ingredient_index.index_many(
+                db, {product_id: product['ingredients'] for product_id, product in zip(product_ids, products)}
+            )
+        if flags:
+            db.execute(insert(models.FlaggedProduct), [{**flag, 'created_at': now} for flag in flags])
+            if self.flag_summary is not None:
+                self.flag_summary.refresh(db, [flag['product_id'] for flag in flags])
+        if outcomes:
+            outcomes.sort(key=lambda o: o['row_number'])
+            db.execute(insert(models.ImportJobRow), outcomes)
+
+        flagged = sum(1 for r in results if r['is_counterfeit'])
+        job.rows_total += len(chunk)
+        job.rows_accepted += len(product_ids) - flagged
+        job.rows_flagged += flagged
+        job.rows_rejected += len(chunk) - len(product_ids)
+        if penalized:
+            penalty.penalty_count += penalized
+            if penalty.penalty_count >= self.block_after:
+                penalty.is_blocked = True
+                job.status = 'blocked'
+        db.commit()
+
+        accepted = [
+            {'id': product_id, 'label': None, **product}
+            for product_id, product, result in zip(product_ids, products, results)
+            if not result['is_counterfeit']
+        ]
+        for product in accepted:
+            self.fraud_detector.price_stats.observe(product['id'], product['category'], product['price'])
+        if vectors is not None:
+            index.add(product_ids, [job.supplier_id] * len(product_ids), vectors)
+        return [{**product, 'supplier_id': job.supplier_id} for product in accepted]
+
+    def _score(self, products: List[Dict]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+        """One batch call; on a ValueError, each row alone, so one bad row fails only itself."""
+        if not products:
+            return []
+        try:
+            return [(result, None) for result in self.fraud_detector.predict_batch(products)]
+        except ValueError:
+            scored = []
+            for product in products:
+                try:
+                    scored.append((self.fraud_detector.predict_batch([product])[0], None))
+                except ValueError as e:
+                    scored.append((None, str(e)))
+            return scored
+
+    def _penalty(self, db: Session, job: models.ImportJob) -> models.SupplierPenalty:
+        """The supplier's penalty row, locked until the chunk commits."""
+        penalty = (
+            db.query(models.SupplierPenalty)
+            .filter(models.SupplierPenalty.supplier_id == job.supplier_id)
+            .with_for_update()
+            .first()
+        )
+        if penalty is None:
+            penalty = models.SupplierPenalty(supplier_id=job.supplier_id, penalty_count=0)
+            db.add(penalty)
+        return penalty
+
+    async def _publish(self, db: Session, products: List[Dict]):
+        """Chain registration for accepted products, a few RPCs in flight at a time."""
+        if not products:
+            return
+        deferred = self.blockchain.anchor is not None  # merkle mode: tx is set when the root is published
+        # Offline without an outbox: nothing would be published or queued
+        if not deferred and not self.blockchain.initialized and self.blockchain.outbox is None:
+            txs = [None] * len(products)
+        else:
+            semaphore = asyncio.Semaphore(self.publish_concurrency)
+
+            async def publish(product):
+                async with semaphore:
+                    return await self.blockchain.store_product(product)
+            txs = await asyncio.gather(*(publish(product) for product in products))
+
+        changes = [{'id': product['id'], 'blockchain_tx': tx} for product, tx in zip(products, txs) if tx]
+        if not deferred:
+            changes += [
+                {'id': product['id'], 'status': 'partial_success',
+                 'message': "Product registered but blockchain storage failed"}
+                for product, tx in zip(products, txs) if not tx
+            ]
+        if changes:
+            db.execute(update(models.Product), changes)
+            db.commit()
+
+    # Progress
+
+    @staticmethod
+    def progress(db: Session, job: models.ImportJob, after_row: int = 0, limit: int = 500) -> Dict:
+        rows = (
+            db.query(models.ImportJobRow)
+            .filter(models.ImportJobRow.job_id == job.id, models.ImportJobRow.row_number > after_row)
+            .order_by(models.ImportJobRow.row_number)
+            .limit(limit)
+            .all()
+        )
+        return {
+            'job': job,
+            'rows': rows,
+            'next_after_row': rows[-1].row_number if len(rows) == limit else None
+        }
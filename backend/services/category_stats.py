@@ -0,0 +1,176 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import models
+
+
+class CategoryPriceStats:
+    """
+    Robust per-category price statistics held in NumPy arrays.
+
+    Each category keeps a sorted sample of legitimate prices from which the
+    quantiles below are derived, computed for whole batches with one
+    vectorized lookup.
+
+    Price ratios, which the model and the price rules consume, are always
+    taken against the bundle's frozen `reference` medians, exactly as
+    model/train.py computed them: live registrations must not move the
+    feature under a fixed model, and a supplier must not be able to shift
+    it by flooding a category. The live sample only drives the robust
+    z-score, and only once a category holds `min_samples` prices.
+    """
+
+    QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+    # IQR of a standard normal; turns IQR into a sigma estimate
+    IQR_TO_SIGMA = 1.349
+
+    def __init__(self, samples: Dict[str, Iterable[float]], max_samples_per_category: int = 10000,
+                 reference: Optional[Dict[str, float]] = None, min_samples: int = 30):
+        self.max_samples = max_samples_per_category
+        self.min_samples = max(2, min_samples)
+        self.categories: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._samples: List[np.ndarray] = []
+        self.quantiles = np.empty((0, len(self.QUANTILES)))
+        self.counts = np.empty(0, dtype=np.int64)
+        self.last_product_id = 0
+
+        for category, prices in samples.items():
+            self._add_category(category, np.asarray(list(prices), dtype=float))
+        self._recompute(range(len(self.categories)))
+
+        if reference is None:
+            reference = {cat: float(self.median[row]) for cat, row in self._index.items()
+                         if np.isfinite(self.median[row])}
+        # Frozen at load; update() never touches it
+        self.reference: Dict[str, float] = dict(reference)
+
+    @classmethod
+    def from_artifacts(cls, artifacts: Dict, min_samples: int = 30) -> "CategoryPriceStats":
+        """
+        Seed the live sample from the raw per-category prices written by
+        model/train.py; older bundles have no samples, so the live sample
+        starts empty. The reference medians are the bundle's own map.
+        """
+        samples = artifacts.get('category_prices') or {}
+        return cls(samples, reference=artifacts['median_price_map'], min_samples=min_samples)
+
+    @property
+    def median(self) -> np.ndarray:
+        return self.quantiles[:, self.QUANTILES.index(0.5)]
+
+    @property
+    def iqr(self) -> np.ndarray:
+        return self.quantiles[:, self.QUANTILES.index(0.75)] - self.quantiles[:, self.QUANTILES.index(0.25)]
+
+    def _add_category(self, category: str, prices: np.ndarray) -> int:
+        self._index[category] = len(self.categories)
+        self.categories.append(category)
+        self._samples.append(np.sort(prices[np.isfinite(prices)]))
+        return self._index[category]
+
+    def _recompute(self, rows: Iterable[int]):
+        rows = list(rows)
+        n = len(self.categories)
+        if self.quantiles.shape[0] < n:
+            grow = n - self.quantiles.shape[0]
+            self.quantiles = np.vstack([self.quantiles, np.full((grow, len(self.QUANTILES)), np.nan)])
+            self.counts = np.concatenate([self.counts, np.zeros(grow, dtype=np.int64)])
+
+        for row in rows:
+            sample = self._samples[row]
+            if len(sample) > self.max_samples:
+                # Thin the sorted sample evenly; quantiles are preserved
+                keep = np.linspace(0, len(sample) - 1, self.max_samples).round().astype(int)
+                sample = self._samples[row] = sample[keep]
+            self.counts[row] = len(sample)
+            if len(sample):
+                self.quantiles[row] = np.quantile(sample, self.QUANTILES)
+
+    def lookup(self, categories: Sequence[str]) -> np.ndarray:
+        """Row index per category, -1 for unknown ones."""
+        return np.fromiter((self._index.get(c, -1) for c in categories), dtype=np.int64, count=len(categories))
+
+    def has_reference(self, categories: Sequence[str]) -> np.ndarray:
+        """Whether each category has a bundle median to compare against."""
+        return np.fromiter((c in self.reference for c in categories), dtype=bool, count=len(categories))
+
+    def price_ratio(self, categories: Sequence[str], prices: Sequence[float]) -> np.ndarray:
+        """
+        price / bundle median, as in training; 1.0 for categories the bundle
+        has no positive median for.
+        """
+        prices = np.clip(np.asarray(prices, dtype=float), 0.0, None)
+        ref = np.fromiter((self.reference.get(c, 0.0) for c in categories), dtype=float, count=len(categories))
+        ref[~np.isfinite(ref)] = 0.0
+        return np.divide(prices, ref, out=np.ones_like(prices), where=ref > 0)
+
+    def zscore(self, categories: Sequence[str], prices: Sequence[float]) -> np.ndarray:
+        """
+        Robust z-score against the live sample: (price - median) / (IQR / 1.349).
+        0 where the category has fewer than `min_samples` prices or no spread.
+        """
+        prices = np.clip(np.asarray(prices, dtype=float), 0.0, None)
+        idx = self.lookup(categories)
+        known = idx >= 0
+        known[known] = self.counts[idx[known]] >= self.min_samples
+        sigma = np.zeros(len(idx))
+        center = np.zeros(len(idx))
+        sigma[known] = self.iqr[idx[known]] / self.IQR_TO_SIGMA
+        center[known] = self.median[idx[known]]
+        sigma[~np.isfinite(sigma)] = 0.0
+        return np.divide(prices - center, sigma, out=np.zeros_like(prices), where=sigma > 0)
+
+    def update(self, categories: Sequence[str], prices: Sequence[float]):
+        """Merge new legitimate prices and recompute statistics for touched categories only."""
+        prices = np.asarray(prices, dtype=float)
+        valid = np.isfinite(prices) & (prices > 0)
+        if not valid.any():
+            return
+
+        categories = np.asarray(categories, dtype=object)[valid]
+        prices = prices[valid]
+        touched = []
+        for category in np.unique(categories):
+            new = np.sort(prices[categories == category])
+            row = self._index.get(category)
+            if row is None:
+                row = self._add_category(category, new)
+            else:
+                current = self._samples[row]
+                self._samples[row] = np.insert(current, np.searchsorted(current, new), new)
+            touched.append(row)
+        self._recompute(touched)
+
+    def refresh_from_db(self, db: Session, batch_size: int = 5000) -> int:
+        """Pull non-flagged products registered since the last refresh."""
+        added = 0
+        while True:
+            rows = (
+                db.query(models.Product.id, models.Product.category, models.Product.price)
+                .filter(
+                    models.Product.id > self.last_product_id,
+                    models.Product.is_flagged.is_(False)
+                )
+                .order_by(models.Product.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            self.update([r.category for r in rows], [r.price for r in rows])
+            self.last_product_id = rows[-1].id
+            added += len(rows)
+
+        if added:
+            logger.info(f"Category price stats refreshed with {added} products")
+        return added
+
+    def observe(self, product_id: Optional[int], category: str, price: float):
+        """Fold in a single newly registered product."""
+        self.update([category], [price])
+        if product_id is not None:
+            self.last_product_id = max(self.last_product_id, product_id)
@@ -0,0 +1,122 @@
+import os
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import func
+
+import models
+from services.metrics import CHAIN_OUTBOX_PENDING
+
+# Streams whose entity row records the tx of its latest write
+TX_COLUMNS = {'products': models.Product, 'orders': models.Order}
+# The node answered and refused the write; anything else may be an outage
+REJECTED_OUTCOMES = ('rpc_error', 'http_error')
+
+
+class ChainOutbox:
+    """
+    Local queue for stream writes made while MultiChain is unreachable.
+
+    BlockchainService records a write here instead of waiting on a node
+    that is down; the request goes on without a tx, as it would after a
+    failed publish. Once the circuit closes, the health checker drains the
+    queue in id order, so an order's updates follow its creation, and
+    stamps each product or order with its tx. A write the node keeps
+    rejecting is marked dead after `max_attempts` so it cannot block the
+    rest; it stays in the table for inspection and can be requeued by
+    setting its status back to pending.
+    """
+
+    def __init__(self, blockchain_service, session_factory):
+        self.blockchain = blockchain_service
+        self.session_factory = session_factory
+        self.batch_size = int(os.getenv('CHAIN_OUTBOX_BATCH', '100'))
+        self.max_attempts = int(os.getenv('CHAIN_OUTBOX_MAX_ATTEMPTS', '5'))
+        # Called with (db, product_ids) after queued products get their tx
+        self.on_published = None
+
+    def record(self, stream: str, key: str, entity_id: Optional[int], data_hex: str) -> models.ChainOutbox:
+        item = models.ChainOutbox(stream=stream, key=key, entity_id=entity_id, data=data_hex, attempts=0)
+        db = self.session_factory()
+        try:
+            db.add(item)
+            db.commit()
+            db.refresh(item)
+        finally:
+            db.close()
+        CHAIN_OUTBOX_PENDING.inc()
+        logger.info(f"Chain write {stream}/{key} queued while MultiChain is unreachable")
+        return item
+
+    def pending(self, db) -> int:
+        count = (
+            db.query(func.count(models.ChainOutbox.id))
+            .filter(models.ChainOutbox.status == 'pending')
+            .scalar()
+        ) or 0
+        CHAIN_OUTBOX_PENDING.set(count)
+        return count
+
+    async def drain(self) -> int:
+        """
+        Publish queued writes oldest first, stopping at the first failure
+        that is not a rejection by the node; only rejections count as
+        attempts. Returns the number published.
+        """
+        db = self.session_factory()
+        published, product_ids, after_id = 0, [], 0
+        try:
+            while True:
+                items = (
+                    db.query(models.ChainOutbox)
+                    .filter(models.ChainOutbox.id > after_id, models.ChainOutbox.status == 'pending')
+                    .order_by(models.ChainOutbox.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not items:
+                    break
+                for item in items:
+                    after_id = item.id
+                    outcome, tx_id = await self.blockchain.publish_encoded(item.stream, item.key, item.data)
+                    if not tx_id:
+                        if outcome not in REJECTED_OUTCOMES:
+                            # Outage or unknown failure: retry later without spending an attempt
+                            break
+                        item.attempts += 1
+                        item.last_error = outcome
+                        if item.attempts >= self.max_attempts:
+                            logger.error(f"Queued chain write {item.stream}/{item.key} marked dead "
+                                         f"after {item.attempts} rejected attempts")
+                            item.status = 'dead'
+                        db.commit()
+                        continue
+
+                    model = TX_COLUMNS.get(item.stream)
+                    if model is not None and item.entity_id is not None:
+                        db.query(model).filter(model.id == item.entity_id).update(
+                            {model.blockchain_tx: tx_id}, synchronize_session=False
+                        )
+                        if model is models.Product:
+                            # Imports mark products whose publish failed; it has now succeeded
+                            db.query(model).filter(
+                                model.id == item.entity_id, model.status == 'partial_success'
+                            ).update({model.status: 'success', model.message: "Product registered successfully"},
+                                     synchronize_session=False)
+                            product_ids.append(item.entity_id)
+                    db.delete(item)
+                    db.commit()
+                    published += 1
+                else:
+                    if len(items) == self.batch_size:
+                        continue
+                break
+
+            if published:
+                logger.info(f"Published {published} queued chain writes")
+            if self.on_published and product_ids:
+                self.on_published(db, product_ids)
+            self.pending(db)
+        finally:
+            db.close()
+        return published
@@ -0,0 +1,68 @@
+import time
+
+from loguru import logger
+
+from services.metrics import CIRCUIT_STATE
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a dependency is down.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `allow()` refuses calls. Once `reset_timeout` seconds have passed, one
+    call is let through as a probe (half-open): success closes the circuit,
+    failure opens it for another `reset_timeout`. Callers must settle every
+    allowed call with record_success() or record_failure(), including
+    cancelled ones, or a half-open probe is never released. An error
+    response still proves the dependency is up and counts as success. Used
+    from the event loop only, so no locking.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._gauge = CIRCUIT_STATE.labels(dependency=name)
+        self._gauge.set(STATE_VALUES[CLOSED])
+
+    def _set(self, state: str):
+        self.state = state
+        self._gauge.set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set(CLOSED)
+            logger.info(f"Circuit '{self.name}' closed: dependency reachable again")
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            if self.state == CLOSED:
+                logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures; "
+                               f"failing fast for {self.reset_timeout:.0f}s")
+            self._set(OPEN)
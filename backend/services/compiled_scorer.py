@@ -0,0 +1,282 @@
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MinMaxScaler
+
+INT64_MIN = np.iinfo(np.int64).min
+
+
+def _ordered_keys(values: np.ndarray) -> np.ndarray:
+    """Map float64 to int64 so that integer order matches float order."""
+    bits = values.view(np.int64)
+    return np.where(bits >= 0, bits, INT64_MIN - bits)
+
+
+def _from_ordered_keys(keys: np.ndarray) -> np.ndarray:
+    return np.where(keys >= 0, keys, INT64_MIN - keys).view(np.float64)
+
+
+class CompiledTfidf:
+    """
+    TfidfVectorizer.transform for a fitted vectorizer, as a dict lookup per
+    token against the vocabulary. Uses the vectorizer's own analyzer and
+    the same operation order as sklearn, so the output is bit-identical.
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer):
+        self.analyze = vectorizer.build_analyzer()
+        self.vocabulary: Dict[str, int] = vectorizer.vocabulary_
+        self.idf = vectorizer.idf_.tolist() if vectorizer.use_idf else None
+        self.norm = vectorizer.norm
+        self.binary = vectorizer.binary
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.width = len(self.vocabulary)
+
+    @staticmethod
+    def supports(vectorizer) -> bool:
+        return (
+            type(vectorizer) is TfidfVectorizer
+            and vectorizer.norm in ('l1', 'l2', None)
+            and vectorizer.dtype == np.float64
+        )
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.width))
+        vocabulary, idf = self.vocabulary, self.idf
+        for row, text in enumerate(texts):
+            counts: Dict[int, int] = {}
+            for token in self.analyze(text):
+                column = vocabulary.get(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            if not counts:
+                continue
+            columns = sorted(counts)
+            if self.binary:
+                values = [1.0] * len(columns)
+            else:
+                values = [float(counts[c]) for c in columns]
+            if self.sublinear_tf:
+                values = (np.log(values) + 1).tolist()
+            if idf is not None:
+                values = [v * idf[c] for v, c in zip(values, columns)]
+            if self.norm == 'l2':
+                total = 0.0
+                for v in values:
+                    total += v * v
+                total = math.sqrt(total)
+            elif self.norm == 'l1':
+                total = 0.0
+                for v in values:
+                    total += abs(v)
+            else:
+                total = 0.0
+            if total != 0.0:
+                values = [v / total for v in values]
+            out[row, columns] = values
+        return out
+
+
+class CompiledForest:
+    """
+    A fitted random forest flattened into node arrays. Single rows walk the
+    trees in plain Python; batches advance every (row, tree) pair one level
+    per NumPy step.
+
+    The input scaler is folded into the split thresholds: sklearn compares
+    float32(scaled feature) against each threshold, and that map is monotone,
+    so every threshold is replaced by the largest raw float64 value that
+    still goes left. Raw features then skip scaling altogether, with
+    decisions identical to the sklearn path. Per-tree class probabilities
+    are summed sequentially in tree order, as sklearn does, so the resulting
+    probabilities match exactly.
+    """
+
+    def __init__(self, clf, scaler=None):
+        trees = [estimator.tree_ for estimator in clf.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.roots = offsets.astype(np.int64)
+        self.n_trees = len(trees)
+        self.max_depth = max(tree.max_depth for tree in trees)
+        self.classes_ = clf.classes_
+
+        left, right, feature, threshold, proba = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            # Leaves loop onto themselves and always "go left"
+            left.append(np.where(leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(leaf, nodes, tree.children_right) + offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            value = tree.value[:, 0, :clf.n_classes_].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            proba.append(value / normalizer)
+
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.feature = np.concatenate(feature)
+        self.threshold = np.concatenate(threshold)
+        self.leaf_proba = np.concatenate(proba)
+        # Interleaved (right, left) so that child = children[2 * node + goes_left]
+        self.children = np.stack([self.right, self.left], axis=1).ravel()
+        self.scaler = None
+        if scaler is not None:
+            self._fold_scaler(scaler)
+        self._lists = (
+            self.roots.tolist(), self.feature.tolist(), self.threshold.tolist(),
+            self.left.tolist(), self.right.tolist(), self.leaf_proba.tolist()
+        )
+
+    @staticmethod
+    def supports(clf, scaler) -> bool:
+        if type(clf) not in (RandomForestClassifier, ExtraTreesClassifier) or clf.n_outputs_ != 1:
+            return False
+        return scaler is None or CompiledForest._scaler_map(scaler) is not None
+
+    @staticmethod
+    def _scaler_map(scaler):
+        """(multiply, add) arrays reproducing scaler.transform op for op, or None."""
+        if type(scaler) is MinMaxScaler and not scaler.clip:
+            return scaler.scale_, scaler.min_
+        return None
+
+    def _fold_scaler(self, scaler):
+        scale, shift = self._scaler_map(scaler)
+        split = self.threshold != np.inf
+        features = self.feature[split]
+        s, m, t = scale[features], shift[features], self.threshold[split]
+        if np.any(s <= 0):
+            # A decreasing map would flip comparisons; keep scaling explicit
+            self.scaler = (scale, shift)
+            return
+
+        def goes_left(x):
+            # Probes near +-max overflow float32 to +-inf, which still orders correctly
+            with np.errstate(over='ignore', invalid='ignore'):
+                return (x * s + m).astype(np.float32).astype(np.float64) <= t
+
+        # Bisect on the ordered bit patterns between -inf (left) and +inf (right)
+        lo = _ordered_keys(np.full(len(t), -np.inf))
+        hi = _ordered_keys(np.full(len(t), np.inf))
+        while True:
+            open_ = hi - 1 > lo  # hi - lo can overflow int64
+            if not open_.any():
+                break
+            mid = lo // 2 + hi // 2 + (lo % 2 + hi % 2) // 2
+            left = goes_left(_from_ordered_keys(mid))
+            lo = np.where(open_ & left, mid, lo)
+            hi = np.where(open_ & ~left, mid, hi)
+        folded = self.threshold.copy()
+        folded[split] = _from_ordered_keys(lo)
+        self.threshold = folded
+
+    def _predict_one(self, x: List[float]) -> List[float]:
+        roots, feature, threshold, left, right, leaf_proba = self._lists
+        inf = float('inf')
+        total = [0.0] * len(leaf_proba[0])
+        for node in roots:
+            while threshold[node] != inf:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            for k, p in enumerate(leaf_proba[node]):
+                total[k] += p
+        return [t / self.n_trees for t in total]
+
+    def _predict_levels(self, X: np.ndarray) -> np.ndarray:
+        flat = X.ravel()
+        row_base = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            goes_left = flat[row_base + self.feature[node]] <= self.threshold[node]
+            node = self.children[2 * node + goes_left]
+        # cumsum accumulates strictly in tree order, like sklearn's running sum
+        return np.cumsum(self.leaf_proba[node], axis=1)[:, -1, :] / self.n_trees
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for raw (unscaled) feature rows."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.scaler is not None:
+            X = (X * self.scaler[0] + self.scaler[1]).astype(np.float32).astype(np.float64)
+        if len(X) == 1:
+            return np.array([self._predict_one(X[0].tolist())])
+        return self._predict_levels(np.ascontiguousarray(X))
+
+
+class CompiledScorer:
+    """
+    The loaded fraud model artifacts compiled into plain Python/NumPy
+    stages with the sklearn per-call overhead (DataFrames, input validation,
+    estimator dispatch) removed. Components of a type it does not know are
+    kept and called through sklearn, so any bundle can be wrapped.
+
+    The compiled stages win where that overhead dominates. Batches above
+    `max_rows` go through sklearn end to end, since its vectorized transforms
+    and Cython tree traversal are faster once the overhead is amortized.
+    """
+
+    def __init__(self, ohe, tf_name, tf_ing, scaler, clf, max_rows: int = 256):
+        self.max_rows = max_rows
+        self._ohe = ohe
+        self.categories: Optional[Dict[str, int]] = None
+        if ohe.handle_unknown == 'ignore' and ohe.drop is None and len(ohe.categories_) == 1:
+            self.categories = {category: i for i, category in enumerate(ohe.categories_[0].tolist())}
+        self.tf_name = CompiledTfidf(tf_name) if CompiledTfidf.supports(tf_name) else tf_name
+        self.tf_ing = CompiledTfidf(tf_ing) if CompiledTfidf.supports(tf_ing) else tf_ing
+        self.forest = CompiledForest(clf, scaler) if CompiledForest.supports(clf, scaler) else None
+        self._scaler, self._clf = scaler, clf
+        self._tf_name, self._tf_ing = tf_name, tf_ing
+
+    @property
+    def compiled_stages(self) -> List[str]:
+        stages = []
+        if self.categories is not None:
+            stages.append('ohe')
+        stages += [s for s, v in (('tf_name', self.tf_name), ('tf_ing', self.tf_ing)) if isinstance(v, CompiledTfidf)]
+        if self.forest is not None:
+            stages += ['scale', 'classify']
+        return stages
+
+    def encode_categories(self, categories: Sequence[str]) -> np.ndarray:
+        if self.categories is None or len(categories) > self.max_rows:
+            return self._ohe.transform(pd.DataFrame({self._ohe.feature_names_in_[0]: categories}))
+        out = np.zeros((len(categories), len(self.categories)))
+        for row, category in enumerate(categories):
+            column = self.categories.get(category)
+            if column is not None:
+                out[row, column] = 1.0
+        return out
+
+    def _text(self, vectorizer, fitted, texts: Sequence[str]) -> np.ndarray:
+        if isinstance(vectorizer, CompiledTfidf) and len(texts) <= self.max_rows:
+            return vectorizer.transform(texts)
+        result = fitted.transform(texts)
+        return result.toarray() if hasattr(result, 'toarray') else result
+
+    def name_features(self, names: Sequence[str]) -> np.ndarray:
+        return self._text(self.tf_name, self._tf_name, names)
+
+    def ingredient_features(self, ingredients: Sequence[str]) -> np.ndarray:
+        return self._text(self.tf_ing, self._tf_ing, ingredients)
+
+    def _folded(self, rows: int) -> bool:
+        return self.forest is not None and rows <= self.max_rows
+
+    def scale(self, X: np.ndarray) -> np.ndarray:
+        """Folded into the forest thresholds when compiled; otherwise the sklearn scaler."""
+        return X if self._folded(len(X)) else self._scaler.transform(X)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Expects the output of scale() for the same rows."""
+        if self._folded(len(X)):
+            return self.forest.predict_proba(X)
+        return self._clf.predict_proba(X)
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self._clf.classes_
@@ -0,0 +1,133 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set
+
+from loguru import logger
+
+
+class Event:
+    """A published change. `roles` and `user_ids` decide who may receive it."""
+
+    __slots__ = ('id', 'type', 'data', 'roles', 'user_ids', 'created_at')
+
+    def __init__(self, event_id: int, type: str, data: Dict, roles: Set[str], user_ids: Set[int]):
+        self.id = event_id
+        self.type = type
+        self.data = data
+        self.roles = roles
+        self.user_ids = user_ids
+        self.created_at = datetime.now(timezone.utc)
+
+    def sse(self) -> str:
+        """Server-sent events frame; the id lets a reconnecting client resume."""
+        payload = json.dumps({'type': self.type, 'at': self.created_at.isoformat(), 'data': self.data}, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", user_id: int, role: str, types: Optional[Set[str]], queue_size: int):
+        self.bus = bus
+        self.user_id = user_id
+        self.role = role
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = asyncio.get_running_loop()
+        # Set when the client fell behind and events were dropped; it must refetch
+        self.overflowed = False
+
+    def wants(self, event: Event) -> bool:
+        if self.types is not None and event.type not in self.types:
+            return False
+        return self.role in event.roles or self.user_id in event.user_ids
+
+    def _deliver(self, event: Event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def take_overflow(self) -> bool:
+        """True once after events were dropped; the queued backlog is discarded with it."""
+        if not self.overflowed:
+            return False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+        return True
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Next event, or None on timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    In-process pub/sub for dashboard push. Endpoints and background jobs
+    publish small delta events addressed to roles and/or individual users;
+    each connected client holds a bounded queue and receives only the events
+    addressed to it. A ring of recent events lets a reconnecting client
+    resume from its Last-Event-ID. Publishing is safe from worker threads.
+
+    Events live in this process only: with several API processes, each
+    client sees the events of the process it is connected to.
+    """
+
+    def __init__(self):
+        self.queue_size = int(os.getenv('EVENTS_QUEUE_SIZE', '256'))
+        self.history_size = int(os.getenv('EVENTS_HISTORY', '1000'))
+        self._ids = itertools.count(1)
+        self._history: deque = deque(maxlen=self.history_size)
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, type: str, data: Dict, roles: Iterable[str] = (), user_ids: Iterable[Optional[int]] = ()) -> Event:
+        with self._lock:
+            event = Event(next(self._ids), type, data,
+                          {str(getattr(r, 'value', r)) for r in roles}, {u for u in user_ids if u is not None})
+            self._history.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._deliver, event)
+            except RuntimeError:
+                # Loop already closed; the subscription is going away
+                self.unsubscribe(subscriber)
+        return event
+
+    def subscribe(self, user_id: int, role: str, types: Optional[Set[str]] = None,
+                  last_event_id: Optional[int] = None) -> Subscription:
+        """Register a client; events after `last_event_id` still in the ring are queued first."""
+        subscription = Subscription(self, user_id, str(getattr(role, 'value', role)), types, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                last_id = self._history[-1].id if self._history else 0
+                oldest = self._history[0].id if self._history else 1
+                # Gap older than the ring, or ids from before a restart: refetch
+                if last_event_id + 1 < oldest or last_event_id > last_id:
+                    subscription.overflowed = True
+                missed = [e for e in self._history if e.id > last_event_id and subscription.wants(e)]
+                for event in missed[-self.queue_size:]:
+                    subscription.queue.put_nowait(event)
+            self._subscribers.add(subscription)
+        logger.debug(f"Event subscriber added: user {user_id} ({subscription.role}), {len(self._subscribers)} connected")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
@@ -0,0 +1,114 @@
+import base64
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+SORTS = ('created_at', 'confidence')
+
+S = models.FlaggedProductSummary
+
+# Columns served by GET /flagged-products, in response order
+LIST_COLUMNS = (
+    S.flag_id, S.product_id, S.supplier_id, S.supplier_username, S.supplier_email,
+    S.product_name, S.category, S.price, S.ingredients, S.fraud_confidence,
+    S.is_flagged, S.reason, S.created_at, S.reviewed_at,
+)
+SUMMARY_COLUMNS = [column.key for column in LIST_COLUMNS]
+
+
+def _source(product_ids: Optional[Iterable[int]] = None):
+    """SELECT producing summary rows, in SUMMARY_COLUMNS order, from flags joined to product and supplier."""
+    F, P, U = models.FlaggedProduct, models.Product, models.User
+    query = (
+        select(
+            F.id, F.product_id, F.supplier_id, U.username, U.email,
+            P.product_name, P.category, P.price, P.ingredients,
+            func.coalesce(P.fraud_confidence, 0.0), func.coalesce(P.is_flagged, False),
+            F.reason, func.coalesce(F.created_at, func.current_timestamp()), F.reviewed_at
+        )
+        .join(P, F.product_id == P.id)
+        .outerjoin(U, F.supplier_id == U.id)
+    )
+    if product_ids is not None:
+        query = query.where(F.product_id.in_(product_ids))
+    return query
+
+
+class FlagSummaryService:
+    """
+    Denormalized flag list for admin review.
+
+    FlaggedProductSummary holds one row per flag with the product and
+    supplier columns the review list shows, so GET /flagged-products reads a
+    single indexed table instead of joining three. Writers that add, delete
+    or review flags, or change a flagged product's verdict, call refresh()
+    for the affected products inside their own transaction; it rebuilds those
+    products' rows with one DELETE and one INSERT ... SELECT.
+    """
+
+    @staticmethod
+    def refresh(db: Session, product_ids: Iterable[int]):
+        """Rebuild the summary rows of these products; the caller commits."""
+        product_ids = list(set(product_ids))
+        if not product_ids:
+            return
+        db.flush()  # ORM-added flags must be visible to the INSERT ... SELECT
+        db.execute(delete(S).where(S.product_id.in_(product_ids)))
+        db.execute(insert(S).from_select(SUMMARY_COLUMNS, _source(product_ids)))
+
+    @staticmethod
+    def remove(db: Session, product_id: int):
+        """Drop a product's rows ahead of the product itself; the caller commits."""
+        db.execute(delete(S).where(S.product_id == product_id))
+
+    @staticmethod
+    def backfill(db: Session) -> int:
+        """Summarize flags raised before the table existed; commits."""
+        missing = ~select(S.flag_id).where(S.flag_id == models.FlaggedProduct.id).exists()
+        added = db.execute(insert(S).from_select(SUMMARY_COLUMNS, _source().where(missing))).rowcount
+        db.commit()
+        if added:
+            logger.info(f"Flag summary backfilled with {added} flags")
+        return added
+
+    # Reads
+
+    @staticmethod
+    def encode_cursor(sort: str, row) -> str:
+        value = row.created_at.isoformat() if sort == 'created_at' else repr(float(row.fraud_confidence))
+        return base64.urlsafe_b64encode(f"{value}|{row.flag_id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(sort: str, cursor: str) -> Tuple:
+        """(sort value, flag id) from a cursor; raises ValueError when malformed."""
+        try:
+            value, flag_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            key = datetime.fromisoformat(value) if sort == 'created_at' else float(value)
+            return key, int(flag_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def page(self, db: Session, sort: str = 'created_at', supplier_id: Optional[int] = None,
+             cursor: Optional[str] = None, limit: int = 50) -> Dict:
+        """
+        One page, newest (or most confident) first, ties broken by flag id.
+        Rows are column tuples, never ORM entities.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        key = S.created_at if sort == 'created_at' else S.fraud_confidence
+        query = select(*LIST_COLUMNS)
+        if supplier_id is not None:
+            query = query.where(S.supplier_id == supplier_id)
+        if cursor:
+            query = query.where(tuple_(key, S.flag_id) < tuple_(*self.decode_cursor(sort, cursor)))
+        rows = db.execute(query.order_by(key.desc(), S.flag_id.desc()).limit(limit)).all()
+        return {
+            'items': rows,
+            'next_cursor': self.encode_cursor(sort, rows[-1]) if len(rows) == limit else None
+        }
@@ -1,10 +1,26 @@
+import hashlib
 import os
-import joblib
+import time
 import numpy as np
-import pandas as pd
 from loguru import logger
 from fastapi import HTTPException, status
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
+from services.category_stats import CategoryPriceStats
+from services.metrics import ML_STAGE_LATENCY
+from services.rule_filter import RuleFilter
+
+# sklearn, pandas and joblib are imported by the sklearn backend only, so the
+# ONNX backend serves without them installed
+BACKENDS = ('sklearn', 'onnx')
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of an artifact's bytes; unlike its mtime, stable across checkouts and deploys."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 class FraudDetectionService:
@@ -14,10 +30,21 @@ class FraudDetectionService:
     """
 
     def __init__(self):
+        # FRAUD_DETECTION_BACKEND=onnx serves the graph from model/export_onnx.py
+        self.backend = os.getenv('FRAUD_DETECTION_BACKEND', 'sklearn').lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown FRAUD_DETECTION_BACKEND '{self.backend}', expected one of {BACKENDS}")
+
         # Determine model artifact path
         base_dir = os.path.dirname(__file__)
         models_dir = os.path.abspath(os.path.join(base_dir, '..', 'ml_models'))
-        self.model_path = os.path.join(models_dir, 'skincare_counterfeit_artifacts.pkl')
+        if self.backend == 'onnx':
+            artifact = os.getenv('FRAUD_ONNX_MODEL', 'skincare_counterfeit.onnx')
+        else:
+            artifact = os.getenv('FRAUD_MODEL_ARTIFACT', 'skincare_counterfeit_artifacts.pkl')
+        self.model_path = os.path.join(models_dir, artifact)
+        self.model_mtime = None
+        self.model_digest = None
 
         if not os.path.isfile(self.model_path):
             logger.error(f"ML artifact not found at {self.model_path}")
@@ -33,14 +60,40 @@ class FraudDetectionService:
         self.scaler = None
         self.clf = None
         self.median_price_map = None
+        self.categories: List[str] = []
+        self.price_stats = None
+        # Live prices a category needs before its z-score is reported
+        self.price_stats_min_samples = int(os.getenv('CATEGORY_STATS_MIN_SAMPLES', '30'))
+        self.metadata = {}
+        self.onnx = None
+        self.onnx_threads = int(os.getenv('FRAUD_ONNX_THREADS', '1'))
+        # FRAUD_FAST_SCORER=false serves predictions through sklearn directly
+        self.use_fast_scorer = os.getenv('FRAUD_FAST_SCORER', 'true').lower() == 'true'
+        self.fast_scorer_max_rows = int(os.getenv('FRAUD_FAST_SCORER_MAX_ROWS', '256'))
+        self.scorer = None
+        self._stage_histograms = {stage: ML_STAGE_LATENCY.labels(stage=stage) for stage in self.STAGES}
+        # Cheap rules that decide obvious cases before the model runs
+        self.rules = RuleFilter()
 
         self.load_model()
 
+    @property
+    def threshold(self) -> float:
+        """Counterfeit probability above which a product is flagged; train.py records it."""
+        return float(self.metadata.get('threshold', 0.5))
+
     def load_model(self):
         """Load the pickled ML artifacts and validate presence of all components."""
+        if self.backend == 'onnx':
+            return self._load_onnx()
         try:
+            import joblib
+            from services.compiled_scorer import CompiledScorer
+
             logger.debug(f"Loading ML artifacts from {self.model_path}")
             artifacts = joblib.load(self.model_path)
+            self.model_mtime = os.path.getmtime(self.model_path)
+            self.model_digest = file_digest(self.model_path)
 
             required_keys = ['ohe', 'tf_name', 'tf_ing', 'scaler', 'clf', 'median_price_map']
             for key in required_keys:
@@ -54,6 +107,10 @@ class FraudDetectionService:
             self.scaler = artifacts.get('scaler')
             self.clf = artifacts.get('clf')
             self.median_price_map = artifacts.get('median_price_map')
+            self.categories = list(self.ohe.categories_[0]) if self.ohe is not None else []
+            # Bundles written by model/train.py carry version/threshold metadata
+            self.metadata = artifacts.get('metadata') or {}
+            self.price_stats = CategoryPriceStats.from_artifacts(artifacts, self.price_stats_min_samples)
 
             # Validate that none of the critical components are None
             if self.ohe is None:
@@ -69,86 +126,272 @@ class FraudDetectionService:
             if self.median_price_map is None:
                 raise ValueError("Median price map was None after loading")
 
-            logger.info("ML artifacts loaded successfully.")
+            self.scorer = None
+            if self.use_fast_scorer:
+                self.scorer = CompiledScorer(
+                    self.ohe, self.tf_name, self.tf_ing, self.scaler, self.clf,
+                    max_rows=self.fast_scorer_max_rows
+                )
+                logger.info(f"Compiled scorer stages: {', '.join(self.scorer.compiled_stages) or 'none'}")
+
+            logger.info(
+                "ML artifacts loaded successfully (version: {}).",
+                self.metadata.get('version', 'unversioned')
+            )
 
         except Exception as e:
-            logger.error(f"Failed to load ML model: {e}", exc_info=True)
+            logger.opt(exception=True).error(f"Failed to load ML model: {e}")
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Failed to load ML model: {str(e)}"
             )
 
+    def _load_onnx(self):
+        """Load the exported graph and its sidecar; no sklearn objects are involved."""
+        try:
+            from services.onnx_scorer import OnnxScorer
+
+            logger.debug(f"Loading ONNX model from {self.model_path}")
+            self.onnx = OnnxScorer(self.model_path, intra_op_threads=self.onnx_threads)
+            self.model_mtime = os.path.getmtime(self.model_path)
+            self.model_digest = file_digest(self.model_path)
+            sidecar = self.onnx.sidecar
+            self.median_price_map = sidecar['median_price_map']
+            self.categories = self.onnx.categories
+            self.metadata = sidecar.get('metadata') or {}
+            self.price_stats = CategoryPriceStats.from_artifacts(sidecar, self.price_stats_min_samples)
+            logger.info(
+                "ONNX model loaded successfully (version: {}).",
+                self.metadata.get('version', 'unversioned')
+            )
+        except Exception as e:
+            logger.opt(exception=True).error(f"Failed to load ONNX model: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Failed to load ONNX model: {str(e)}"
+            )
+
+    def reload_if_updated(self, path: str = None) -> bool:
+        """Reload the bundle if `path` is the served artifact and it changed on disk."""
+        if path is not None and os.path.abspath(path) != os.path.abspath(self.model_path):
+            return False
+        if not os.path.isfile(self.model_path) or os.path.getmtime(self.model_path) == self.model_mtime:
+            return False
+        self.load_model()
+        return True
+
+    # Pipeline stages reported through the optional `timings` dict
+    STAGES = ('rules', 'features', 'ohe', 'tf_name', 'tf_ing', 'hstack', 'scale', 'classify')
+
+    @staticmethod
+    def _clean_row(product_data: Dict, require_ingredients: bool = True) -> Dict:
+        """
+        Extract and validate the fields the model uses. Ingredients may be
+        left empty for the rule pre-filter, which decides such products itself.
+        """
+        row = {
+            'name': product_data.get('product_name', '').strip(),
+            'ings': product_data.get('ingredients', '').strip(),
+            'price': float(product_data.get('price', 0)),
+            'cat': product_data.get('category', '').strip(),
+        }
+        if not row['name'] or not row['cat'] or (require_ingredients and not row['ings']):
+            raise ValueError("Missing required fields in product data")
+        return row
+
+    def _predict_rows(self, rows: List[Dict], timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Run the model on cleaned rows in one pass.
+        Stage durations go to the ml_stage_duration_seconds histogram and,
+        if `timings` is given, are also added to it.
+        """
+        clock = time.perf_counter
+        t0 = clock()
+
+        def mark(stage):
+            nonlocal t0
+            now = clock()
+            elapsed = now - t0
+            self._stage_histograms[stage].observe(elapsed)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+            t0 = now
+
+        # Numeric features
+        cats = [r['cat'] for r in rows]
+        prices = [r['price'] for r in rows]
+        price_ratio = self.price_stats.price_ratio(cats, prices)
+        price_zscore = self.price_stats.zscore(cats, prices)
+        num_ings = [len(r['ings'].split(',')) for r in rows]
+        mark('features')
+
+        scorer = self.scorer
+        names = [r['name'] for r in rows]
+        ings = [r['ings'] for r in rows]
+        if self.onnx is not None:
+            # Encoding, TF-IDF, scaling and the forest all run inside the graph
+            proba = self.onnx.predict_proba(cats, names, ings, num_ings, price_ratio)
+            labels = proba[:, 1] > self.threshold
+            mark('classify')
+            return self._results(rows, proba, labels, price_ratio, price_zscore, num_ings)
+
+        if scorer is not None:
+            # Same stages through the compiled artifacts; identical output
+            cat_feat = scorer.encode_categories(cats)
+            mark('ohe')
+            name_feat = scorer.name_features(names)
+            mark('tf_name')
+            ing_feat = scorer.ingredient_features(ings)
+            mark('tf_ing')
+            X = np.hstack([np.column_stack([num_ings, price_ratio]), cat_feat, name_feat, ing_feat])
+            mark('hstack')
+            X_scaled = scorer.scale(X)
+            mark('scale')
+            proba = scorer.predict_proba(X_scaled)
+            labels = proba[:, 1] > self.threshold
+            mark('classify')
+            return self._results(rows, proba, labels, price_ratio, price_zscore, num_ings)
+
+        import pandas as pd
+
+        # Category encoding
+        feature_name = self.ohe.feature_names_in_[0]
+        cat_df = pd.DataFrame({feature_name: cats})
+        cat_feat = self.ohe.transform(cat_df)
+        mark('ohe')
+
+        # Handle TF-IDF transforms safely
+        def safe_transform(vectorizer, texts):
+            result = vectorizer.transform(texts)
+            if hasattr(result, 'toarray'):
+                return result.toarray()
+            return result  # Already a numpy array
+
+        name_feat = safe_transform(self.tf_name, names)
+        mark('tf_name')
+        ing_feat = safe_transform(self.tf_ing, ings)
+        mark('tf_ing')
+
+        # Combine and scale
+        x_num = np.column_stack([num_ings, price_ratio])
+        X = np.hstack([x_num, cat_feat, name_feat, ing_feat])
+        mark('hstack')
+        X_scaled = self.scaler.transform(X)
+        mark('scale')
+
+        # Predict; the label is derived from the probabilities, saving a
+        # second pass over the model
+        proba = self.clf.predict_proba(X_scaled)
+        labels = proba[:, 1] > self.threshold
+        mark('classify')
+        return self._results(rows, proba, labels, price_ratio, price_zscore, num_ings)
+
+    @staticmethod
+    def _results(rows, proba, labels, price_ratio, price_zscore, num_ings) -> List[Dict]:
+        return [
+            {
+                'is_counterfeit': bool(labels[i]),
+                'confidence': proba[i, 1],
+                'price_ratio': float(price_ratio[i]),
+                'price_zscore': float(price_zscore[i]),
+                'ingredient_count': num_ings[i],
+                'rule': None,
+                'reason': None,
+                'penalize': True
+            }
+            for i in range(len(rows))
+        ]
+
+    def _score_rows(self, rows: List[Dict], timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Rule pre-filter, then the model for the rows no rule decided.
+        Rule decisions carry the rule name and a FlaggedProduct-ready reason.
+        """
+        start = time.perf_counter()
+        cats = [r['cat'] for r in rows]
+        prices = [r['price'] for r in rows]
+        price_ratio = self.price_stats.price_ratio(cats, prices)
+        known = self.price_stats.has_reference(cats)
+        decisions = self.rules.evaluate([r['ings'] for r in rows], price_ratio, known)
+
+        results: List[Optional[Dict]] = [None] * len(rows)
+        decided = [i for i, d in enumerate(decisions) if d is not None]
+        if decided:
+            price_zscore = self.price_stats.zscore([cats[i] for i in decided], [prices[i] for i in decided])
+            for j, i in enumerate(decided):
+                decision = decisions[i]
+                results[i] = {
+                    'is_counterfeit': decision['decision'] == 'flag',
+                    'confidence': decision['confidence'],
+                    'price_ratio': float(price_ratio[i]),
+                    'price_zscore': float(price_zscore[j]),
+                    'ingredient_count': len(rows[i]['ings'].split(',')) if rows[i]['ings'] else 0,
+                    'rule': decision['rule'],
+                    'reason': decision['reason'],
+                    'penalize': decision['penalize']
+                }
+        elapsed = time.perf_counter() - start
+        self._stage_histograms['rules'].observe(elapsed)
+        if timings is not None:
+            timings['rules'] = timings.get('rules', 0.0) + elapsed
+
+        remaining = [i for i, d in enumerate(decisions) if d is None]
+        if remaining:
+            if any(not rows[i]['ings'] for i in remaining):
+                raise ValueError("Missing required fields in product data")
+            for i, result in zip(remaining, self._predict_rows([rows[i] for i in remaining], timings)):
+                results[i] = result
+        return results
+
     def _ml_predict(self, product_data: Dict) -> Dict:
         """
         Run the ML model on a single product's data.
         Returns a dict with raw prediction details.
         """
         try:
-            # Extract and clean inputs
-            name = product_data.get('product_name', '').strip()
-            ings = product_data.get('ingredients', '').strip()
-            price = float(product_data.get('price', 0))
-            cat = product_data.get('category', '').strip()
-
-            if not name or not ings or not cat:
-                raise ValueError("Missing required fields in product data")
-
-            # Numeric features
-            price_ratio = price / self.median_price_map.get(cat, price)
-            num_ings = len(ings.split(','))
-
-            # Category encoding
-            feature_name = self.ohe.feature_names_in_[0]
-            cat_df = pd.DataFrame([{feature_name: cat}])
-            cat_feat = self.ohe.transform(cat_df)
-
-            # Handle TF-IDF transforms safely
-            def safe_transform(vectorizer, text):
-                result = vectorizer.transform([text])
-                if hasattr(result, 'toarray'):
-                    return result.toarray()
-                return result  # Already a numpy array
-
-            name_feat = safe_transform(self.tf_name, name)
-            ing_feat = safe_transform(self.tf_ing, ings)
-
-            # Combine and scale
-            x_num = np.array([[num_ings, price_ratio]])
-            X = np.hstack([x_num, cat_feat, name_feat, ing_feat])
-            X_scaled = self.scaler.transform(X)
-
-            # Predict
-            prob = self.clf.predict_proba(X_scaled)[0, 1]
-            is_cf = bool(self.clf.predict(X_scaled)[0])
-
-            return {
-                'is_counterfeit': is_cf,
-                'confidence': prob,
-                'price_ratio': price_ratio,
-                'ingredient_count': num_ings
-            }
+            return self._score_rows([self._clean_row(product_data, require_ingredients=False)])[0]
 
         except Exception as e:
-            logger.error(f"Prediction error: {e}", exc_info=True)
+            logger.opt(exception=True).error(f"Prediction error: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"ML prediction failed: {str(e)}"
             )
 
+    def predict_batch(self, products: List[Dict], timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Batch counterpart of _ml_predict: one vectorized pass over the products
+        the rule pre-filter leaves to the model.
+        Raises ValueError if any product is missing a required field.
+        """
+        if not products:
+            return []
+        return self._score_rows([self._clean_row(p, require_ingredients=False) for p in products], timings)
+
+    def predict(self, product_data: Dict) -> Dict:
+        """
+        Prediction details for one product; 'penalize' says whether a flag
+        counts toward blocking the supplier.
+        """
+        return self._ml_predict(product_data)
+
     def get_counterfeit_confidence(self, product_data: Dict) -> Tuple[bool, float, str]:
         """
         Public method to get a boolean flag, confidence score, and human-readable reason.
         """
         result = self._ml_predict(product_data)
-        p = result['confidence']
+        return result['is_counterfeit'], result['confidence'], self.describe(result)
 
+    @staticmethod
+    def describe(result: Dict) -> str:
+        """Human-readable reason for a prediction result, as stored in FlaggedProduct.reason."""
+        p = result['confidence']
+        if result['reason']:
+            return result['reason']  # decided by a pre-filter rule
         if p < 0.3:
-            reason = "Characteristics consistent with legitimate items"
-        elif p < 0.5:
-            reason = "Some suspicious signals but likely genuine"
-        elif p < 0.7:
-            reason = "Multiple suspicious indicators detected"
-        else:
-            reason = "High confidence counterfeit based on multiple factors"
-
-        return result['is_counterfeit'], p, reason
\ No newline at end of file
+            return "Characteristics consistent with legitimate items"
+        if p < 0.5:
+            return "Some suspicious signals but likely genuine"
+        if p < 0.7:
+            return "Multiple suspicious indicators detected"
+        return "High confidence counterfeit based on multiple factors"
\ No newline at end of file
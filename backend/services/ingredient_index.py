@@ -0,0 +1,113 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import models
+
+# Registrations send "Water, Aloe" or the dataset's "['water', 'aloe']"
+_SEPARATORS = re.compile(r"[,;\n]")
+_WHITESPACE = re.compile(r"\s+")
+MAX_INGREDIENT_LENGTH = 200
+
+
+def normalize_ingredient(name: str) -> str:
+    name = (name or '').strip().strip('[]').strip().strip('\'"').strip().lower()
+    return _WHITESPACE.sub(' ', name)[:MAX_INGREDIENT_LENGTH]
+
+
+def parse_ingredients(text: Optional[str]) -> List[str]:
+    """Distinct normalized ingredients of a free-text list, in listed order."""
+    seen = {}
+    for part in _SEPARATORS.split(text or ''):
+        name = normalize_ingredient(part)
+        if name:
+            seen.setdefault(name, None)
+    return list(seen)
+
+
+class IngredientIndex:
+    """
+    Ingredient -> product lookups backed by the product_ingredients junction
+    table. Each product's free-text ingredient list is split and normalized
+    once at registration; composition queries then use the
+    (ingredient, product_id) index instead of LIKE scans over products.
+    """
+
+    def index_product(self, db: Session, product_id: int, ingredients: Optional[str]) -> int:
+        """Replace a product's entries; the caller commits."""
+        self.remove(db, product_id)
+        names = parse_ingredients(ingredients)
+        db.add_all([models.ProductIngredient(product_id=product_id, ingredient=name) for name in names])
+        return len(names)
+
+    @staticmethod
+    def index_many(db: Session, ingredients_by_product: Dict[int, Optional[str]]) -> int:
+        """Entries for newly inserted products in one multi-row INSERT; the caller commits."""
+        rows = [
+            {'product_id': product_id, 'ingredient': name}
+            for product_id, ingredients in ingredients_by_product.items()
+            for name in parse_ingredients(ingredients)
+        ]
+        if rows:
+            db.execute(insert(models.ProductIngredient), rows)
+        return len(rows)
+
+    @staticmethod
+    def remove(db: Session, product_id: int):
+        """Drop a product's entries ahead of the product itself; the caller commits."""
+        db.query(models.ProductIngredient).filter(
+            models.ProductIngredient.product_id == product_id
+        ).delete(synchronize_session=False)
+
+    def backfill(self, db: Session, chunk_size: int = 5000) -> int:
+        """Index products registered before the table existed, `chunk_size` per commit."""
+        indexed = (
+            db.query(models.ProductIngredient.product_id)
+            .filter(models.ProductIngredient.product_id == models.Product.id)
+            .exists()
+        )
+        after_id, total = 0, 0
+        while True:
+            rows = (
+                db.query(models.Product.id, models.Product.ingredients)
+                .filter(models.Product.id > after_id, ~indexed)
+                .order_by(models.Product.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            db.add_all([
+                models.ProductIngredient(product_id=product_id, ingredient=name)
+                for product_id, ingredients in rows
+                for name in parse_ingredients(ingredients)
+            ])
+            db.commit()
+            after_id, total = rows[-1][0], total + len(rows)
+        if total:
+            logger.info(f"Ingredient index backfilled for {total} products")
+        return total
+
+    @staticmethod
+    def search(db: Session, ingredients: Sequence[str], match_all: bool = True,
+               after_id: int = 0, limit: int = 100) -> List[int]:
+        """
+        IDs of products containing all (AND) or any (OR) of `ingredients`,
+        ascending; pass the last ID back as `after_id` for the next page.
+        """
+        names = sorted({normalize_ingredient(name) for name in ingredients} - {''})
+        if not names:
+            return []
+        product_id = models.ProductIngredient.product_id
+        query = db.query(product_id).filter(
+            models.ProductIngredient.ingredient.in_(names),
+            product_id > after_id
+        )
+        if match_all:
+            query = query.group_by(product_id).having(func.count() == len(names))
+        else:
+            query = query.distinct()
+        return [pid for (pid,) in query.order_by(product_id).limit(limit)]
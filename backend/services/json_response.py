@@ -0,0 +1,82 @@
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Response, status
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.middleware.gzip import GZipMiddleware
+
+# Optional fast encoder; pydantic-core's encoder is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def schema_columns(model, schema: type[BaseModel]) -> Tuple:
+    """ORM columns named like the schema's fields, for selecting plain rows instead of entities."""
+    return tuple(getattr(model, name) for name in schema.model_fields)
+
+
+def row_dicts(rows: Sequence) -> List[Dict]:
+    """Column rows (SQLAlchemy Row) as dicts keyed by column label."""
+    if not rows:
+        return []
+    names = rows[0]._fields
+    return [dict(zip(names, row)) for row in rows]
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes; datetimes as ISO 8601, like pydantic's serializer."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return to_json(content)
+
+
+def etag_for(body: bytes) -> str:
+    # Weak: the same representation may be sent gzipped or not
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def json_response(content: Any, if_none_match: Optional[str] = None) -> Response:
+    """
+    Encoded JSON response with an ETag; 304 when the client's copy is
+    current. Content is plain data (see row_dicts), so nothing is validated
+    or converted per field on the way out: the columns selected must already
+    match the endpoint's response_model.
+    """
+    body = dumps(content)
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzip for responses over `minimum_size` when the client accepts it.
+    Streams under `excluded_paths` pass through untouched: the stock
+    responder buffers streamed chunks in its compressor, which would hold
+    back server-sent events, and exports compress themselves.
+    """
+
+    def __init__(self, app, minimum_size: int = 1000, compresslevel: int = 6,
+                 excluded_paths: Sequence[str] = ()):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
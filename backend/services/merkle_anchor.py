@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import models
+from services.payload_codec import decode_payload
+
+# Domain separation keeps a leaf from being passed off as an inner node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(payload: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + payload).digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_levels(leaf_hashes: List[bytes]) -> List[List[bytes]]:
+    """
+    All levels of the tree, leaves first and the root last. An odd node is
+    paired with itself; the manifest commits to the leaf count, so a tree
+    with the last leaf duplicated does not verify against the same anchor.
+    """
+    levels = [list(leaf_hashes)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([
+            hash_node(level[i], level[i + 1] if i + 1 < len(level) else level[i])
+            for i in range(0, len(level), 2)
+        ])
+    return levels
+
+
+def inclusion_proof(levels: List[List[bytes]], index: int) -> List[Tuple[str, bytes]]:
+    """Sibling hashes from leaf to root, each tagged with the side it sits on."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        proof.append(('left' if sibling < index else 'right', level[min(sibling, len(level) - 1)]))
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf_hash: bytes, proof: List[Tuple[str, bytes]], root: bytes) -> bool:
+    node = leaf_hash
+    for position, sibling in proof:
+        node = hash_node(sibling, node) if position == 'left' else hash_node(node, sibling)
+    return node == root
+
+
+class MerkleAnchorService:
+    """
+    Batches supply-chain events into one chain transaction per time window.
+
+    BlockchainService hands events to `record` instead of publishing them.
+    Each event is stored in anchor_leaves with its leaf hash; every window
+    the pending leaves are sealed into an AnchorBatch and only the Merkle
+    root, with a small manifest, is published to the anchors stream. Any
+    event can later be proven against that root with `proofs_for`.
+    """
+
+    def __init__(self, blockchain_service, session_factory):
+        self.blockchain = blockchain_service
+        self.session_factory = session_factory
+        self.window = float(os.getenv('ANCHOR_WINDOW_SECONDS', '60'))
+        # A full batch is sealed early instead of waiting for the window
+        self.max_leaves = int(os.getenv('ANCHOR_MAX_LEAVES', '5000'))
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        # Called with (db, product_ids) after products are stamped with an anchor tx
+        self.on_anchored = None
+
+    def record(self, stream: str, key: str, entity_type: str, entity_id: Optional[int], data: Dict) -> models.AnchorLeaf:
+        """Persist one event as a pending leaf."""
+        payload = self.blockchain.codec.encode_bytes({'stream': stream, 'key': key, 'data': data})
+        leaf = models.AnchorLeaf(
+            stream=stream,
+            key=key,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            payload=payload,
+            leaf_hash=hash_leaf(payload).hex()
+        )
+        db = self.session_factory()
+        try:
+            db.add(leaf)
+            db.commit()
+            db.refresh(leaf)
+        finally:
+            db.close()
+
+        self._pending += 1
+        if self._pending >= self.max_leaves:
+            self._wakeup.set()
+        return leaf
+
+    def seal_batch(self, db: Session) -> Optional[models.AnchorBatch]:
+        """Assign up to max_leaves pending leaves to a new batch and fix its root."""
+        leaves = (
+            db.query(models.AnchorLeaf)
+            .filter(models.AnchorLeaf.batch_id.is_(None))
+            .order_by(models.AnchorLeaf.id)
+            .limit(self.max_leaves)
+            .all()
+        )
+        if not leaves:
+            return None
+
+        levels = build_levels([bytes.fromhex(leaf.leaf_hash) for leaf in leaves])
+        batch = models.AnchorBatch(
+            root=levels[-1][0].hex(),
+            leaf_count=len(leaves),
+            window_start=leaves[0].created_at,
+            window_end=leaves[-1].created_at
+        )
+        db.add(batch)
+        db.flush()
+        for index, leaf in enumerate(leaves):
+            leaf.batch_id = batch.id
+            leaf.leaf_index = index
+        db.commit()
+        self._pending = max(0, self._pending - len(leaves))
+        return batch
+
+    def _manifest(self, db: Session, batch: models.AnchorBatch) -> Dict:
+        streams: Dict[str, int] = {}
+        bounds = []
+        for stream, leaf_id in (
+            db.query(models.AnchorLeaf.stream, models.AnchorLeaf.id)
+            .filter(models.AnchorLeaf.batch_id == batch.id)
+        ):
+            streams[stream] = streams.get(stream, 0) + 1
+            bounds.append(leaf_id)
+        return {
+            'v': 1,
+            'batch': batch.id,
+            'root': batch.root,
+            'count': batch.leaf_count,
+            'leaves': [min(bounds), max(bounds)],
+            'from': batch.window_start.isoformat(),
+            'to': batch.window_end.isoformat(),
+            'streams': streams
+        }
+
+    async def publish_batch(self, db: Session, batch: models.AnchorBatch) -> Optional[str]:
+        """Publish the batch root; on success stamp the anchored products and orders with the tx."""
+        tx_id = await self.blockchain.publish_anchor(f"anchor_{batch.id}", self._manifest(db, batch))
+        if not tx_id:
+            return None
+
+        batch.blockchain_tx = tx_id
+        batch.anchored_at = datetime.now(timezone.utc)
+        anchored = {}
+        for entity_type, model in (('product', models.Product), ('order', models.Order)):
+            ids = [
+                entity_id for (entity_id,) in
+                db.query(models.AnchorLeaf.entity_id)
+                .filter(models.AnchorLeaf.batch_id == batch.id, models.AnchorLeaf.entity_type == entity_type)
+                .distinct()
+            ]
+            if ids:
+                db.query(model).filter(model.id.in_(ids)).update(
+                    {model.blockchain_tx: tx_id}, synchronize_session=False
+                )
+            anchored[entity_type] = ids
+        db.commit()
+        if self.on_anchored and anchored.get('product'):
+            self.on_anchored(db, anchored['product'])
+        logger.info(f"Anchored batch {batch.id} ({batch.leaf_count} events, root {batch.root[:16]}...). TxID: {tx_id}")
+        return tx_id
+
+    async def flush(self, db: Session) -> int:
+        """
+        Publish batches left unanchored by an earlier failure, then seal and
+        publish the pending leaves. Returns the number of leaves sealed.
+        """
+        unpublished = (
+            db.query(models.AnchorBatch)
+            .filter(models.AnchorBatch.blockchain_tx.is_(None))
+            .order_by(models.AnchorBatch.id)
+            .all()
+        )
+        for batch in unpublished:
+            if not await self.publish_batch(db, batch):
+                logger.warning(f"Anchor batch {batch.id} still unpublished; will retry next window")
+                return 0
+
+        sealed = 0
+        while True:
+            batch = self.seal_batch(db)
+            if batch is None:
+                break
+            sealed += batch.leaf_count
+            if not await self.publish_batch(db, batch):
+                logger.warning(f"Failed to publish anchor batch {batch.id}; will retry next window")
+                break
+            if batch.leaf_count < self.max_leaves:
+                break
+        return sealed
+
+    async def run_forever(self):
+        """Flush once per window, or sooner when max_leaves events are pending."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                db = self.session_factory()
+                try:
+                    await self.flush(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                logger.error(f"Anchor flush failed: {str(e)}")
+
+    def history_items(self, db: Session, entity_type: str, entity_id: int) -> List[Dict]:
+        """Anchored events for an entity, shaped like MultiChain stream items."""
+        rows = (
+            db.query(models.AnchorLeaf, models.AnchorBatch.blockchain_tx)
+            .outerjoin(models.AnchorBatch, models.AnchorLeaf.batch_id == models.AnchorBatch.id)
+            .filter(models.AnchorLeaf.entity_type == entity_type, models.AnchorLeaf.entity_id == entity_id)
+            .order_by(models.AnchorLeaf.id)
+            .all()
+        )
+        items = []
+        for leaf, tx_id in rows:
+            event = decode_payload(leaf.payload.hex())
+            items.append({
+                'data': self.blockchain.codec.encode(event['data']),
+                'txid': tx_id or 'pending-anchor',
+                'time': leaf.created_at.replace(tzinfo=timezone.utc).timestamp()
+            })
+        return items
+
+    def proofs_for(self, db: Session, entity_type: str, entity_id: int) -> List[Dict]:
+        """Inclusion proof of every recorded event for a product or order."""
+        leaves = (
+            db.query(models.AnchorLeaf)
+            .filter(models.AnchorLeaf.entity_type == entity_type, models.AnchorLeaf.entity_id == entity_id)
+            .order_by(models.AnchorLeaf.id)
+            .all()
+        )
+        levels_by_batch: Dict[int, List[List[bytes]]] = {}
+        proofs = []
+        for leaf in leaves:
+            event = decode_payload(leaf.payload.hex())
+            entry = {
+                'leaf_id': leaf.id,
+                'stream': leaf.stream,
+                'key': leaf.key,
+                'action': event['data'].get('action') if isinstance(event.get('data'), dict) else None,
+                'payload': leaf.payload.hex(),
+                'leaf_hash': leaf.leaf_hash,
+                'batch_id': leaf.batch_id,
+                'leaf_index': leaf.leaf_index,
+                'root': None,
+                'blockchain_tx': None,
+                'anchored_at': None,
+                'proof': [],
+                'verified': False
+            }
+            if leaf.batch_id is not None:
+                batch = leaf.batch
+                if leaf.batch_id not in levels_by_batch:
+                    hashes = [
+                        bytes.fromhex(h) for (h,) in
+                        db.query(models.AnchorLeaf.leaf_hash)
+                        .filter(models.AnchorLeaf.batch_id == leaf.batch_id)
+                        .order_by(models.AnchorLeaf.leaf_index)
+                    ]
+                    levels_by_batch[leaf.batch_id] = build_levels(hashes)
+                proof = inclusion_proof(levels_by_batch[leaf.batch_id], leaf.leaf_index)
+                entry.update({
+                    'root': batch.root,
+                    'blockchain_tx': batch.blockchain_tx,
+                    'anchored_at': batch.anchored_at,
+                    'proof': [{'position': position, 'hash': h.hex()} for position, h in proof],
+                    # Recomputed from the payload, not the stored hash
+                    'verified': verify_proof(hash_leaf(leaf.payload), proof, bytes.fromhex(batch.root))
+                })
+            proofs.append(entry)
+        return proofs
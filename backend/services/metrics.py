@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Buckets tuned for a mix of sub-millisecond ML stages and multi-second RPCs
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request handling time',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Database statement execution time',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+ML_STAGE_LATENCY = Histogram(
+    'ml_stage_duration_seconds', 'Time per fraud detection pipeline stage',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+RPC_LATENCY = Histogram(
+    'multichain_rpc_duration_seconds', 'MultiChain JSON-RPC call time',
+    ['method', 'outcome'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests being handled')
+CIRCUIT_STATE = Gauge(
+    'circuit_breaker_state', 'Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)',
+    ['dependency']
+)
+CHAIN_OUTBOX_PENDING = Gauge('chain_outbox_pending', 'Stream writes queued while MultiChain is unreachable')
+FRAUD_RULE_HITS = Counter(
+    'fraud_rule_hits_total', 'Products decided by a fraud pre-filter rule',
+    ['rule', 'decision']
+)
+FRAUD_PREFILTER_ROWS = Counter(
+    'fraud_prefilter_rows_total', 'Products decided by the rule pre-filter vs sent to the model',
+    ['outcome']
+)
+
+
+@contextmanager
+def span(histogram: Histogram, **labels):
+    """Time the enclosed block into `histogram`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def render_metrics():
+    """Prometheus text exposition for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template."""
+
+    # Requests currently being handled; background jobs back off while it is high.
+    # Long-lived event streams are not counted.
+    in_flight = 0
+    untracked_paths = ('/events',)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        tracked = not scope['path'].startswith(self.untracked_paths)
+        if tracked:
+            MetricsMiddleware.in_flight += 1
+            REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if tracked:
+                MetricsMiddleware.in_flight -= 1
+                REQUESTS_IN_FLIGHT.dec()
+            # Label by template (/orders/{order_id}), not the raw path, to
+            # keep cardinality bounded; unmatched paths share one label
+            route = scope.get('route')
+            REQUEST_LATENCY.labels(
+                method=scope['method'],
+                route=getattr(route, 'path', 'unmatched'),
+                status=str(status_code)
+            ).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine):
+    """Record every statement's execution time, labelled by SQL verb."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else 'UNKNOWN'
+        DB_QUERY_LATENCY.labels(operation=operation).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
@@ -0,0 +1,243 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import MaxAbsScaler, OneHotEncoder
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+import models
+from services.category_stats import CategoryPriceStats
+
+
+class OnlineLearningService:
+    """
+    Incrementally trains a counterfeit classifier from products labelled in the DB.
+
+    Text features use stateless HashingVectorizers and the classifier is an
+    SGDClassifier updated with partial_fit, so each run only touches the rows
+    labelled since the last checkpoint. The published bundle has the same keys
+    as the batch artifact and can be served by FraudDetectionService.
+    """
+
+    CLASSES = np.array([0, 1])
+
+    def __init__(self, categories: List[str], median_price_map: Dict[str, float]):
+        base_dir = os.path.dirname(__file__)
+        models_dir = os.path.abspath(os.path.join(base_dir, '..', 'ml_models'))
+        self.artifact_path = os.path.join(
+            models_dir, os.getenv('ONLINE_MODEL_ARTIFACT', 'skincare_counterfeit_online.pkl')
+        )
+        self.seed_path = os.getenv(
+            'ONLINE_SEED_DATASET',
+            os.path.abspath(os.path.join(base_dir, '..', '..', 'dataset', 'skincare_combined_noisy.csv'))
+        )
+        self.batch_size = int(os.getenv('ONLINE_BATCH_SIZE', '256'))
+        self.interval = float(os.getenv('ONLINE_PUBLISH_INTERVAL_SECONDS', '900'))
+        self.seed_epochs = int(os.getenv('ONLINE_SEED_EPOCHS', '5'))
+
+        self.categories = sorted(categories)
+        self.median_price_map = dict(median_price_map)
+        self.price_stats = CategoryPriceStats.from_artifacts({'median_price_map': self.median_price_map})
+
+        # Checkpoint: (labelled_at, product id) of the last consumed row
+        self.checkpoint_at: Optional[datetime] = None
+        self.checkpoint_id = 0
+        self.samples_seen = 0
+
+        self.ohe = None
+        self.tf_name = None
+        self.tf_ing = None
+        self.scaler = None
+        self.clf = None
+        self.ready = False
+
+    def prepare(self):
+        """
+        Resume the published model, or build one and warm-start it from the
+        training CSV. Slow on first start, so it runs in run_forever's worker
+        thread rather than at construction.
+        """
+        if os.path.isfile(self.artifact_path):
+            self._load()
+        else:
+            self._init_model()
+            self._seed_from_dataset()
+        self.ready = True
+
+    def _init_model(self):
+        self.ohe = OneHotEncoder(
+            categories=[self.categories], sparse_output=False, handle_unknown='ignore'
+        ).fit(pd.DataFrame({'category': self.categories}))
+        self.tf_name = HashingVectorizer(
+            n_features=2 ** 10, alternate_sign=False, stop_words='english'
+        )
+        self.tf_ing = HashingVectorizer(
+            n_features=2 ** 12, alternate_sign=False, stop_words='english'
+        )
+        self.scaler = MaxAbsScaler()
+        self.clf = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+
+    def _load(self):
+        artifacts = joblib.load(self.artifact_path)
+        self.ohe = artifacts['ohe']
+        self.tf_name = artifacts['tf_name']
+        self.tf_ing = artifacts['tf_ing']
+        self.scaler = artifacts['scaler']
+        self.clf = artifacts['clf']
+        self.median_price_map = artifacts['median_price_map']
+        self.price_stats = CategoryPriceStats.from_artifacts(artifacts)
+
+        metadata = artifacts.get('metadata') or {}
+        checkpoint_at = metadata.get('checkpoint_at')
+        self.checkpoint_at = datetime.fromisoformat(checkpoint_at) if checkpoint_at else None
+        self.checkpoint_id = metadata.get('checkpoint_id', 0)
+        self.samples_seen = metadata.get('samples_seen', 0)
+        logger.info(
+            "Resumed online model {} ({} samples seen)",
+            metadata.get('version', 'unversioned'), self.samples_seen
+        )
+
+    def _seed_from_dataset(self):
+        """Warm-start from the training CSV with a few shuffled mini-batch passes."""
+        if not os.path.isfile(self.seed_path):
+            logger.warning(f"Seed dataset not found at {self.seed_path}; online model starts empty")
+            return
+
+        df = pd.read_csv(self.seed_path)
+        df = df.dropna(subset=['product_name', 'ingredients', 'price', 'category', 'label'])
+        rng = np.random.default_rng(42)
+        for _ in range(self.seed_epochs):
+            # The CSV is grouped by label; SGD needs the classes interleaved
+            shuffled = df.iloc[rng.permutation(len(df))]
+            for start in range(0, len(shuffled), self.batch_size):
+                chunk = shuffled.iloc[start:start + self.batch_size]
+                self.partial_fit(chunk.to_dict('records'), chunk['label'].astype(int).values)
+        logger.info(f"Seeded online model with {len(df)} rows x {self.seed_epochs} epochs from {self.seed_path}")
+
+    def _featurize(self, rows: List[Dict]) -> np.ndarray:
+        """Same column layout as FraudDetectionService: counts, price ratio, category, name, ingredients."""
+        names = [str(r['product_name']).strip() for r in rows]
+        ings = [str(r['ingredients']).strip() for r in rows]
+        cats = [str(r['category']).strip() for r in rows]
+        prices = np.array([float(r['price'] or 0) for r in rows])
+
+        price_ratio = self.price_stats.price_ratio(cats, prices)
+        num_ings = np.array([len(i.split(',')) for i in ings], dtype=float)
+
+        cat_feat = self.ohe.transform(pd.DataFrame({self.ohe.feature_names_in_[0]: cats}))
+        name_feat = self.tf_name.transform(names).toarray()
+        ing_feat = self.tf_ing.transform(ings).toarray()
+        return np.hstack([np.column_stack([num_ings, price_ratio]), cat_feat, name_feat, ing_feat])
+
+    def partial_fit(self, rows: List[Dict], labels: np.ndarray):
+        X = self._featurize(rows)
+        self.scaler.partial_fit(X)
+        self.clf.partial_fit(self.scaler.transform(X), labels, classes=self.CLASSES)
+        self.samples_seen += len(rows)
+
+    def consume_labelled(self, db: Session) -> int:
+        """Train on products labelled since the checkpoint, one keyset page at a time."""
+        consumed = 0
+        while True:
+            query = db.query(models.Product).filter(
+                models.Product.label.isnot(None),
+                models.Product.labelled_at.isnot(None)
+            )
+            if self.checkpoint_at is not None:
+                query = query.filter(or_(
+                    models.Product.labelled_at > self.checkpoint_at,
+                    and_(
+                        models.Product.labelled_at == self.checkpoint_at,
+                        models.Product.id > self.checkpoint_id
+                    )
+                ))
+            batch = (
+                query.order_by(models.Product.labelled_at, models.Product.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            rows, labels = [], []
+            for product in batch:
+                if product.label not in ('0', '1') or not product.ingredients:
+                    continue
+                rows.append({
+                    'product_name': product.product_name,
+                    'ingredients': product.ingredients,
+                    'price': product.price,
+                    'category': product.category,
+                })
+                labels.append(int(product.label))
+            if rows:
+                self.partial_fit(rows, np.array(labels))
+                consumed += len(rows)
+
+            self.checkpoint_at = batch[-1].labelled_at
+            self.checkpoint_id = batch[-1].id
+
+        return consumed
+
+    def publish(self) -> str:
+        """Atomically write the current model as an artifact bundle."""
+        now = datetime.now(timezone.utc)
+        artifacts = {
+            'ohe': self.ohe,
+            'tf_name': self.tf_name,
+            'tf_ing': self.tf_ing,
+            'scaler': self.scaler,
+            'clf': self.clf,
+            'median_price_map': self.median_price_map,
+            'metadata': {
+                'version': now.strftime('%Y%m%d%H%M%S'),
+                'kind': 'online',
+                'trained_at': now.isoformat(),
+                'samples_seen': self.samples_seen,
+                'checkpoint_at': self.checkpoint_at.isoformat() if self.checkpoint_at else None,
+                'checkpoint_id': self.checkpoint_id,
+                'threshold': 0.5,
+            },
+        }
+        tmp_path = f"{self.artifact_path}.tmp"
+        joblib.dump(artifacts, tmp_path)
+        os.replace(tmp_path, self.artifact_path)
+        logger.info(f"Published online model to {self.artifact_path} ({self.samples_seen} samples seen)")
+        return self.artifact_path
+
+    def run_once(self, db: Session) -> int:
+        consumed = self.consume_labelled(db)
+        if consumed or not os.path.isfile(self.artifact_path):
+            self.publish()
+        return consumed
+
+    async def run_forever(self, session_factory, on_publish=None):
+        """
+        Consume new labels and publish on a fixed schedule until cancelled.
+        Model preparation, training and `on_publish` (which reloads the
+        served artifact) all run in worker threads, off the event loop.
+        """
+        while True:
+            try:
+                if not self.ready:
+                    await asyncio.to_thread(self.prepare)
+                db = session_factory()
+                try:
+                    consumed = await asyncio.to_thread(self.run_once, db)
+                finally:
+                    db.close()
+                if consumed:
+                    logger.info(f"Online model updated with {consumed} newly labelled products")
+                    if on_publish:
+                        await asyncio.to_thread(on_publish, self.artifact_path)
+            except Exception as e:
+                logger.error(f"Online model update failed: {str(e)}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,62 @@
+import json
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+import onnxruntime as ort
+from loguru import logger
+
+# Graph inputs written by model/export_onnx.py
+STRING_INPUTS = ('category', 'product_name', 'ingredients')
+NUMERIC_INPUTS = ('num_ingredients', 'price_ratio')
+
+
+def sidecar_path(model_path: str) -> str:
+    """Price statistics and metadata exported next to the graph."""
+    return os.path.splitext(model_path)[0] + '.json'
+
+
+class OnnxScorer:
+    """
+    The exported preprocessing + classifier graph on onnxruntime's CPU
+    provider. One InferenceSession is shared by all requests; run() is
+    thread-safe, and intra-op threads parallelize within a call (1 keeps
+    latency predictable when uvicorn already runs calls concurrently).
+    """
+
+    def __init__(self, model_path: str, intra_op_threads: int = 1, inter_op_threads: int = 1):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        inputs = {i.name for i in self.session.get_inputs()}
+        missing = set(STRING_INPUTS + NUMERIC_INPUTS) - inputs
+        if missing:
+            raise ValueError(f"ONNX model is missing inputs: {sorted(missing)}")
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.proba_output = 'probabilities' if 'probabilities' in outputs else outputs[-1]
+        self.label_output = 'label' if 'label' in outputs else outputs[0]
+
+        with open(sidecar_path(model_path)) as f:
+            self.sidecar: Dict = json.load(f)
+        self.classes_ = np.asarray(self.sidecar.get('classes', [0, 1]))
+        logger.info(f"ONNX scorer loaded from {model_path} ({intra_op_threads} intra-op threads)")
+
+    def predict_proba(self, categories: Sequence[str], names: Sequence[str], ingredients: Sequence[str],
+                      num_ingredients: Sequence[float], price_ratio: Sequence[float]) -> np.ndarray:
+        feeds = {
+            'category': np.asarray(categories, dtype=object).reshape(-1, 1),
+            'product_name': np.asarray(names, dtype=object).reshape(-1, 1),
+            'ingredients': np.asarray(ingredients, dtype=object).reshape(-1, 1),
+            'num_ingredients': np.asarray(num_ingredients, dtype=np.float32).reshape(-1, 1),
+            'price_ratio': np.asarray(price_ratio, dtype=np.float32).reshape(-1, 1),
+        }
+        proba, = self.session.run([self.proba_output], feeds)
+        return np.asarray(proba, dtype=np.float64)
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self.sidecar.get('categories', []))
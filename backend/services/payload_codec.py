@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+# Optional encoders; the matching codecs are unavailable without them
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Leading byte of legacy items: hex-encoded JSON objects/arrays start with '{' or '['
+LEGACY_JSON_PREFIXES = (ord('{'), ord('['))
+
+
+class PayloadCodec:
+    """
+    Serializes stream items as <version byte><body>, hex-encoded for the RPC.
+
+    The version byte identifies the serializer and compression so items
+    written with different codecs can live in the same stream; items without
+    one (plain hex JSON) are recognised by their first character.
+    """
+
+    def __init__(self, name: str, version: int, dumps: Callable[[Any], bytes],
+                 loads: Callable[[bytes], Any], compress: bool = False):
+        self.name = name
+        self.version = version
+        self._dumps = dumps
+        self._loads = loads
+        self.compress = compress
+
+    def encode_bytes(self, obj: Any) -> bytes:
+        body = self._dumps(obj)
+        if self.compress:
+            body = _zstd_compressor().compress(body)
+        return bytes([self.version]) + body
+
+    def decode_bytes(self, raw: bytes) -> Any:
+        body = raw[1:]
+        if self.compress:
+            body = _zstd_decompressor().decompress(body)
+        return self._loads(body)
+
+    def encode(self, obj: Any) -> str:
+        return self.encode_bytes(obj).hex()
+
+
+# zstd contexts are reusable but not thread-safe; keep one per thread
+_zstd_local = threading.local()
+
+
+def _zstd_compressor():
+    compressor = getattr(_zstd_local, 'compressor', None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(
+            level=int(os.getenv('PAYLOAD_ZSTD_LEVEL', '3'))
+        )
+    return compressor
+
+
+def _zstd_decompressor():
+    decompressor = getattr(_zstd_local, 'decompressor', None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+class LegacyJsonCodec(PayloadCodec):
+    """The original format: hex(json.dumps(obj)), no version byte."""
+
+    def __init__(self):
+        super().__init__('json', 0, lambda obj: json.dumps(obj).encode('utf-8'), json.loads)
+
+    def encode_bytes(self, obj: Any) -> bytes:
+        return self._dumps(obj)
+
+    def decode_bytes(self, raw: bytes) -> Any:
+        return self._loads(raw.decode('utf-8'))
+
+
+def _build_codecs() -> Dict[str, PayloadCodec]:
+    codecs = {'json': LegacyJsonCodec()}
+    codecs['json+zstd'] = PayloadCodec('json+zstd', 0x01, _json_dumps, json.loads, compress=True)
+    if msgpack is not None:
+        codecs['msgpack'] = PayloadCodec('msgpack', 0x02, msgpack.packb, msgpack.unpackb)
+        codecs['msgpack+zstd'] = PayloadCodec('msgpack+zstd', 0x03, msgpack.packb, msgpack.unpackb, compress=True)
+    if cbor2 is not None:
+        codecs['cbor'] = PayloadCodec('cbor', 0x04, cbor2.dumps, cbor2.loads)
+        codecs['cbor+zstd'] = PayloadCodec('cbor+zstd', 0x05, cbor2.dumps, cbor2.loads, compress=True)
+    if zstandard is None:
+        codecs = {name: c for name, c in codecs.items() if not c.compress}
+    return codecs
+
+
+CODECS = _build_codecs()
+CODECS_BY_VERSION = {c.version: c for c in CODECS.values() if c.version}
+
+# Version bytes are permanent: items on chain carry them forever
+KNOWN_VERSIONS = {0x01: 'json+zstd', 0x02: 'msgpack', 0x03: 'msgpack+zstd', 0x04: 'cbor', 0x05: 'cbor+zstd'}
+
+
+def get_codec(name: Optional[str] = None) -> PayloadCodec:
+    """Codec for new writes, from PAYLOAD_CODEC; falls back to legacy JSON if unavailable."""
+    name = (name or os.getenv('PAYLOAD_CODEC', 'json')).lower()
+    codec = CODECS.get(name)
+    if codec is None:
+        logger.warning(f"Payload codec '{name}' unavailable (missing dependency?); using legacy JSON")
+        codec = CODECS['json']
+    return codec
+
+
+def decode_payload(data_hex: str) -> Any:
+    """Decode a stream item written by any codec, including legacy hex JSON."""
+    raw = bytes.fromhex(data_hex)
+    if not raw:
+        raise ValueError("Empty payload")
+    if raw[0] in LEGACY_JSON_PREFIXES:
+        return CODECS['json'].decode_bytes(raw)
+    codec = CODECS_BY_VERSION.get(raw[0])
+    if codec is None:
+        name = KNOWN_VERSIONS.get(raw[0])
+        if name:
+            raise ValueError(f"Payload written with '{name}' but its dependency is not installed")
+        raise ValueError(f"Unknown payload version byte 0x{raw[0]:02x}")
+    return codec.decode_bytes(raw)
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import models
+
+# Sections fed by event streams rather than rebuilt from the product row
+EVENT_SECTIONS = ('shipments', 'anomalies')
+# Bumped when the base sections change shape; older snapshots are rebuilt on read
+SNAPSHOT_FORMAT = 2
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class ProvenanceService:
+    """
+    Materialized per-product provenance documents for consumer verification.
+
+    Each product has one ProductProvenance row holding the JSON served by
+    GET /products/{id}/provenance: registration, flag status, shipments and
+    anomalies. Writers update the affected section and bump `version`, which
+    doubles as the ETag, so reads never touch the chain. Serialized bodies are
+    kept in a small in-process LRU so repeated QR scans skip the DB as well;
+    the TTL bounds staleness when several workers serve the API.
+    """
+
+    def __init__(self):
+        self.cache_size = int(os.getenv('PROVENANCE_CACHE_SIZE', '10000'))
+        self.cache_ttl = float(os.getenv('PROVENANCE_CACHE_TTL_SECONDS', '30'))
+        # Shipments and anomalies beyond this are counted but not embedded
+        self.max_events = int(os.getenv('PROVENANCE_MAX_EVENTS', '50'))
+        self._cache: "OrderedDict[int, Tuple[str, bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(product_id: int, version: int) -> str:
+        return f'"{product_id}-{version}"'
+
+    # Cache
+
+    def cached(self, product_id: int) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._cache.get(product_id)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._cache[product_id]
+                return None
+            self._cache.move_to_end(product_id)
+            return entry[0], entry[1]
+
+    def _store(self, product_id: int, etag: str, body: bytes):
+        with self._lock:
+            self._cache[product_id] = (etag, body, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(product_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, product_id: int):
+        with self._lock:
+            self._cache.pop(product_id, None)
+
+    # Snapshot maintenance
+
+    def _base_sections(self, db: Session, product: models.Product) -> Dict:
+        """
+        Registration and flag sections. The endpoint is public, so flags are
+        reduced to the verdict: confidence, review labels and flag reasons
+        (rule names, clone matches) stay on the authenticated endpoints.
+        """
+        supplier = db.query(models.User).filter(models.User.id == product.supplier_id).first()
+        if product.is_flagged:
+            verdict = 'flagged'
+        elif product.blockchain_tx:
+            verdict = 'verified'
+        else:
+            verdict = 'pending'
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'verdict': verdict,
+            'registration': {
+                'product_name': product.product_name,
+                'category': product.category,
+                'price': product.price,
+                'ingredients': product.ingredients,
+                'supplier': {'id': supplier.id, 'username': supplier.username} if supplier else None,
+                'registered_at': _iso(product.created_at),
+                'blockchain_tx': product.blockchain_tx
+            },
+            'flag_status': {
+                'is_flagged': bool(product.is_flagged)
+            }
+        }
+
+    def _load_for_update(self, db: Session, product_id: int) -> Optional[models.ProductProvenance]:
+        return (
+            db.query(models.ProductProvenance)
+            .filter(models.ProductProvenance.product_id == product_id)
+            .with_for_update()
+            .first()
+        )
+
+    def _write(self, row: models.ProductProvenance, document: Dict):
+        row.version = (row.version or 0) + 1
+        row.updated_at = datetime.now(timezone.utc)
+        document['version'] = row.version
+        document['updated_at'] = row.updated_at.isoformat()
+        row.snapshot = json.dumps(document, separators=(',', ':'))
+
+    def _new_document(self, product_id: int) -> Dict:
+        document = {'product_id': product_id}
+        for section in EVENT_SECTIONS:
+            document[section] = {'count': 0, 'items': []}
+        return document
+
+    def refresh(self, db: Session, product_id: int) -> Optional[models.ProductProvenance]:
+        """
+        Rebuild registration and flag sections from the product row, keeping
+        accumulated shipments and anomalies. Called on registration, review
+        and anchoring; commits.
+        """
+        product = db.query(models.Product).filter(models.Product.id == product_id).first()
+        if product is None:
+            return None
+
+        row = self._load_for_update(db, product_id)
+        if row is None:
+            row = models.ProductProvenance(product_id=product_id, version=0)
+            db.add(row)
+            document = self._new_document(product_id)
+        else:
+            document = json.loads(row.snapshot)
+
+        document.update(self._base_sections(db, product))
+        self._write(row, document)
+        db.commit()
+        self.invalidate(product_id)
+        return row
+
+    def refresh_many(self, db: Session, product_ids: Iterable[int]):
+        for product_id in product_ids:
+            self.refresh(db, product_id)
+
+    def append_events(self, db: Session, section: str, events_by_product: Dict[int, List[Dict]]) -> int:
+        """
+        Append events to the shipments/anomalies section of several products,
+        keeping the newest `max_events` each. Snapshots are locked and loaded
+        with one query; missing ones are built in the same transaction. The
+        caller commits. Returns the number of snapshots updated.
+        """
+        if section not in EVENT_SECTIONS:
+            raise ValueError(f"Unknown provenance section: {section}")
+        events_by_product = {pid: events for pid, events in events_by_product.items() if events}
+        if not events_by_product:
+            return 0
+
+        rows = {
+            row.product_id: row for row in
+            db.query(models.ProductProvenance)
+            .filter(models.ProductProvenance.product_id.in_(events_by_product))
+            .with_for_update()
+        }
+        documents = {product_id: json.loads(row.snapshot) for product_id, row in rows.items()}
+
+        missing = events_by_product.keys() - rows.keys()
+        if missing:
+            # First event for products without a snapshot: build the base now
+            for product in db.query(models.Product).filter(models.Product.id.in_(missing)):
+                rows[product.id] = models.ProductProvenance(product_id=product.id, version=0)
+                db.add(rows[product.id])
+                documents[product.id] = self._new_document(product.id)
+                documents[product.id].update(self._base_sections(db, product))
+
+        for product_id, document in documents.items():
+            entry = document.setdefault(section, {'count': 0, 'items': []})
+            events = events_by_product[product_id]
+            entry['count'] += len(events)
+            entry['items'] = (entry['items'] + events)[-self.max_events:]
+            self._write(rows[product_id], document)
+            self.invalidate(product_id)
+        return len(documents)
+
+    def delete(self, db: Session, product_id: int):
+        """Drop the snapshot ahead of the product itself; the caller commits."""
+        db.query(models.ProductProvenance).filter(
+            models.ProductProvenance.product_id == product_id
+        ).delete(synchronize_session=False)
+        self.invalidate(product_id)
+
+    # Reads
+
+    def get(self, db: Session, product_id: int) -> Optional[Tuple[str, bytes]]:
+        """(etag, JSON body) for a product, from cache, the snapshot table, or a first build."""
+        hit = self.cached(product_id)
+        if hit is not None:
+            return hit
+
+        row = (
+            db.query(models.ProductProvenance.version, models.ProductProvenance.snapshot)
+            .filter(models.ProductProvenance.product_id == product_id)
+            .first()
+        )
+        if row is None or json.loads(row.snapshot).get('format') != SNAPSHOT_FORMAT:
+            # Products registered before snapshots existed, or snapshots written
+            # by an older release, are built on first read
+            built = self.refresh(db, product_id)
+            if built is None:
+                return None
+            logger.info(f"Built provenance snapshot for product {product_id}")
+            row = built
+
+        etag, body = self.etag(product_id, row.version), row.snapshot.encode('utf-8')
+        self._store(product_id, etag, body)
+        return etag, body
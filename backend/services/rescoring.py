@@ -0,0 +1,345 @@
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import and_, delete, insert, not_, or_, update
+from sqlalchemy.orm import Session
+
+import models
+from services.metrics import MetricsMiddleware
+
+# Flags raised by other detectors; a re-score neither clears them nor
+# unflags products that carry an unreviewed route anomaly
+ROUTE_FLAG_PREFIX = 'Route anomaly'
+CLONE_FLAG_PREFIX = 'Possible clone'
+
+ACTIVE_STATUSES = ('queued', 'running')
+PHASES = ('recent', 'catalog')
+
+
+class RescoringService:
+    """
+    Persistent queue of catalog re-scoring jobs, run after model changes.
+
+    A job walks the catalog in keyset-paginated chunks of product ids:
+    products registered or scanned in a shipment within the last
+    RESCORE_RECENT_DAYS first, then the rest. Chunks are scored by a small pool of worker threads, each with its
+    own session, and written back as bulk product updates plus FlaggedProduct
+    inserts/deletes for verdicts that changed. The checkpoint only advances
+    over chunks that finished in order, so a restarted process resumes where
+    the last one stopped. Between chunks the runner throttles itself to a row
+    rate and backs off while the API has many requests in flight.
+    """
+
+    def __init__(self, fraud_detector, session_factory, provenance=None, flag_summary=None):
+        self.fraud_detector = fraud_detector
+        self.session_factory = session_factory
+        self.provenance = provenance
+        self.flag_summary = flag_summary
+        self.chunk_size = int(os.getenv('RESCORE_CHUNK_SIZE', '500'))
+        self.workers = max(1, int(os.getenv('RESCORE_WORKERS', '2')))
+        self.recent_days = int(os.getenv('RESCORE_RECENT_DAYS', '30'))
+        self.max_rows_per_second = float(os.getenv('RESCORE_MAX_ROWS_PER_SECOND', '2000'))
+        self.busy_requests = int(os.getenv('RESCORE_BUSY_REQUESTS', '8'))
+        self.stale_after = timedelta(seconds=int(os.getenv('RESCORE_STALE_SECONDS', '300')))
+        self.poll_interval = float(os.getenv('RESCORE_POLL_SECONDS', '30'))
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def model_version(self) -> str:
+        fd = self.fraud_detector
+        # Unversioned bundles are keyed on their content, so a restart or redeploy of the same file is a no-op
+        return str(fd.metadata.get('version') or f"{os.path.basename(fd.model_path)}@{fd.model_digest[:16]}")
+
+    # Queue
+
+    def enqueue(self, db: Session, requested_by: Optional[int] = None) -> models.RescoreJob:
+        """Queue a job for the served model; older unfinished jobs are superseded."""
+        version = self.model_version
+        db.query(models.RescoreJob).filter(
+            models.RescoreJob.status.in_(ACTIVE_STATUSES),
+            models.RescoreJob.model_version != version
+        ).update({'status': 'superseded', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+        job = (
+            db.query(models.RescoreJob)
+            .filter(models.RescoreJob.status.in_(ACTIVE_STATUSES), models.RescoreJob.model_version == version)
+            .first()
+        )
+        if job is None:
+            job = models.RescoreJob(
+                model_version=version,
+                status='queued',
+                phase=PHASES[0],
+                checkpoint_id=0,
+                recent_since=datetime.utcnow() - timedelta(days=self.recent_days),
+                requested_by=requested_by
+            )
+            db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wake()
+        return job
+
+    def _wake(self):
+        # enqueue() is also called from worker threads (model reloads); Event is loop-bound
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self._wakeup.set()
+
+    def enqueue_if_model_changed(self, db: Session) -> Optional[models.RescoreJob]:
+        """Queue a job unless the latest one already targets the served model."""
+        latest = db.query(models.RescoreJob).order_by(models.RescoreJob.id.desc()).first()
+        if latest is not None and latest.model_version == self.model_version:
+            return None
+        if latest is None and db.query(models.Product.id).first() is None:
+            return None
+        job = self.enqueue(db)
+        logger.info(f"Queued re-scoring job {job.id} for model {job.model_version}")
+        return job
+
+    def cancel(self, db: Session, job: models.RescoreJob) -> models.RescoreJob:
+        if job.status in ACTIVE_STATUSES:
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        return job
+
+    def _claim(self, db: Session) -> Optional[models.RescoreJob]:
+        """Take the oldest queued job, or a running one whose runner stopped heartbeating."""
+        now = datetime.utcnow()
+        claimable = or_(
+            models.RescoreJob.status == 'queued',
+            and_(models.RescoreJob.status == 'running', or_(
+                models.RescoreJob.heartbeat_at.is_(None),
+                models.RescoreJob.heartbeat_at < now - self.stale_after
+            ))
+        )
+        candidate = db.query(models.RescoreJob.id).filter(claimable).order_by(models.RescoreJob.id).first()
+        if candidate is None:
+            return None
+        # Conditional update, so only one process wins the job
+        claimed = db.execute(
+            update(models.RescoreJob)
+            .where(models.RescoreJob.id == candidate.id, claimable)
+            .values(status='running', heartbeat_at=now)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        job = db.get(models.RescoreJob, candidate.id)
+        if job.started_at is None:
+            job.started_at = now
+            db.commit()
+        return job
+
+    # Runner
+
+    async def run_forever(self):
+        self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while await self.run_next():
+                    pass
+            except Exception as e:
+                logger.error(f"Re-scoring runner failed: {str(e)}")
+
+    async def run_next(self) -> bool:
+        """Run one claimable job to an end state; False if there was none."""
+        db = self.session_factory()
+        try:
+            job = self._claim(db)
+            if job is None:
+                return False
+            logger.info(f"Re-scoring job {job.id} ({job.model_version}) from {job.phase} #{job.checkpoint_id}")
+            try:
+                await self._run(db, job)
+            except Exception as e:
+                db.rollback()
+                logger.opt(exception=True).error(f"Re-scoring job {job.id} failed: {e}")
+                job.status = 'failed'
+                job.error = str(e)[:500]
+                job.finished_at = datetime.utcnow()
+                db.commit()
+            return True
+        finally:
+            db.close()
+
+    def _next_ids(self, db: Session, job: models.RescoreJob, phase: str, after_id: int) -> List[int]:
+        # Orders carry no product link, so "recent" means registered or scanned in the window
+        scanned = (
+            db.query(models.ShipmentEvent.id)
+            .filter(models.ShipmentEvent.product_id == models.Product.id,
+                    models.ShipmentEvent.recorded_at >= job.recent_since)
+            .exists()
+        )
+        recent = or_(models.Product.created_at >= job.recent_since, scanned)
+        query = (
+            db.query(models.Product.id)
+            .filter(models.Product.id > after_id, recent if phase == 'recent' else not_(recent))
+            .order_by(models.Product.id)
+        )
+        return [row[0] for row in query.limit(self.chunk_size)]
+
+    async def _run(self, db: Session, job: models.RescoreJob):
+        phase, after_id = job.phase, job.checkpoint_id
+        inflight: deque = deque()  # (phase, last id, task), in submission order
+        started, submitted = time.monotonic(), 0
+
+        while True:
+            # Keep every worker busy; ids for the next chunk are a cheap index scan
+            while phase is not None and len(inflight) < self.workers:
+                ids = self._next_ids(db, job, phase, after_id)
+                if not ids:
+                    phase = PHASES[PHASES.index(phase) + 1] if phase != PHASES[-1] else None
+                    after_id = 0
+                    continue
+                after_id = ids[-1]
+                await self._throttle(started, submitted)
+                submitted += len(ids)
+                inflight.append((phase, after_id, asyncio.create_task(
+                    asyncio.to_thread(self.rescore_chunk, job.model_version, ids)
+                )))
+            if not inflight:
+                break
+
+            # Oldest chunk first, so the checkpoint never skips unfinished work
+            chunk_phase, last_id, task = inflight.popleft()
+            counts = await task
+            db.refresh(job)
+            if job.status != 'running':
+                logger.info(f"Re-scoring job {job.id} stopped: {job.status}")
+                for _, _, pending in inflight:
+                    await pending
+                return
+            job.phase, job.checkpoint_id = chunk_phase, last_id
+            job.products_scored += counts['scored']
+            job.products_changed += counts['changed']
+            job.flags_added += counts['flags_added']
+            job.flags_cleared += counts['flags_cleared']
+            job.heartbeat_at = datetime.utcnow()
+            db.commit()
+
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Re-scoring job {job.id} completed: {job.products_scored} scored, "
+                    f"{job.products_changed} changed, +{job.flags_added}/-{job.flags_cleared} flags")
+
+    async def _throttle(self, started: float, submitted: int):
+        while MetricsMiddleware.in_flight >= self.busy_requests:
+            await asyncio.sleep(0.2)
+        if self.max_rows_per_second > 0:
+            ahead = submitted / self.max_rows_per_second - (time.monotonic() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+    # Chunk work, on a worker thread
+
+    def rescore_chunk(self, model_version: str, product_ids: List[int]) -> Dict[str, int]:
+        """Score one chunk with the served model and write back what changed; commits."""
+        db = self.session_factory()
+        try:
+            P = models.Product
+            rows = (
+                db.query(P.id, P.supplier_id, P.product_name, P.ingredients, P.price, P.category,
+                         P.is_flagged, P.fraud_confidence)
+                .filter(P.id.in_(product_ids), P.labelled_at.is_(None))  # reviewer verdicts stand
+                .order_by(P.id)
+                .all()
+            )
+            products = [
+                {
+                    'product_name': r.product_name or '',
+                    'ingredients': r.ingredients or '',
+                    'price': r.price or 0.0,
+                    'category': r.category or ''
+                }
+                for r in rows
+            ]
+            results = self._score(products)
+
+            route_flagged = {
+                product_id for (product_id,) in
+                db.query(models.FlaggedProduct.product_id).filter(
+                    models.FlaggedProduct.product_id.in_(product_ids),
+                    models.FlaggedProduct.reviewed_at.is_(None),
+                    models.FlaggedProduct.reason.like(f'{ROUTE_FLAG_PREFIX}%')
+                )
+            }
+            changes, new_flags, cleared = [], [], []
+            for row, result in zip(rows, results):
+                if result is None:
+                    continue
+                flagged = bool(result['is_counterfeit']) or row.id in route_flagged
+                confidence = float(result['confidence'])
+                if flagged == bool(row.is_flagged) and row.fraud_confidence is not None \
+                        and abs(confidence - row.fraud_confidence) < 1e-9:
+                    continue
+                changes.append({'id': row.id, 'is_flagged': flagged, 'fraud_confidence': confidence})
+                if flagged and not row.is_flagged:
+                    reason = f"Re-scored by model {model_version}: {self.fraud_detector.describe(result)}"
+                    new_flags.append({'product_id': row.id, 'supplier_id': row.supplier_id,
+                                      'reason': reason, 'created_at': datetime.utcnow()})
+                elif row.is_flagged and not flagged:
+                    cleared.append(row.id)
+
+            if changes:
+                db.execute(update(models.Product), changes)
+            if new_flags:
+                db.execute(insert(models.FlaggedProduct), new_flags)
+            flags_cleared = 0
+            if cleared:
+                # Unreviewed model flags only; route and clone flags stay for review
+                flags_cleared = db.execute(
+                    delete(models.FlaggedProduct).where(
+                        models.FlaggedProduct.product_id.in_(cleared),
+                        models.FlaggedProduct.reviewed_at.is_(None),
+                        not_(models.FlaggedProduct.reason.like(f'{ROUTE_FLAG_PREFIX}%')),
+                        not_(models.FlaggedProduct.reason.like(f'{CLONE_FLAG_PREFIX}%'))
+                    )
+                ).rowcount
+            if self.flag_summary is not None and changes:
+                # Verdict and confidence changes show on the product's remaining flags too
+                self.flag_summary.refresh(db, [c['id'] for c in changes])
+            db.commit()
+
+            if self.provenance is not None:
+                for product_id in [f['product_id'] for f in new_flags] + cleared:
+                    self.provenance.refresh(db, product_id)
+            return {
+                'scored': sum(1 for r in results if r is not None),
+                'changed': len(changes),
+                'flags_added': len(new_flags),
+                'flags_cleared': flags_cleared
+            }
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _score(self, products: List[Dict]) -> List[Optional[Dict]]:
+        """One batch call; rows the model cannot score (missing fields) become None."""
+        if not products:
+            return []
+        try:
+            return self.fraud_detector.predict_batch(products)
+        except ValueError:
+            results = []
+            for product in products:
+                try:
+                    results.append(self.fraud_detector.predict_batch([product])[0])
+                except ValueError:
+                    results.append(None)
+            return results
@@ -0,0 +1,220 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import models
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Canonical order of the stages log_shipment records; a product should not go back
+DEFAULT_STAGE_ORDER = 'manufacture,QC,warehouse,transit,customs,distribution,delivery'
+
+
+def haversine_km(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    """Great-circle distance between coordinate arrays, element-wise."""
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RouteAnomalyDetector:
+    """
+    Scores shipment sequences for impossible travel, stage regressions and
+    scans outside the allowed regions.
+
+    Events for many products are laid out as flat NumPy arrays sorted by
+    (product, time); every check is a whole-array operation over consecutive
+    pairs, with product boundaries masked out, so scanning cost is a handful
+    of vector ops regardless of how many products are in the batch.
+    """
+
+    KINDS = ('impossible_speed', 'stage_regression', 'outside_region')
+
+    def __init__(self):
+        # Air freight tops out around 900 km/h; anything faster is two places at once
+        self.max_speed_kmh = float(os.getenv('ROUTE_MAX_SPEED_KMH', '1000'))
+        # Moves shorter than this are GPS noise, whatever the interval
+        self.min_distance_km = float(os.getenv('ROUTE_MIN_DISTANCE_KM', '5'))
+        stages = os.getenv('ROUTE_STAGE_ORDER', DEFAULT_STAGE_ORDER).split(',')
+        self.stage_rank = {stage.strip().lower(): rank for rank, stage in enumerate(stages) if stage.strip()}
+        self.stage_names = {rank: stage for stage, rank in self.stage_rank.items()}
+        # JSON list of [lat_min, lat_max, lng_min, lng_max] boxes; unset disables the check
+        regions = json.loads(os.getenv('ROUTE_ALLOWED_REGIONS', '[]'))
+        self.regions = np.asarray(regions, dtype=float).reshape(-1, 4)
+
+    def ranks(self, stages: Iterable[str]) -> np.ndarray:
+        """Stage rank per event; -1 for stages outside the configured order."""
+        return np.fromiter(
+            (self.stage_rank.get((stage or '').lower(), -1) for stage in stages), dtype=np.int64
+        )
+
+    def detect(self, product_ids: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+               ts: np.ndarray, ranks: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Indices of offending events per anomaly kind. Inputs are parallel
+        arrays sorted by product then time; `ts` is in seconds. For pairwise
+        checks the later event of the pair is reported. Also returns the
+        per-event `speed_kmh` (from the previous event) and `prev_rank`.
+        """
+        n = len(product_ids)
+        hits = {kind: np.empty(0, dtype=np.int64) for kind in self.KINDS}
+        if n == 0:
+            return {**hits, 'speed_kmh': np.empty(0), 'prev_rank': np.empty(0, dtype=np.int64)}
+
+        same = np.zeros(n, dtype=bool)
+        same[1:] = product_ids[1:] == product_ids[:-1]
+
+        # Speed between consecutive events of the same product
+        dist = np.zeros(n)
+        dist[1:] = haversine_km(lat[:-1], lng[:-1], lat[1:], lng[1:])
+        hours = np.zeros(n)
+        hours[1:] = (ts[1:] - ts[:-1]) / 3600.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(hours > 0, dist / hours, np.where(dist > 0, np.inf, 0.0))
+        speed[~same] = 0.0
+        hits['impossible_speed'] = np.flatnonzero(
+            same & (dist > self.min_distance_km) & (speed > self.max_speed_kmh)
+        )
+
+        # Stage regressions against the furthest stage reached so far: a
+        # per-product running max via one cumulative max over offset ranks
+        group = np.cumsum(~same) - 1
+        span = len(self.stage_rank) + 1
+        running = np.maximum.accumulate(group * span + (ranks + 1)) - group * span - 1
+        prev_rank = np.full(n, -1, dtype=np.int64)
+        prev_rank[1:] = np.where(same[1:], running[:-1], -1)
+        hits['stage_regression'] = np.flatnonzero((ranks >= 0) & (ranks < prev_rank))
+
+        if len(self.regions):
+            r = self.regions
+            inside = (
+                (lat[:, None] >= r[:, 0]) & (lat[:, None] <= r[:, 1]) &
+                (lng[:, None] >= r[:, 2]) & (lng[:, None] <= r[:, 3])
+            ).any(axis=1)
+            hits['outside_region'] = np.flatnonzero(~inside)
+
+        return {**hits, 'speed_kmh': speed, 'prev_rank': prev_rank}
+
+    def scan(self, db: Session, product_ids: Sequence[int]) -> List[Dict]:
+        """Anomalies in the shipment histories of `product_ids` not reported before."""
+        if not product_ids:
+            return []
+        rows = (
+            db.query(
+                models.ShipmentEvent.product_id, models.ShipmentEvent.id, models.ShipmentEvent.stage,
+                models.ShipmentEvent.latitude, models.ShipmentEvent.longitude, models.ShipmentEvent.recorded_at
+            )
+            .filter(models.ShipmentEvent.product_id.in_(product_ids))
+            .order_by(models.ShipmentEvent.product_id, models.ShipmentEvent.recorded_at, models.ShipmentEvent.id)
+            .all()
+        )
+        if not rows:
+            return []
+
+        pids, event_ids, stages, lat, lng, recorded = zip(*rows)
+        pids = np.asarray(pids, dtype=np.int64)
+        event_ids = np.asarray(event_ids, dtype=np.int64)
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        ts = np.asarray(recorded, dtype='datetime64[us]').astype(np.int64) / 1e6
+        result = self.detect(pids, lat, lng, ts, self.ranks(stages))
+
+        anomalies = []
+        for kind in self.KINDS:
+            for i in result[kind]:
+                if kind == 'impossible_speed':
+                    detail = f"{result['speed_kmh'][i]:.0f} km/h since previous scan"
+                elif kind == 'stage_regression':
+                    detail = f"'{stages[i]}' after '{self.stage_names[result['prev_rank'][i]]}'"
+                else:
+                    detail = f"scan at ({lat[i]:.4f}, {lng[i]:.4f})"
+                anomalies.append({
+                    'product_id': int(pids[i]),
+                    'event_id': int(event_ids[i]),
+                    'kind': kind,
+                    'detail': detail,
+                    'recorded_at': recorded[i].isoformat()
+                })
+        if not anomalies:
+            return []
+
+        reported = {
+            (event_id, kind) for event_id, kind in
+            db.query(models.ShipmentAnomaly.event_id, models.ShipmentAnomaly.kind)
+            .filter(models.ShipmentAnomaly.event_id.in_({a['event_id'] for a in anomalies}))
+        }
+        return [a for a in anomalies if (a['event_id'], a['kind']) not in reported]
+
+    def record(self, db: Session, anomalies: List[Dict], provenance=None,
+               flag_summary=None) -> Dict[int, List[Dict]]:
+        """
+        Persist new anomalies and flag their products; one FlaggedProduct per
+        product while an earlier route flag is still unreviewed. Commits and
+        returns the anomalies grouped by product.
+        """
+        by_product: Dict[int, List[Dict]] = {}
+        for anomaly in anomalies:
+            by_product.setdefault(anomaly['product_id'], []).append(anomaly)
+        if not by_product:
+            return {}
+
+        db.add_all([
+            models.ShipmentAnomaly(
+                product_id=a['product_id'], event_id=a['event_id'], kind=a['kind'], detail=a['detail']
+            )
+            for a in anomalies
+        ])
+
+        open_flags = {
+            product_id for (product_id,) in
+            db.query(models.FlaggedProduct.product_id)
+            .filter(
+                models.FlaggedProduct.product_id.in_(by_product),
+                models.FlaggedProduct.reason.like('Route anomaly%'),
+                models.FlaggedProduct.reviewed_at.is_(None)
+            )
+        }
+        products = db.query(models.Product).filter(models.Product.id.in_(by_product)).all()
+        for product in products:
+            product.is_flagged = True
+            if product.id not in open_flags:
+                kinds = sorted({a['kind'] for a in by_product[product.id]})
+                db.add(models.FlaggedProduct(
+                    product_id=product.id,
+                    supplier_id=product.supplier_id,
+                    reason=f"Route anomaly: {', '.join(kinds)}"
+                ))
+        if flag_summary is not None:
+            flag_summary.refresh(db, by_product)
+
+        if provenance is not None:
+            provenance.append_events(db, 'anomalies', {
+                product_id: [
+                    {'kind': a['kind'], 'detail': a['detail'], 'recorded_at': a['recorded_at']}
+                    for a in items
+                ]
+                for product_id, items in by_product.items()
+            })
+        db.commit()
+        logger.warning(f"Route anomalies for {len(by_product)} products: {sum(map(len, by_product.values()))} events")
+        return by_product
+
+    def scan_all(self, db: Session, chunk_size: int = 5000, after_id: Optional[int] = 0) -> List[Dict]:
+        """Rescan every product with shipments, `chunk_size` products per query."""
+        anomalies = []
+        while True:
+            product_ids = [
+                product_id for (product_id,) in
+                db.query(models.ShipmentPosition.product_id)
+                .filter(models.ShipmentPosition.product_id > after_id)
+                .order_by(models.ShipmentPosition.product_id)
+                .limit(chunk_size)
+            ]
+            if not product_ids:
+                return anomalies
+            anomalies.extend(self.scan(db, product_ids))
+            after_id = product_ids[-1]
@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from services.metrics import FRAUD_PREFILTER_ROWS, FRAUD_RULE_HITS
+
+# Substances prohibited in cosmetics (EU Annex II / FDA 21 CFR 700) that show
+# up in counterfeit skin-lightening and whitening products. Zirconium is not
+# listed: aluminum zirconium salts are permitted antiperspirant actives.
+DEFAULT_BANNED_INGREDIENTS = (
+    'mercury', 'mercuric chloride', 'mercurous chloride', 'calomel', 'ammoniated mercury',
+    'hydroquinone', 'lead acetate', 'methylene chloride', 'chloroform', 'vinyl chloride',
+    'bithionol',
+)
+
+# Evaluated in order; the first matching rule decides the product.
+# 'penalize': False flags for review without counting toward supplier blocking.
+DEFAULT_RULES = [
+    # An empty list is an incomplete listing, not evidence of a counterfeit
+    {'name': 'missing_ingredients', 'kind': 'min_ingredients', 'min': 1,
+     'decision': 'flag', 'confidence': 0.99, 'penalize': False},
+    {'name': 'banned_ingredient', 'kind': 'banned_ingredients', 'ingredients': list(DEFAULT_BANNED_INGREDIENTS),
+     'decision': 'flag', 'confidence': 0.99},
+    {'name': 'price_far_below_median', 'kind': 'max_price_ratio', 'max': 0.1,
+     'decision': 'flag', 'confidence': 0.95},
+    # Passing on price alone skips the text features entirely; off by default
+    {'name': 'price_near_median', 'kind': 'price_ratio_range', 'min': 0.8, 'max': 1.25,
+     'decision': 'pass', 'confidence': 0.05, 'enabled': False},
+]
+
+DECISIONS = ('flag', 'pass')
+
+# A check gets (ingredients, price_ratio, category_known) and returns a reason or None
+Check = Callable[[str, float, bool], Optional[str]]
+
+
+class Rule:
+    def __init__(self, name: str, decision: str, confidence: float, check: Check, penalize: bool = True):
+        if decision not in DECISIONS:
+            raise ValueError(f"Rule '{name}': decision must be one of {DECISIONS}, got '{decision}'")
+        self.name = name
+        self.decision = decision
+        self.confidence = float(confidence)
+        self.penalize = bool(penalize)
+        self.check = check
+        self.hits = 0
+        self.counter = FRAUD_RULE_HITS.labels(rule=name, decision=decision)
+
+
+def _compile_check(spec: Dict) -> Check:
+    """Turn one rule spec into a closure; regexes and thresholds are bound once."""
+    kind = spec['kind']
+    reason = spec.get('reason')
+
+    if kind == 'min_ingredients':
+        minimum = int(spec.get('min', 1))
+
+        def check(ings, ratio, known):
+            count = sum(1 for part in ings.split(',') if part.strip(" '\"[]"))
+            if count < minimum:
+                return reason or ("No ingredients listed" if count == 0 else f"Only {count} ingredient(s) listed")
+            return None
+        return check
+
+    if kind == 'banned_ingredients':
+        names = sorted({n.strip().lower() for n in spec.get('ingredients', []) if n.strip()}, key=len, reverse=True)
+        if not names:
+            raise ValueError(f"Rule '{spec['name']}': no banned ingredients given")
+        # One alternation, longest names first, whole words only
+        pattern = re.compile(r'(?<!\w)(' + '|'.join(re.escape(n) for n in names) + r')(?!\w)', re.IGNORECASE)
+
+        def check(ings, ratio, known):
+            match = pattern.search(ings)
+            if match:
+                return reason or f"Contains banned ingredient: {match.group(1).lower()}"
+            return None
+        return check
+
+    if kind == 'max_price_ratio':
+        limit = float(spec['max'])
+
+        def check(ings, ratio, known):
+            if known and ratio < limit:
+                return reason or f"Price {ratio:.0%} of category median"
+            return None
+        return check
+
+    if kind == 'price_ratio_range':
+        low, high = float(spec['min']), float(spec['max'])
+
+        def check(ings, ratio, known):
+            if known and low <= ratio <= high:
+                return reason or f"Price within {low:.0%}-{high:.0%} of category median"
+            return None
+        return check
+
+    raise ValueError(f"Rule '{spec.get('name')}': unknown kind '{kind}'")
+
+
+class RuleFilter:
+    """
+    Cheap rules evaluated before the fraud model.
+
+    Each rule is compiled once into a closure over its thresholds (banned
+    ingredients become a single case-insensitive regex). Products a rule
+    decides never reach the TF-IDF and classifier stages; the rest go on to
+    the model unchanged. Rules come from DEFAULT_RULES, or from the JSON
+    file in FRAUD_RULES_FILE (a list of rule specs, or {"rules": [...]}).
+    """
+
+    def __init__(self, specs: Optional[List[Dict]] = None):
+        self.enabled = os.getenv('FRAUD_RULES_ENABLED', 'true').lower() == 'true'
+        if specs is None:
+            specs = self._load_specs(os.getenv('FRAUD_RULES_FILE'))
+        self.rules: List[Rule] = [
+            Rule(spec['name'], spec.get('decision', 'flag'), spec.get('confidence', 0.99), _compile_check(spec),
+                 spec.get('penalize', True))
+            for spec in specs if spec.get('enabled', True)
+        ]
+        self.evaluated = 0
+        self.model_rows = 0
+        self._lock = threading.Lock()
+        self._model_counter = FRAUD_PREFILTER_ROWS.labels(outcome='model')
+        self._rule_counter = FRAUD_PREFILTER_ROWS.labels(outcome='rule')
+        if self.enabled:
+            logger.info(f"Fraud pre-filter rules: {', '.join(r.name for r in self.rules) or 'none'}")
+
+    @staticmethod
+    def _load_specs(path: Optional[str]) -> List[Dict]:
+        if not path:
+            return DEFAULT_RULES
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(__file__), '..', path)
+        with open(path) as f:
+            specs = json.load(f)
+        return specs['rules'] if isinstance(specs, dict) else specs
+
+    def evaluate(self, ingredients: Sequence[str], price_ratio: np.ndarray,
+                 known: np.ndarray) -> List[Optional[Dict]]:
+        """Per product: {'rule', 'decision', 'confidence', 'reason', 'penalize'} or None when the model decides."""
+        decisions: List[Optional[Dict]] = [None] * len(ingredients)
+        if not self.enabled or not self.rules:
+            return decisions
+
+        hits: List[Rule] = []
+        for i, ings in enumerate(ingredients):
+            ratio, is_known = float(price_ratio[i]), bool(known[i])
+            for rule in self.rules:
+                reason = rule.check(ings, ratio, is_known)
+                if reason is not None:
+                    decisions[i] = {
+                        'rule': rule.name,
+                        'decision': rule.decision,
+                        'confidence': rule.confidence,
+                        'reason': reason,
+                        'penalize': rule.penalize
+                    }
+                    hits.append(rule)
+                    break
+
+        decided = len(hits)
+        with self._lock:
+            self.evaluated += len(ingredients)
+            self.model_rows += len(ingredients) - decided
+            for rule in hits:
+                rule.hits += 1
+        for rule in hits:
+            rule.counter.inc()
+        self._rule_counter.inc(decided)
+        self._model_counter.inc(len(ingredients) - decided)
+        return decisions
+
+    def stats(self) -> Dict:
+        """Hit rate per rule and the share of products that skipped the model."""
+        evaluated = self.evaluated
+        return {
+            'enabled': self.enabled,
+            'evaluated': evaluated,
+            'model_rows': self.model_rows,
+            'model_calls_avoided': evaluated - self.model_rows,
+            'avoided_share': (evaluated - self.model_rows) / evaluated if evaluated else 0.0,
+            'rules': [
+                {
+                    'name': rule.name,
+                    'decision': rule.decision,
+                    'penalize': rule.penalize,
+                    'hits': rule.hits,
+                    'hit_rate': rule.hits / evaluated if evaluated else 0.0
+                }
+                for rule in self.rules
+            ]
+        }
@@ -0,0 +1,127 @@
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+
+
+def _utc_naive(value: Optional[datetime], default: datetime) -> datetime:
+    """Columns hold naive UTC; scanners may send offsets."""
+    if value is None:
+        return default
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ShipmentService:
+    """
+    Bulk ingest and queries for shipment events.
+
+    A scanner batch becomes one multi-row INSERT ... RETURNING, one lookup of
+    the affected products' positions and one bulk provenance update,
+    regardless of how many events it carries.
+    """
+
+    def __init__(self, provenance=None):
+        self.provenance = provenance
+        self.max_batch = int(os.getenv('SHIPMENT_BATCH_MAX', '5000'))
+
+    def ingest(self, db: Session, events: List[schemas.ShipmentEventIn], reported_by: Optional[int]) -> Dict:
+        """Store a batch; events for unknown products are skipped and reported."""
+        product_ids = {event.product_id for event in events}
+        known = {
+            product_id for (product_id,) in
+            db.query(models.Product.id).filter(models.Product.id.in_(product_ids))
+        }
+        now = datetime.utcnow()
+        rows = [
+            {
+                'product_id': event.product_id,
+                'stage': event.stage,
+                'latitude': event.latitude,
+                'longitude': event.longitude,
+                'recorded_at': _utc_naive(event.recorded_at, now),
+                'received_at': now,
+                'scanner_id': event.scanner_id,
+                'reported_by': reported_by
+            }
+            for event in events if event.product_id in known
+        ]
+        if not rows:
+            return {'accepted': 0, 'unknown_products': sorted(product_ids - known), 'rows': []}
+
+        ids = db.execute(
+            insert(models.ShipmentEvent).returning(models.ShipmentEvent.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        for row, event_id in zip(rows, ids):
+            row['id'] = event_id
+
+        by_product: Dict[int, List[Dict]] = {}
+        for row in rows:
+            by_product.setdefault(row['product_id'], []).append(row)
+        for product_rows in by_product.values():
+            product_rows.sort(key=lambda r: r['recorded_at'])
+
+        self._update_positions(db, by_product)
+        if self.provenance is not None:
+            self.provenance.append_events(db, 'shipments', {
+                product_id: [
+                    {
+                        'stage': r['stage'],
+                        'lat': r['latitude'],
+                        'lng': r['longitude'],
+                        'recorded_at': r['recorded_at'].isoformat()
+                    }
+                    for r in product_rows
+                ]
+                for product_id, product_rows in by_product.items()
+            })
+        db.commit()
+        logger.debug(f"Ingested {len(rows)} shipment events for {len(by_product)} products")
+        return {'accepted': len(rows), 'unknown_products': sorted(product_ids - known), 'rows': rows}
+
+    def _update_positions(self, db: Session, by_product: Dict[int, List[Dict]]):
+        """Move each product's latest position forward; late, out-of-order scans only bump the count."""
+        positions = {
+            position.product_id: position for position in
+            db.query(models.ShipmentPosition)
+            .filter(models.ShipmentPosition.product_id.in_(by_product))
+            .with_for_update()
+        }
+        for product_id, product_rows in by_product.items():
+            latest = product_rows[-1]
+            position = positions.get(product_id)
+            if position is None:
+                position = models.ShipmentPosition(product_id=product_id, event_count=0)
+                db.add(position)
+            elif position.recorded_at > latest['recorded_at']:
+                position.event_count += len(product_rows)
+                continue
+            position.event_id = latest['id']
+            position.stage = latest['stage']
+            position.latitude = latest['latitude']
+            position.longitude = latest['longitude']
+            position.recorded_at = latest['recorded_at']
+            position.event_count = (position.event_count or 0) + len(product_rows)
+
+    @staticmethod
+    def latest_position(db: Session, product_id: int) -> Optional[models.ShipmentPosition]:
+        return db.query(models.ShipmentPosition).filter(models.ShipmentPosition.product_id == product_id).first()
+
+    @staticmethod
+    def history(db: Session, product_id: int, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, limit: int = 500) -> List[models.ShipmentEvent]:
+        """Route history in time order; served by the (product_id, recorded_at) index."""
+        query = db.query(models.ShipmentEvent).filter(models.ShipmentEvent.product_id == product_id)
+        if since:
+            query = query.filter(models.ShipmentEvent.recorded_at >= _utc_naive(since, since))
+        if until:
+            query = query.filter(models.ShipmentEvent.recorded_at <= _utc_naive(until, until))
+        return query.order_by(models.ShipmentEvent.recorded_at, models.ShipmentEvent.id).limit(limit).all()
@@ -0,0 +1,220 @@
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import models
+
+
+class SimilarityIndex:
+    """
+    Near-duplicate lookup over the fraud model's TF-IDF text features.
+
+    A product is represented by its name and ingredient TF-IDF vectors (from
+    the fitted vectorizers in FraudDetectionService), weighted so the dot
+    product of two unit vectors is `w * cos(names) + (1 - w) * cos(ingredients)`.
+    Random-hyperplane LSH splits a sign signature into `bands` keys of `rows`
+    bits; products sharing any band key are candidates, and only candidates
+    are scored exactly, so a query touches a few buckets regardless of
+    catalogue size.
+
+    Memory is dominated by the vectors kept for exact scoring: a dense
+    float32 row of dim * 4 bytes per product (dim is the combined vocabulary
+    size, e.g. about 5 KB per product with 1280 features, so several GB for
+    millions of products). Bucket postings add bands * 8 bytes, and the id
+    arrays and the product id lookup roughly another 100 bytes per product.
+
+    The index needs the fitted vectorizers; with the ONNX backend they live
+    inside the graph and the index stays disabled (`enabled` is False).
+    """
+
+    CENTER_MIN_SAMPLE = 100
+
+    def __init__(self, fraud_detector, dim: Optional[int] = None):
+        self.fraud_detector = fraud_detector
+        self.bands = int(os.getenv('SIMILARITY_BANDS', '24'))
+        self.rows = int(os.getenv('SIMILARITY_ROWS', '16'))
+        self.threshold = float(os.getenv('SIMILARITY_THRESHOLD', '0.9'))
+        self.name_weight = float(os.getenv('SIMILARITY_NAME_WEIGHT', '0.5'))
+
+        self.dim = dim or self._vocab_size()
+        rng = np.random.default_rng(int(os.getenv('SIMILARITY_SEED', '7')))
+        self.planes = rng.standard_normal((self.dim, self.bands * self.rows)).astype(np.float32)
+        self._powers = (1 << np.arange(self.rows, dtype=np.int64))
+        # TF-IDF rows all sit in the positive orthant, where most random
+        # hyperplanes through the origin cut nothing; hashing the offset from
+        # the catalogue mean spreads products evenly over the buckets
+        self.center: Optional[np.ndarray] = None
+
+        self._buckets: List[Dict[int, array]] = [{} for _ in range(self.bands)]
+        self._vectors = np.zeros((1024, self.dim), dtype=np.float32)
+        self._product_ids = np.zeros(1024, dtype=np.int64)
+        self._supplier_ids = np.zeros(1024, dtype=np.int64)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._position: Dict[int, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.ready = False
+
+    @property
+    def enabled(self) -> bool:
+        # The ONNX backend keeps its vectorizers inside the graph
+        fd = self.fraud_detector
+        return fd is not None and fd.tf_name is not None and fd.tf_ing is not None
+
+    def _vocab_size(self) -> int:
+        return self.vectorize([{'product_name': 'x', 'ingredients': 'x'}]).shape[1] if self.enabled else 0
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._size].sum())
+
+    # Vectors and signatures
+
+    def vectorize(self, products: Sequence[Dict]) -> np.ndarray:
+        """Unit-length weighted [name | ingredients] TF-IDF rows."""
+        fd = self.fraud_detector
+        names = fd.tf_name.transform([p.get('product_name') or '' for p in products])
+        ings = fd.tf_ing.transform([p.get('ingredients') or '' for p in products])
+        names = names.toarray() if hasattr(names, 'toarray') else np.asarray(names)
+        ings = ings.toarray() if hasattr(ings, 'toarray') else np.asarray(ings)
+        vectors = np.hstack([
+            np.sqrt(self.name_weight) * names, np.sqrt(1 - self.name_weight) * ings
+        ]).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _band_keys(self, vectors: np.ndarray) -> np.ndarray:
+        bits = ((vectors - self.center) @ self.planes) > 0
+        return bits.reshape(len(vectors), self.bands, self.rows).astype(np.int64) @ self._powers
+
+    # Maintenance
+
+    def _grow(self, needed: int):
+        capacity = len(self._product_ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_vectors', '_product_ids', '_supplier_ids', '_alive'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, product_ids: Sequence[int], supplier_ids: Sequence[int], vectors: np.ndarray):
+        """Index vectors; re-adding a product replaces its previous entry."""
+        keep = np.linalg.norm(vectors, axis=1) > 0  # no known terms: nothing to compare
+        if not keep.any():
+            return
+        product_ids = np.asarray(product_ids, dtype=np.int64)[keep]
+        supplier_ids = np.asarray(supplier_ids, dtype=np.int64)[keep]
+        vectors = vectors[keep]
+        if self.center is None:
+            # Fixed by the first batch (the startup build) so keys stay comparable;
+            # a near-empty catalogue hashes uncentered until the next rebuild
+            if len(vectors) >= self.CENTER_MIN_SAMPLE:
+                self.center = vectors.mean(axis=0)
+            else:
+                self.center = np.zeros(self.dim, dtype=np.float32)
+        keys = self._band_keys(vectors)
+
+        with self._lock:
+            for product_id in product_ids:
+                old = self._position.pop(int(product_id), None)
+                if old is not None:
+                    self._alive[old] = False
+            start = self._size
+            self._grow(start + len(product_ids))
+            end = start + len(product_ids)
+            self._vectors[start:end] = vectors
+            self._product_ids[start:end] = product_ids
+            self._supplier_ids[start:end] = supplier_ids
+            self._alive[start:end] = True
+            for offset, product_id in enumerate(product_ids):
+                self._position[int(product_id)] = start + offset
+            for band, buckets in enumerate(self._buckets):
+                for offset, key in enumerate(keys[:, band].tolist()):
+                    postings = buckets.get(key)
+                    if postings is None:
+                        postings = buckets[key] = array('q')
+                    postings.append(start + offset)
+            self._size = end
+
+    def remove(self, product_id: int):
+        with self._lock:
+            position = self._position.pop(product_id, None)
+            if position is not None:
+                self._alive[position] = False
+
+    def build(self, db: Session, chunk_size: int = 5000):
+        """Index every product, `chunk_size` rows per query and vectorizer call."""
+        if not self.enabled:
+            logger.warning("Similarity index disabled: no TF-IDF vectorizers with this fraud model backend")
+            return
+        after_id, total = 0, 0
+        while True:
+            rows = (
+                db.query(models.Product.id, models.Product.supplier_id,
+                         models.Product.product_name, models.Product.ingredients)
+                .filter(models.Product.id > after_id)
+                .order_by(models.Product.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            vectors = self.vectorize([{'product_name': r[2], 'ingredients': r[3]} for r in rows])
+            self.add([r[0] for r in rows], [r[1] or 0 for r in rows], vectors)
+            after_id, total = rows[-1][0], total + len(rows)
+        self.ready = True
+        logger.info(f"Similarity index built: {total} products, {self.bands}x{self.rows}-bit LSH")
+
+    # Queries
+
+    def query(self, vector: np.ndarray, limit: int = 10, threshold: Optional[float] = None,
+              exclude_supplier: Optional[int] = None, exclude_product: Optional[int] = None) -> List[Dict]:
+        """Indexed products with similarity >= threshold, most similar first."""
+        threshold = self.threshold if threshold is None else threshold
+        if not np.any(vector) or self.center is None:
+            return []
+        keys = self._band_keys(vector[None, :])[0].tolist()
+        with self._lock:
+            postings = [self._buckets[band].get(key) for band, key in enumerate(keys)]
+            postings = [np.frombuffer(p, dtype=np.int64) for p in postings if p]
+            if not postings:
+                return []
+            candidates = np.unique(np.concatenate(postings))
+            candidates = candidates[self._alive[candidates]]
+            if exclude_supplier is not None:
+                candidates = candidates[self._supplier_ids[candidates] != exclude_supplier]
+            if exclude_product is not None:
+                candidates = candidates[self._product_ids[candidates] != exclude_product]
+            if not len(candidates):
+                return []
+            scores = self._vectors[candidates] @ vector
+            product_ids = self._product_ids[candidates]
+            supplier_ids = self._supplier_ids[candidates]
+
+        hits = np.flatnonzero(scores >= threshold)
+        hits = hits[np.argsort(-scores[hits], kind='stable')][:limit]
+        return [
+            {
+                'product_id': int(product_ids[i]),
+                'supplier_id': int(supplier_ids[i]),
+                'similarity': round(float(scores[i]), 4)
+            }
+            for i in hits
+        ]
+
+    def similar_to(self, product_id: int, limit: int = 10, threshold: Optional[float] = None) -> Optional[List[Dict]]:
+        """Neighbours of an indexed product; None if it is not indexed."""
+        with self._lock:
+            position = self._position.get(product_id)
+            vector = self._vectors[position].copy() if position is not None else None
+        if vector is None:
+            return None
+        return self.query(vector, limit=limit, threshold=threshold, exclude_product=product_id)
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODEL_DIR = os.path.abspath(os.path.join(BACKEND_DIR, '..', 'model'))
+sys.path[:0] = [BACKEND_DIR, MODEL_DIR]
+# Services import the ORM models; no database is touched by these tests
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+CATEGORIES = ['Serum', 'Toner', 'Cleanser', 'Moisturizer', 'Sunscreen']
+NAME_WORDS = ['hydra', 'glow', 'boost', 'gentle', 'daily', 'repair', 'night', 'vitamin', 'clear', 'calm', 'ultra']
+INGREDIENTS = ['aqua', 'glycerin', 'niacinamide', 'squalane', 'tocopherol', 'panthenol', 'allantoin',
+               'sodium hyaluronate', 'butylene glycol', 'parfum', 'mercury', 'hydroquinone']
+
+
+def make_products(rng: np.random.Generator, n: int, unknown_share: float = 0.0) -> pd.DataFrame:
+    """Synthetic catalog rows; a share of them use categories and words no step was fitted on."""
+    rows = []
+    for _ in range(n):
+        unknown = rng.random() < unknown_share
+        category = 'Balm' if unknown else str(rng.choice(CATEGORIES))
+        words = rng.choice(NAME_WORDS, size=rng.integers(1, 4))
+        ingredients = list(rng.choice(INGREDIENTS, size=rng.integers(1, 8), replace=False))
+        if unknown:
+            ingredients.append('unlisted extract')
+        rows.append({
+            'product_name': ' '.join(words).title() + (' Zz' if unknown else ''),
+            'ingredients': ', '.join(ingredients),
+            'category': category,
+            # Log-uniform, so some rows land well outside the fitted range
+            'price': float(np.exp(rng.uniform(-2, 7))),
+        })
+    df = pd.DataFrame(rows)
+    suspicious = df['ingredients'].str.contains('mercury|hydroquinone') | (df['price'] < 1)
+    df['label'] = (suspicious ^ (rng.random(n) < 0.1)).astype(int)
+    return df
+
+
+@pytest.fixture(scope='session')
+def bundle():
+    """A small artifact bundle fitted the way model/train.py fits the real one."""
+    from train import RANDOM_STATE, build_features, build_preprocessors
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import MinMaxScaler
+
+    df = make_products(np.random.default_rng(0), 400)
+    steps = build_preprocessors()
+    ohe = steps['ohe'].fit(df[['category']])
+    tf_name = steps['tf_name'].fit(df['product_name'])
+    tf_ing = steps['tf_ing'].fit(df['ingredients'])
+    median_price_map = df[df['label'] == 0].groupby('category')['price'].median().to_dict()
+    X = build_features(df, ohe, tf_name, tf_ing, median_price_map)
+    scaler = MinMaxScaler().fit(X)
+    clf = RandomForestClassifier(n_estimators=25, random_state=RANDOM_STATE).fit(scaler.transform(X), df['label'])
+    return {
+        'ohe': ohe,
+        'tf_name': tf_name,
+        'tf_ing': tf_ing,
+        'scaler': scaler,
+        'clf': clf,
+        'median_price_map': median_price_map,
+    }
+
+
+@pytest.fixture(scope='session')
+def rows():
+    """Products the bundle has not seen, including unknown categories and out-of-range prices."""
+    return make_products(np.random.default_rng(1), 300, unknown_share=0.15)
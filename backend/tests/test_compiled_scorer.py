@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from services.compiled_scorer import CompiledScorer
+from train import build_features
+
+
+def features(bundle, df):
+    return build_features(df, bundle['ohe'], bundle['tf_name'], bundle['tf_ing'], bundle['median_price_map'])
+
+
+def reference_proba(bundle, X):
+    return bundle['clf'].predict_proba(bundle['scaler'].transform(X))
+
+
+@pytest.fixture
+def scorer(bundle, rows):
+    # max_rows covering every row keeps all stages on the compiled path
+    return CompiledScorer(bundle['ohe'], bundle['tf_name'], bundle['tf_ing'], bundle['scaler'], bundle['clf'],
+                          max_rows=len(rows))
+
+
+def test_all_stages_compile(scorer):
+    assert scorer.compiled_stages == ['ohe', 'tf_name', 'tf_ing', 'scale', 'classify']
+
+
+def test_feature_stages_match_sklearn(bundle, rows, scorer):
+    cats = rows['category'].tolist()
+    np.testing.assert_array_equal(scorer.encode_categories(cats), bundle['ohe'].transform(rows[['category']]))
+    np.testing.assert_array_equal(scorer.name_features(rows['product_name'].tolist()),
+                                  bundle['tf_name'].transform(rows['product_name']).toarray())
+    np.testing.assert_array_equal(scorer.ingredient_features(rows['ingredients'].tolist()),
+                                  bundle['tf_ing'].transform(rows['ingredients']).toarray())
+
+
+def test_folded_scaler_probabilities_are_bit_identical(bundle, rows, scorer):
+    X = features(bundle, rows)
+    expected = reference_proba(bundle, X)
+
+    batch = scorer.predict_proba(scorer.scale(X))
+    single = np.vstack([scorer.predict_proba(scorer.scale(X[i:i + 1])) for i in range(len(X))])
+
+    np.testing.assert_array_equal(batch, expected)
+    np.testing.assert_array_equal(single, expected)
+    np.testing.assert_array_equal(scorer.classes_[np.argmax(batch, axis=1)], bundle['clf'].predict(
+        bundle['scaler'].transform(X)))
+
+
+def test_folded_thresholds_split_like_sklearn(bundle, scorer):
+    # A folded threshold must be the largest raw value that sklearn sends
+    # left: sklearn compares float32(scaler output) with the tree threshold
+    forest, scaler = scorer.forest, bundle['scaler']
+    original = np.concatenate([
+        np.where(est.tree_.children_left == -1, np.inf, est.tree_.threshold) for est in bundle['clf'].estimators_
+    ])
+    split = np.flatnonzero(forest.threshold != np.inf)
+    features, folded = forest.feature[split], forest.threshold[split]
+    for raw, goes_left in ((folded, True), (np.nextafter(folded, np.inf), False)):
+        X = np.tile(scaler.data_min_, (len(split), 1))
+        X[np.arange(len(split)), features] = raw
+        scaled = scaler.transform(X)[np.arange(len(split)), features].astype(np.float32)
+        np.testing.assert_array_equal(scaled <= original[split], goes_left)
+
+
+def test_large_batches_fall_back_to_sklearn(bundle, rows):
+    scorer = CompiledScorer(bundle['ohe'], bundle['tf_name'], bundle['tf_ing'], bundle['scaler'], bundle['clf'],
+                            max_rows=8)
+    X = features(bundle, rows)
+    np.testing.assert_array_equal(scorer.predict_proba(scorer.scale(X)), reference_proba(bundle, X))
@@ -0,0 +1,23 @@
+import joblib
+import numpy as np
+import pytest
+
+from services.fraud_detection import FraudDetectionService
+
+
+@pytest.mark.parametrize('fast_scorer', ['true', 'false'])
+@pytest.mark.parametrize('threshold', [0.3, 0.5, 0.7])
+def test_labels_apply_the_bundle_threshold(monkeypatch, tmp_path, bundle, rows, fast_scorer, threshold):
+    path = tmp_path / 'bundle.pkl'
+    joblib.dump({**bundle, 'metadata': {'threshold': threshold}}, path)
+    monkeypatch.setenv('FRAUD_MODEL_ARTIFACT', str(path))
+    monkeypatch.setenv('FRAUD_FAST_SCORER', fast_scorer)
+    service = FraudDetectionService()
+    assert service.threshold == threshold
+
+    products = rows[['product_name', 'ingredients', 'price', 'category']].to_dict('records')
+    # Rule decisions carry their own verdict; the threshold applies to model results
+    results = [r for r in service.predict_batch(products) if r['rule'] is None]
+    assert results
+    confidence = np.array([r['confidence'] for r in results])
+    np.testing.assert_array_equal([r['is_counterfeit'] for r in results], confidence > threshold)
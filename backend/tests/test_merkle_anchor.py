@@ -0,0 +1,105 @@
+import hashlib
+
+import pytest
+
+from services.merkle_anchor import build_levels, hash_leaf, hash_node, inclusion_proof, verify_proof
+
+SIZES = [1, 2, 3, 4, 5, 7, 8, 9, 16, 33]
+
+
+def tree(n):
+    payloads = [f'{{"event":{i}}}'.encode() for i in range(n)]
+    leaves = [hash_leaf(p) for p in payloads]
+    return payloads, leaves, build_levels(leaves)
+
+
+def test_hashes_are_domain_separated():
+    left, right = hash_leaf(b'a'), hash_leaf(b'b')
+    assert hash_leaf(b'a') == hashlib.sha256(b'\x00a').digest()
+    assert hash_node(left, right) == hashlib.sha256(b'\x01' + left + right).digest()
+    # Node bytes hashed as a leaf do not reproduce the node
+    assert hash_leaf(left + right) != hash_node(left, right)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_levels_reduce_to_one_root(n):
+    _, leaves, levels = tree(n)
+    assert levels[0] == leaves
+    assert len(levels[-1]) == 1
+    assert [len(level) for level in levels] == [-(-n // 2 ** k) for k in range(len(levels))]
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_every_leaf_proves_against_the_root(n):
+    _, leaves, levels = tree(n)
+    root = levels[-1][0]
+    for i, leaf in enumerate(leaves):
+        proof = inclusion_proof(levels, i)
+        assert len(proof) == len(levels) - 1
+        assert verify_proof(leaf, proof, root)
+
+
+@pytest.mark.parametrize('n', [n for n in SIZES if n > 1])
+def test_tampering_fails_verification(n):
+    payloads, leaves, levels = tree(n)
+    root = levels[-1][0]
+    for i in range(n):
+        proof = inclusion_proof(levels, i)
+        # A modified payload
+        assert not verify_proof(hash_leaf(payloads[i] + b' '), proof, root)
+        # Another leaf's proof
+        assert not verify_proof(leaves[i], inclusion_proof(levels, (i + 1) % n), root)
+        # A modified sibling hash
+        position, sibling = proof[0]
+        forged = [(position, hashlib.sha256(sibling).digest())] + proof[1:]
+        assert not verify_proof(leaves[i], forged, root)
+        # A swapped side (an odd last leaf is paired with itself, where sides are moot)
+        if sibling != leaves[i]:
+            flipped = [('right' if position == 'left' else 'left', sibling)] + proof[1:]
+            assert not verify_proof(leaves[i], flipped, root)
+
+
+def test_inner_node_cannot_pose_as_a_leaf():
+    _, _, levels = tree(8)
+    root = levels[-1][0]
+    # The first level-1 node with the proof of its position one level up
+    node_proof = inclusion_proof(levels[1:], 0)
+    assert verify_proof(levels[1][0], node_proof, root)
+    assert not verify_proof(hash_leaf(levels[0][0] + levels[0][1]), node_proof, root)
+
+
+@pytest.mark.parametrize('n', [1, 6, 7])
+def test_sealed_batch_proves_every_recorded_event(n):
+    from types import SimpleNamespace
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import models
+    from services.merkle_anchor import MerkleAnchorService
+    from services.payload_codec import get_codec
+
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    models.Base.metadata.create_all(engine, tables=[models.AnchorBatch.__table__, models.AnchorLeaf.__table__])
+    session_factory = sessionmaker(bind=engine)
+    service = MerkleAnchorService(SimpleNamespace(codec=get_codec('json')), session_factory)
+    for i in range(n):
+        service.record('products', f'product_{i % 3}', 'product', i % 3, {'action': 'register', 'seq': i})
+
+    db = session_factory()
+    try:
+        batch = service.seal_batch(db)
+        assert batch.leaf_count == n
+        proofs = [p for entity_id in range(3) for p in service.proofs_for(db, 'product', entity_id)]
+        assert len(proofs) == n
+        assert all(p['verified'] and p['root'] == batch.root for p in proofs)
+
+        # A payload altered after sealing no longer verifies against the root
+        leaf = db.query(models.AnchorLeaf).first()
+        leaf.payload = get_codec('json').encode_bytes({'stream': 'products', 'key': leaf.key, 'data': {}})
+        db.commit()
+        tampered = service.proofs_for(db, 'product', leaf.entity_id)
+        assert [p['verified'] for p in tampered] == [p['leaf_id'] != leaf.id for p in tampered]
+    finally:
+        db.close()
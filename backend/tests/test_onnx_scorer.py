@@ -0,0 +1,48 @@
+import joblib
+import numpy as np
+import pytest
+
+# The ONNX backend is optional; so are these tests
+pytest.importorskip('onnxruntime')
+pytest.importorskip('skl2onnx')
+
+from services.fraud_detection import FraudDetectionService  # noqa: E402
+
+# onnxruntime computes in float32, so probabilities are close rather than identical
+TOLERANCE = 1e-5
+
+
+@pytest.fixture(scope='module')
+def exported(bundle, rows, tmp_path_factory):
+    from export_onnx import export
+
+    out = tmp_path_factory.mktemp('onnx')
+    artifacts_path = str(out / 'bundle.pkl')
+    data_path = str(out / 'data.csv')
+    onnx_path = str(out / 'bundle.onnx')
+    joblib.dump(bundle, artifacts_path)
+    rows.to_csv(data_path, index=False)
+    export(artifacts_path, onnx_path, data_path)
+    return artifacts_path, onnx_path
+
+
+def service(monkeypatch, backend: str, artifact: str) -> FraudDetectionService:
+    monkeypatch.setenv('FRAUD_DETECTION_BACKEND', backend)
+    monkeypatch.setenv('FRAUD_ONNX_MODEL' if backend == 'onnx' else 'FRAUD_MODEL_ARTIFACT', artifact)
+    return FraudDetectionService()
+
+
+def test_onnx_backend_matches_sklearn(monkeypatch, exported, rows):
+    artifacts_path, onnx_path = exported
+    reference = service(monkeypatch, 'sklearn', artifacts_path)
+    onnx = service(monkeypatch, 'onnx', onnx_path)
+    assert onnx.onnx is not None and onnx.categories == reference.categories
+
+    products = rows[['product_name', 'ingredients', 'price', 'category']].to_dict('records')
+    expected = reference.predict_batch(products)
+    for actual in (onnx.predict_batch(products), [onnx.predict_batch([p])[0] for p in products]):
+        np.testing.assert_allclose([r['confidence'] for r in actual], [r['confidence'] for r in expected],
+                                   rtol=0, atol=TOLERANCE)
+        np.testing.assert_array_equal([r['is_counterfeit'] for r in actual],
+                                      [r['is_counterfeit'] for r in expected])
+        np.testing.assert_array_equal([r['price_ratio'] for r in actual], [r['price_ratio'] for r in expected])
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from services.payload_codec import CODECS, CODECS_BY_VERSION, KNOWN_VERSIONS, decode_payload, get_codec
+
+PAYLOAD = {
+    'product_id': 42,
+    'product_name': 'Hydra Glow Serum',
+    'ingredients': 'aqua, glycerin, niacinamide',
+    'price': 19.99,
+    'is_flagged': False,
+    'label': None,
+    'tags': ['serum', 'ünïcode'],
+}
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_codec_round_trips(name):
+    codec = CODECS[name]
+    encoded = codec.encode(PAYLOAD)
+    assert decode_payload(encoded) == PAYLOAD
+    raw = bytes.fromhex(encoded)
+    if codec.version:
+        assert raw[0] == codec.version and KNOWN_VERSIONS[codec.version] == name
+    else:
+        assert raw[0] == ord('{')
+
+
+def test_version_bytes_are_unique_and_registered():
+    versioned = [c for c in CODECS.values() if c.version]
+    assert len({c.version for c in versioned}) == len(versioned)
+    assert all(KNOWN_VERSIONS[c.version] == c.name for c in versioned)
+    # Every version byte must stay clear of the legacy JSON detection
+    assert not {ord('{'), ord('[')} & set(KNOWN_VERSIONS)
+
+
+@pytest.mark.parametrize('legacy', [{'a': 1, 'b': [1, 2]}, [1, 'two', None]])
+def test_legacy_json_items_decode(legacy):
+    # Items written before the version byte: hex of plain json.dumps
+    assert decode_payload(json.dumps(legacy).encode('utf-8').hex()) == legacy
+
+
+def test_unknown_version_byte_raises():
+    with pytest.raises(ValueError, match='Unknown payload version byte 0x7f'):
+        decode_payload('7f00')
+
+
+def test_empty_payload_raises():
+    with pytest.raises(ValueError, match='Empty payload'):
+        decode_payload('')
+
+
+def test_known_version_without_its_dependency_raises(monkeypatch):
+    monkeypatch.delitem(CODECS_BY_VERSION, 0x02, raising=False)
+    with pytest.raises(ValueError, match="'msgpack' but its dependency is not installed"):
+        decode_payload('02' + '80')
+
+
+def test_default_and_unavailable_codecs_are_json(monkeypatch):
+    monkeypatch.delenv('PAYLOAD_CODEC', raising=False)
+    assert get_codec() is CODECS['json']
+    assert get_codec('no-such-codec') is CODECS['json']
@@ -0,0 +1,78 @@
+import { useEffect, useRef } from 'react';
+import apiClient from './axiosInstance';
+
+const EVENTS_URL = 'http://localhost:8000/events';
+const REOPEN_DELAY_MS = 3000;
+
+// The stream's query string ends up in proxy and access logs, so it carries a
+// short-lived stream token instead of the bearer token.
+const fetchStreamToken = async (token) => {
+  const response = await apiClient.post('/auth/stream-token', null, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  return response.data.token;
+};
+
+// Subscribes to the backend's server-sent events. `handlers` maps event types
+// (product.flagged, order.status, payment.updated) to callbacks receiving the
+// event's data; `resync` fires when events were missed and lists should be
+// refetched. EventSource reconnects by itself while its stream token is
+// valid; once the server refuses it, the stream is reopened with a fresh
+// token and resumes after the last event seen.
+export const useServerEvents = (handlers) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token) return undefined;
+
+    const types = Object.keys(handlersRef.current).filter((type) => type !== 'resync');
+    let source = null;
+    let reopenTimer = null;
+    let lastEventId = null;
+    let closed = false;
+
+    const reopen = () => {
+      if (!closed) reopenTimer = setTimeout(open, REOPEN_DELAY_MS);
+    };
+
+    const open = async () => {
+      let streamToken;
+      try {
+        streamToken = await fetchStreamToken(token);
+      } catch (err) {
+        // A rejected bearer token needs a new login, not another attempt
+        if (err.response?.status !== 401) reopen();
+        return;
+      }
+      if (closed) return;
+
+      const params = new URLSearchParams({ token: streamToken, types: types.join(',') });
+      if (lastEventId) params.set('last_event_id', lastEventId);
+      source = new EventSource(`${EVENTS_URL}?${params}`);
+
+      types.forEach((type) => {
+        source.addEventListener(type, (message) => {
+          lastEventId = message.lastEventId || lastEventId;
+          const handler = handlersRef.current[type];
+          if (handler) handler(JSON.parse(message.data).data);
+        });
+      });
+      source.addEventListener('resync', () => {
+        const handler = handlersRef.current.resync;
+        if (handler) handler();
+      });
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) reopen();
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(reopenTimer);
+      if (source) source.close();
+    };
+  }, []);
+};
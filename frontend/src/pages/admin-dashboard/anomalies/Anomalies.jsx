@@ -1,32 +1,71 @@
 import React, { useEffect, useState } from "react";
 import axios from "axios";
+import { useServerEvents } from "../../../api/events";
+
+const PAGE_SIZE = 50;
 
 const Anomalies = () => {
   const [anomalies, setAnomalies] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [sort, setSort] = useState("created_at");
+  const [supplierId, setSupplierId] = useState("");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
   const token = localStorage.getItem("token");
 
-  useEffect(() => {
-    const fetchAnomalies = async () => {
-      try {
-        const response = await axios.get("http://localhost:8000/flagged-products", {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
-        setAnomalies(response.data);
-      } catch (err) {
-        console.error(err);
-        setError("Failed to load flagged products.");
-      } finally {
-        setLoading(false);
-      }
-    };
+  // Keyset pagination: pass the previous page's next_cursor to continue
+  const fetchAnomalies = async (cursor = null) => {
+    try {
+      const response = await axios.get("http://localhost:8000/flagged-products", {
+        params: {
+          sort,
+          limit: PAGE_SIZE,
+          ...(supplierId ? { supplier_id: supplierId } : {}),
+          ...(cursor ? { cursor } : {}),
+        },
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      setAnomalies((prev) => (cursor ? [...prev, ...response.data.items] : response.data.items));
+      setNextCursor(response.data.next_cursor);
+      setError("");
+    } catch (err) {
+      console.error(err);
+      setError("Failed to load flagged products.");
+    } finally {
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchAnomalies();
-  }, []);
+  }, [sort, supplierId]);
+
+  // New flags are pushed as they are raised; refetch if any were missed
+  useServerEvents({
+    "product.flagged": (flag) => {
+      if (sort !== "created_at" || (supplierId && String(flag.supplier_id) !== supplierId)) return;
+      setAnomalies((prev) =>
+        prev.some((item) => item.flag_id === flag.flag_id)
+          ? prev
+          : [
+              {
+                flag_id: flag.flag_id,
+                product_id: flag.product_id,
+                supplier_id: flag.supplier_id,
+                product_name: flag.product_name,
+                fraud_confidence: flag.fraud_confidence,
+                reason: flag.reason,
+                created_at: flag.created_at,
+              },
+              ...prev,
+            ]
+      );
+    },
+    resync: () => fetchAnomalies(),
+  });
 
   if (loading) return <p>Loading anomalies...</p>;
   if (error) return <p className="text-danger">{error}</p>;
@@ -36,6 +75,20 @@ const Anomalies = () => {
       <h2>Anomalies</h2>
       <p className="mb-4">List of flagged products and supplier details:</p>
 
+      <div className="d-flex gap-3 mb-3">
+        <select className="form-select w-auto" value={sort} onChange={(e) => setSort(e.target.value)}>
+          <option value="created_at">Newest first</option>
+          <option value="confidence">Highest confidence first</option>
+        </select>
+        <input
+          className="form-control w-auto"
+          type="number"
+          placeholder="Supplier ID"
+          value={supplierId}
+          onChange={(e) => setSupplierId(e.target.value)}
+        />
+      </div>
+
       <table className="table table-striped table-bordered">
         <thead className="table-dark">
           <tr>
@@ -47,33 +100,43 @@ const Anomalies = () => {
             <th>Product Name</th>
             <th>Product Price</th>
             <th>Product Category</th>
-            <th>Product Ingredients</th>
+            <th>Confidence</th>
           </tr>
         </thead>
         <tbody>
           {anomalies.length === 0 ? (
             <tr>
-              <td colSpan={5} className="text-center">
+              <td colSpan={9} className="text-center">
                 No anomalies found.
               </td>
             </tr>
           ) : (
             anomalies.map((item) => (
-              <tr key={item.id}>
+              <tr key={item.flag_id}>
                 <td>{item.product_id}</td>
                 <td>{item.reason}</td>
                 <td>{new Date(item.created_at).toLocaleString()}</td>
-                <td>supplier</td>
-                <td>supplier@gmail.com</td>
-                {/* <td>{item.supplier.username}</td>
-                <td>{item.supplier.email}</td> */}
+                <td>{item.supplier_username}</td>
+                <td>{item.supplier_email}</td>
+                <td>{item.product_name}</td>
+                <td>{item.price}</td>
+                <td>{item.category}</td>
+                <td>
+                  {item.fraud_confidence != null ? `${(item.fraud_confidence * 100).toFixed(1)}%` : ""}
+                </td>
               </tr>
             ))
           )}
         </tbody>
       </table>
+
+      {nextCursor && (
+        <button className="btn btn-outline-primary" onClick={() => fetchAnomalies(nextCursor)}>
+          Load more
+        </button>
+      )}
     </div>
   );
 };
 
-export default Anomalies;
\ No newline at end of file
+export default Anomalies;
@@ -5,6 +5,7 @@ import { Tab, Tabs } from "react-bootstrap";
 import Modal from "react-bootstrap/Modal";
 import Button from "react-bootstrap/Button";
 import Form from "react-bootstrap/Form";
+import { useServerEvents } from "../../api/events";
 
 const LogisticDashboard = () => {
   const [key, setKey] = useState("NEW");
@@ -53,6 +54,29 @@ const LogisticDashboard = () => {
     }
   }, [key]);
 
+  // Status changes pushed by the server, including ones made by other users
+  useServerEvents({
+    "order.status": (change) => {
+      const known = Object.values(orders).flat().find((o) => o.id === change.order_id);
+      if (!known) {
+        // Not loaded here yet; the event only carries the changed fields
+        if (orders[change.status]) fetchOrdersByStatus(change.status);
+        return;
+      }
+      setOrders((prev) => {
+        const next = {};
+        Object.keys(prev).forEach((status) => {
+          next[status] = prev[status].filter((o) => o.id !== change.order_id);
+        });
+        if (next[change.status]) {
+          next[change.status] = [...next[change.status], { ...known, ...change, id: change.order_id }];
+        }
+        return next;
+      });
+    },
+    resync: () => fetchOrdersByStatus(key),
+  });
+
   const handleOpenModal = (order) => {
     setSelectedOrder(order);
     setNewStatus(
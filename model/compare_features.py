@@ -0,0 +1,100 @@
+# compare_features.py
+"""
+Compare two artifact bundles (e.g. vocabulary TF-IDF vs hashed TF-IDF) on
+the 30-row test set: accuracy metrics, single-item latency percentiles,
+batch throughput and the serialized size of the text vectorizers.
+
+Example:
+    python train.py --features hashed --out ../backend/ml_models/skincare_counterfeit_hashed.pkl
+    python compare_features.py --candidate ../backend/ml_models/skincare_counterfeit_hashed.pkl
+"""
+
+import argparse
+import pickle
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+
+def featurize(art: dict, df: pd.DataFrame) -> np.ndarray:
+    """Same feature assembly as the inference scripts, for a whole frame."""
+    medians = df['category'].map(art['median_price_map']).fillna(df['price'])
+    price_ratio = (df['price'] / medians).values
+    num_ings = df['ingredients'].str.split(',').str.len().values
+    cat_feat = art['ohe'].transform(df[['category']].rename(columns={'category': art['ohe'].feature_names_in_[0]}))
+    name_feat = art['tf_name'].transform(df['product_name']).toarray()
+    ing_feat = art['tf_ing'].transform(df['ingredients']).toarray()
+    X = np.hstack([np.column_stack([num_ings, price_ratio]), cat_feat, name_feat, ing_feat])
+    return art['scaler'].transform(X)
+
+
+def vocabulary_size(vectorizer) -> int:
+    vocab = getattr(vectorizer, 'vocabulary_', None)
+    return len(vocab) if vocab is not None else 0
+
+
+def evaluate(path: str, df: pd.DataFrame, repeats: int) -> dict:
+    art = joblib.load(path)
+    y = df['label'].values
+
+    proba = art['clf'].predict_proba(featurize(art, df))[:, 1]
+    pred = (proba > art.get('metadata', {}).get('threshold', 0.5)).astype(int)
+
+    # Single-item latency: the path a POST /products call takes
+    timings = []
+    rows = [df.iloc[[i]] for i in range(len(df))]
+    for _ in range(repeats):
+        for row in rows:
+            start = time.perf_counter()
+            art['clf'].predict_proba(featurize(art, row))
+            timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+
+    # Text transform latency alone, batched
+    start = time.perf_counter()
+    for _ in range(repeats):
+        art['tf_name'].transform(df['product_name'])
+        art['tf_ing'].transform(df['ingredients'])
+    text_ms = (time.perf_counter() - start) * 1000 / (repeats * len(df))
+
+    return {
+        'accuracy': accuracy_score(y, pred),
+        'precision': precision_score(y, pred, zero_division=0),
+        'recall': recall_score(y, pred, zero_division=0),
+        'f1': f1_score(y, pred, zero_division=0),
+        'n_features': art['scaler'].n_features_in_,
+        'vocab_entries': vocabulary_size(art['tf_name']) + vocabulary_size(art['tf_ing']),
+        'vectorizer_kb': len(pickle.dumps((art['tf_name'], art['tf_ing']))) / 1024,
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'text_ms_per_row': text_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two counterfeit artifact bundles")
+    parser.add_argument('--baseline', default='../backend/ml_models/skincare_counterfeit_artifacts.pkl')
+    parser.add_argument('--candidate', default='../backend/ml_models/skincare_counterfeit_hashed.pkl')
+    parser.add_argument('--test', default='../dataset/skincare_test_dataset.csv')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.test)
+    results = {
+        'baseline': evaluate(args.baseline, df, args.repeats),
+        'candidate': evaluate(args.candidate, df, args.repeats),
+    }
+
+    table = pd.DataFrame(results)
+    table['delta'] = table['candidate'] - table['baseline']
+    print(f"Baseline:  {args.baseline}")
+    print(f"Candidate: {args.candidate}")
+    print(f"Test set:  {args.test} ({len(df)} rows, {args.repeats} repeats)\n")
+    print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
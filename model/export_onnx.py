@@ -0,0 +1,172 @@
+# export_onnx.py
+"""
+Export a trained artifact bundle to one ONNX graph for the backend's
+onnxruntime backend (FRAUD_DETECTION_BACKEND=onnx).
+
+The graph takes the raw product fields and the two numeric features the
+service computes from live price statistics:
+
+    category, product_name, ingredients   string  [N, 1]
+    num_ingredients, price_ratio          float   [N, 1]
+
+and runs category one-hot encoding, both TF-IDF vectorizers, the scaler and
+the classifier inside the graph. Outputs are 'label' and 'probabilities'.
+The price statistics, categories and metadata go to a JSON sidecar next to
+the graph, so serving needs neither pickle, sklearn nor pandas.
+
+After export, the graph is scored against the joblib bundle on the dataset
+and the largest probability difference and label agreement are printed.
+
+Example:
+    python export_onnx.py
+    python export_onnx.py --artifacts ../backend/ml_models/skincare_counterfeit_artifacts.pkl \\
+        --out ../backend/ml_models/skincare_counterfeit.onnx
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from skl2onnx import __version__ as skl2onnx_version
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ARTIFACTS = os.path.join(BASE_DIR, '..', 'backend', 'ml_models', 'skincare_counterfeit_artifacts.pkl')
+DEFAULT_OUT = os.path.join(BASE_DIR, '..', 'backend', 'ml_models', 'skincare_counterfeit.onnx')
+DEFAULT_DATA = os.path.join(BASE_DIR, '..', 'dataset', 'skincare_combined_noisy.csv')
+
+NUMERIC = ['num_ingredients', 'price_ratio']
+# Same unicode-free word pattern as sklearn's default, in onnxruntime's regex dialect
+TOKEN_EXPRESSION = r'\b\w\w+\b'
+# Locale for the graph's lowercasing; onnxruntime defaults to en_US.UTF-8,
+# which slim images do not have, while C.UTF-8 ships with glibc
+STRING_LOCALE = 'C.UTF-8'
+TARGET_OPSET = {'': 17, 'ai.onnx.ml': 3}
+
+
+def model_frame(df: pd.DataFrame, median_price_map: dict) -> pd.DataFrame:
+    """Graph inputs for a dataset frame, computed as the backend does."""
+    medians = df['category'].map(median_price_map).fillna(df['price'])
+    return pd.DataFrame({
+        'num_ingredients': df['ingredients'].str.split(',').str.len().astype(np.float32),
+        'price_ratio': (df['price'] / medians).astype(np.float32),
+        'category': df['category'].astype(str),
+        'product_name': df['product_name'].astype(str),
+        'ingredients': df['ingredients'].astype(str),
+    })
+
+
+def fitted_pipeline(art: dict, sample: pd.DataFrame) -> Pipeline:
+    """
+    The bundle's fitted steps arranged as one Pipeline. The ColumnTransformer
+    is fitted on a small sample only to set up its column bookkeeping; its
+    transformers are then swapped for the bundle's fitted ones.
+    """
+    if list(art['ohe'].feature_names_in_) != ['category']:
+        raise ValueError(f"Expected the encoder to be fitted on 'category', got {art['ohe'].feature_names_in_}")
+    features = ColumnTransformer([
+        ('num', 'passthrough', NUMERIC),
+        ('cat', art['ohe'], ['category']),
+        ('name', art['tf_name'], 'product_name'),
+        ('ing', art['tf_ing'], 'ingredients'),
+    ], sparse_threshold=0)
+    features.fit(sample)
+    fitted = {'cat': art['ohe'], 'name': art['tf_name'], 'ing': art['tf_ing']}
+    features.transformers_ = [
+        (name, fitted.get(name, transformer), columns)
+        for name, transformer, columns in features.transformers_
+    ]
+    return Pipeline([('features', features), ('scaler', art['scaler']), ('clf', art['clf'])])
+
+
+def export(artifacts_path: str, out_path: str, data_path: str) -> dict:
+    art = joblib.load(artifacts_path)
+    df = pd.read_csv(data_path).dropna(subset=['product_name', 'ingredients', 'price', 'category'])
+    frame = model_frame(df, art['median_price_map'])
+    pipeline = fitted_pipeline(art, frame.head(50))
+
+    initial_types = [(name, FloatTensorType([None, 1])) for name in NUMERIC] + [
+        ('category', StringTensorType([None, 1])),
+        ('product_name', StringTensorType([None, 1])),
+        ('ingredients', StringTensorType([None, 1])),
+    ]
+    options = {
+        id(art['clf']): {'zipmap': False},
+        id(art['tf_name']): {'tokenexp': TOKEN_EXPRESSION, 'locale': STRING_LOCALE},
+        id(art['tf_ing']): {'tokenexp': TOKEN_EXPRESSION, 'locale': STRING_LOCALE},
+    }
+    # Without zipmap the classifier outputs are the 'label' and 'probabilities' tensors
+    onx = convert_sklearn(pipeline, initial_types=initial_types, options=options, target_opset=TARGET_OPSET)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(onx.SerializeToString())
+
+    with open(artifacts_path, 'rb') as f:
+        source_sha = hashlib.sha256(f.read()).hexdigest()
+    metadata = dict(art.get('metadata') or {})
+    metadata['onnx'] = {
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+        'source_artifact': os.path.basename(artifacts_path),
+        'source_sha256': source_sha,
+        'skl2onnx_version': skl2onnx_version,
+        'opset': TARGET_OPSET,
+    }
+    sidecar = {
+        'median_price_map': {k: float(v) for k, v in art['median_price_map'].items()},
+        'categories': [str(c) for c in art['ohe'].categories_[0]],
+        'classes': [int(c) for c in art['clf'].classes_],
+        'metadata': metadata,
+    }
+    if art.get('category_prices') is not None:
+        sidecar['category_prices'] = {
+            k: [float(p) for p in v] for k, v in art['category_prices'].items()
+        }
+    sidecar_path = os.path.splitext(out_path)[0] + '.json'
+    with open(sidecar_path, 'w') as f:
+        json.dump(sidecar, f, default=str)
+
+    print(f"Wrote {out_path} ({os.path.getsize(out_path) / 2 ** 20:.1f} MB) and {sidecar_path}")
+    return {'pipeline': pipeline, 'frame': frame}
+
+
+def verify(out_path: str, pipeline: Pipeline, frame: pd.DataFrame):
+    """Probability and label agreement between the graph and the joblib pipeline."""
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(out_path, providers=['CPUExecutionProvider'])
+    feeds = {
+        name: frame[name].to_numpy().reshape(-1, 1).astype(np.float32 if name in NUMERIC else object)
+        for name in NUMERIC + ['category', 'product_name', 'ingredients']
+    }
+    labels, proba = session.run(['label', 'probabilities'], feeds)
+    expected = pipeline.predict_proba(frame)
+    diff = np.abs(expected - proba)
+    agreement = float((labels.ravel() == expected.argmax(axis=1)).mean())
+    print(f"Parity over {len(frame)} rows: max |p_onnx - p_sklearn| = {diff.max():.2e}, "
+          f"mean {diff.mean():.2e}, label agreement {agreement:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the counterfeit model to ONNX")
+    parser.add_argument('--artifacts', default=DEFAULT_ARTIFACTS, help="joblib bundle from train.py")
+    parser.add_argument('--out', default=DEFAULT_OUT, help="ONNX path; the JSON sidecar is written next to it")
+    parser.add_argument('--data', default=DEFAULT_DATA, help="CSV used for the parity check")
+    parser.add_argument('--no-verify', action='store_true')
+    args = parser.parse_args()
+
+    exported = export(args.artifacts, args.out, args.data)
+    if not args.no_verify:
+        verify(args.out, **exported)
+
+
+if __name__ == "__main__":
+    main()
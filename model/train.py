@@ -0,0 +1,296 @@
+# train.py
+"""
+Train the counterfeit classifier and write the artifact bundle that
+FraudDetectionService and the other model/ scripts load.
+
+The bundle keeps the keys the consumers expect ('ohe', 'tf_name', 'tf_ing',
+'scaler', 'clf', 'median_price_map') and adds a 'metadata' dict with the
+version, feature count, decision threshold (the backend flags products
+whose probability exceeds it) and training time. By default it is written
+where the backend loads it (backend/ml_models/, file name from
+FRAUD_MODEL_ARTIFACT).
+
+Every fitted step (price medians, encoder, vectorizers, scaler) is fit on
+training rows only: per fold for the CV scores, and on the 80% split for
+the shipped model, so reported metrics never see their own test rows.
+
+With --features hashed, 'tf_name' and 'tf_ing' are HashingVectorizer +
+TfidfTransformer pipelines: fixed-width features and a precomputed IDF array
+instead of a vocabulary dict. Both variants expose the same transform() so
+consumers need no changes.
+
+Example:
+    python train.py --data ../dataset/skincare_combined_noisy.csv --n-jobs -1
+    python train.py --features hashed --out ../backend/ml_models/skincare_counterfeit_hashed.pkl
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Memory, Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA = os.path.join(BASE_DIR, '..', 'dataset', 'skincare_combined_noisy.csv')
+# Where FraudDetectionService loads the bundle from (same FRAUD_MODEL_ARTIFACT variable)
+DEFAULT_OUT = os.path.join(
+    BASE_DIR, '..', 'backend', 'ml_models',
+    os.getenv('FRAUD_MODEL_ARTIFACT', 'skincare_counterfeit_artifacts.pkl')
+)
+DEFAULT_CACHE = os.path.join(BASE_DIR, '.train_cache')
+
+# Same decision rule as clf.predict() for a binary forest
+DEFAULT_THRESHOLD = 0.5
+RANDOM_STATE = 42
+
+# Hashed feature widths; small enough for the dense hstack at inference
+HASH_NAME_FEATURES = 2 ** 8
+HASH_ING_FEATURES = 2 ** 10
+
+
+def hashed_tfidf(n_features: int) -> Pipeline:
+    """Stateless token hashing followed by a fitted IDF weight per bucket."""
+    return Pipeline([
+        ('hash', HashingVectorizer(
+            n_features=n_features, alternate_sign=False, norm=None, stop_words='english'
+        )),
+        ('idf', TfidfTransformer()),
+    ])
+
+
+def build_preprocessors(features: str = 'tfidf',
+                        name_features: int = HASH_NAME_FEATURES,
+                        ing_features: int = HASH_ING_FEATURES):
+    """Unfitted preprocessing steps, with the parameters used by the notebook."""
+    if features == 'hashed':
+        tf_name = hashed_tfidf(name_features)
+        tf_ing = hashed_tfidf(ing_features)
+    else:
+        tf_name = TfidfVectorizer(max_features=50, stop_words='english')
+        tf_ing = TfidfVectorizer(max_features=100, stop_words='english')
+    return {
+        'ohe': OneHotEncoder(sparse_output=False, handle_unknown='ignore'),
+        'tf_name': tf_name,
+        'tf_ing': tf_ing,
+    }
+
+
+def fit_step(step, data):
+    """Fit a single preprocessing step. Cached on (step params, data) by joblib.Memory."""
+    return clone(step).fit(data)
+
+
+def load_dataset(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df = df.dropna(subset=['product_name', 'ingredients', 'price', 'category', 'label'])
+    df['price'] = df['price'].astype(float)
+    df['label'] = df['label'].astype(int)
+    return df.reset_index(drop=True)
+
+
+def build_features(df, ohe, tf_name, tf_ing, median_price_map):
+    """Assemble the unscaled feature matrix in the column order used at inference."""
+    price_ratio = df.apply(
+        lambda r: r['price'] / median_price_map.get(r['category'], r['price']), axis=1
+    ).values
+    num_ingredients = df['ingredients'].apply(lambda x: len(x.split(','))).values
+    X_num = np.column_stack([num_ingredients, price_ratio])
+    X_cat = ohe.transform(df[['category']])
+    X_name = tf_name.transform(df['product_name']).toarray()
+    X_ing = tf_ing.transform(df['ingredients']).toarray()
+    return np.hstack([X_num, X_cat, X_name, X_ing])
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fit_preprocessing(df: pd.DataFrame, steps: dict, cached_fit, n_jobs: int) -> dict:
+    """
+    Fit the price reference, encoder, vectorizers and scaler on `df` only.
+    Called per CV fold and on the training split, so no evaluation row ever
+    contributes to a fitted vocabulary, IDF weight, median or scale.
+    """
+    # Price reference comes from the legitimate rows only
+    legit = df[df['label'] == 0]
+    median_price_map = legit.groupby('category')['price'].median().to_dict()
+
+    # Fit the encoder and both vectorizers in parallel; each fit is memoised
+    # so retraining with unchanged data and parameters skips this step.
+    inputs = {
+        'ohe': df[['category']],
+        'tf_name': df['product_name'],
+        'tf_ing': df['ingredients'],
+    }
+    ohe, tf_name, tf_ing = Parallel(n_jobs=n_jobs)(
+        delayed(cached_fit)(steps[name], inputs[name]) for name in steps
+    )
+    scaler = MinMaxScaler().fit(build_features(df, ohe, tf_name, tf_ing, median_price_map))
+    return {
+        'ohe': ohe,
+        'tf_name': tf_name,
+        'tf_ing': tf_ing,
+        'scaler': scaler,
+        'median_price_map': median_price_map,
+        'category_prices': {cat: prices.tolist() for cat, prices in legit.groupby('category')['price']},
+    }
+
+
+def transform(df: pd.DataFrame, prep: dict) -> np.ndarray:
+    X = build_features(df, prep['ohe'], prep['tf_name'], prep['tf_ing'], prep['median_price_map'])
+    return prep['scaler'].transform(X)
+
+
+def score(clf, X, y, threshold: float) -> dict:
+    proba = clf.predict_proba(X)[:, 1]
+    pred = (proba > threshold).astype(int)
+    return {
+        'accuracy': float(accuracy_score(y, pred)),
+        'f1': float(f1_score(y, pred)),
+        'roc_auc': float(roc_auc_score(y, proba)),
+    }
+
+
+def cv_fold(df: pd.DataFrame, train_idx, test_idx, steps: dict, cached_fit, threshold: float) -> dict:
+    """Score one fold with preprocessing refit on the fold's training rows."""
+    train_df, test_df = df.iloc[train_idx], df.iloc[test_idx]
+    prep = fit_preprocessing(train_df, steps, cached_fit, n_jobs=1)
+    clf = RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, n_jobs=1)
+    clf.fit(transform(train_df, prep), train_df['label'].values)
+    return score(clf, transform(test_df, prep), test_df['label'].values, threshold)
+
+
+def train(data_path: str, out_path: str, n_jobs: int, cache_dir: str,
+          cv_folds: int, threshold: float, keep_latest: bool,
+          features: str = 'tfidf', name_features: int = HASH_NAME_FEATURES,
+          ing_features: int = HASH_ING_FEATURES) -> dict:
+    started = time.perf_counter()
+    df = load_dataset(data_path)
+    y = df['label'].values
+    print(f"Loaded {len(df)} rows from {data_path} ({int(y.sum())} counterfeit)")
+
+    memory = Memory(cache_dir or None, verbose=0)
+    cached_fit = memory.cache(fit_step)
+    steps = build_preprocessors(features, name_features, ing_features)
+
+    # Cross-validation folds run in parallel, each fitting its own preprocessing
+    cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=RANDOM_STATE)
+    fold_scores = Parallel(n_jobs=n_jobs)(
+        delayed(cv_fold)(df, train_idx, test_idx, steps, cached_fit, threshold)
+        for train_idx, test_idx in cv.split(df, y)
+    )
+    cv_summary = {
+        metric: float(np.mean([fold[metric] for fold in fold_scores]))
+        for metric in ('accuracy', 'f1', 'roc_auc')
+    }
+    print(f"CV ({cv_folds} folds): " + ", ".join(f"{k}={v:.4f}" for k, v in cv_summary.items()))
+
+    # Final model on the same stratified split as the notebook; everything it
+    # ships is fit on the training rows, so the hold-out scores describe it
+    train_df, test_df = train_test_split(
+        df, test_size=0.2, random_state=RANDOM_STATE, stratify=y
+    )
+    prep = fit_preprocessing(train_df, steps, cached_fit, n_jobs)
+    X_train = transform(train_df, prep)
+    print(f"Feature matrix: {X_train.shape[0]} x {X_train.shape[1]}")
+    clf = RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, n_jobs=n_jobs)
+    clf.fit(X_train, train_df['label'].values)
+    holdout = score(clf, transform(test_df, prep), test_df['label'].values, threshold)
+    print("Hold-out: " + ", ".join(f"{k}={v:.4f}" for k, v in holdout.items()))
+
+    # Single-item serving must not fan out to a process pool per call
+    clf.set_params(n_jobs=None)
+
+    trained_at = datetime.now(timezone.utc)
+    version = trained_at.strftime('%Y%m%d%H%M%S')
+    metadata = {
+        'version': version,
+        'trained_at': trained_at.isoformat(),
+        'training_seconds': round(time.perf_counter() - started, 3),
+        'n_features': int(X_train.shape[1]),
+        'n_samples': int(len(df)),
+        'n_train_samples': int(len(train_df)),
+        'text_features': features,
+        'threshold': threshold,
+        'cv_folds': cv_folds,
+        'cv_scores': cv_summary,
+        'holdout_scores': holdout,
+        'dataset': os.path.basename(data_path),
+        'dataset_sha256': file_sha256(data_path),
+        'sklearn_version': sklearn.__version__,
+    }
+
+    artifacts = {
+        'ohe': prep['ohe'],
+        'tf_name': prep['tf_name'],
+        'tf_ing': prep['tf_ing'],
+        'scaler': prep['scaler'],
+        'clf': clf,
+        'median_price_map': prep['median_price_map'],
+        # Raw legit prices per category; the backend derives IQR/quantiles from them
+        'category_prices': prep['category_prices'],
+        'metadata': metadata,
+    }
+
+    root, ext = os.path.splitext(out_path)
+    versioned_path = f"{root}-v{version}{ext}"
+    joblib.dump(artifacts, versioned_path)
+    print(f"Wrote {versioned_path}")
+    if keep_latest:
+        shutil.copyfile(versioned_path, out_path)
+        print(f"Updated {out_path}")
+
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the counterfeit detection model")
+    parser.add_argument('--data', default=DEFAULT_DATA, help="Training CSV")
+    parser.add_argument('--out', default=DEFAULT_OUT, help="Artifact path (a versioned copy is written next to it)")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel jobs for fits and CV folds")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE, help="joblib cache for fitted preprocessing ('' disables)")
+    parser.add_argument('--cv-folds', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Counterfeit probability above which a product is flagged; the backend applies it")
+    parser.add_argument('--features', choices=['tfidf', 'hashed'], default='tfidf',
+                        help="Vocabulary TF-IDF (default) or hashed TF-IDF text features")
+    parser.add_argument('--hash-name-features', type=int, default=HASH_NAME_FEATURES)
+    parser.add_argument('--hash-ing-features', type=int, default=HASH_ING_FEATURES)
+    parser.add_argument('--no-latest', action='store_true', help="Only write the versioned artifact")
+    args = parser.parse_args()
+
+    metadata = train(
+        data_path=args.data,
+        out_path=args.out,
+        n_jobs=args.n_jobs,
+        cache_dir=args.cache_dir,
+        cv_folds=args.cv_folds,
+        threshold=args.threshold,
+        keep_latest=not args.no_latest,
+        features=args.features,
+        name_features=args.hash_name_features,
+        ing_features=args.hash_ing_features,
+    )
+    print(f"Model version {metadata['version']} trained in {metadata['training_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()